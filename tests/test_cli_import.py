@@ -0,0 +1,117 @@
+"""
+Tests that the command-line interface starts without loading the browser or
+the upload machinery.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+
+# Modules only an upload needs
+HEAVY_MODULES = ("selenium", "tkinter", "uploader.uploader")
+# Import time the CLI's own modules may take, relative to Typer's, which scales
+# with the speed of the machine rather than being a fixed number of seconds
+IMPORT_BUDGET = 1.0
+# Imports timed, taking the fastest to discount a busy machine
+IMPORT_RUNS = 5
+
+HEADER = (
+    "system|assembly|part|make_or_buy|step_type|subtype|comment|quantity|"
+    "cost|cost_comment|carbon_footprint|carbon_comment"
+)
+ROWS = [
+    "Brakes|||||||||||",
+    "|Caliper||||||||||",
+    "||Disc|Buy||||2|2.5|||",
+    "||||Material|Steel||1|1.5||0.1|",
+]
+
+# Imports the CLI, runs any command given, then records every loaded module
+LOADED_MODULES = """
+import json, sys
+code = 0
+try:
+    from uploader.cli import app
+    if len(sys.argv) > 1:
+        sys.argv[0] = "uploader"
+        app()
+except SystemExit as e:
+    code = e.code
+with open({path!r}, "w") as file:
+    json.dump({{"code": code, "modules": sorted(sys.modules)}}, file)
+"""
+
+
+def _run(tmp_path: Path, *args: str) -> tuple[int, set[str]]:
+    """Run the CLI in a fresh interpreter, returning what it imported."""
+    output = tmp_path / "modules.json"
+    script = LOADED_MODULES.format(path=str(output))
+    env = {**os.environ, "XDG_CACHE_HOME": str(tmp_path / "cache")}
+    subprocess.run(
+        [sys.executable, "-c", script, *args],
+        cwd=ROOT,
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+    result = json.loads(output.read_text())
+    return result["code"], set(result["modules"])
+
+
+def _heavy(modules: set[str]) -> list[str]:
+    return [
+        name
+        for name in modules
+        if any(
+            name == heavy or name.startswith(f"{heavy}.")
+            for heavy in HEAVY_MODULES
+        )
+    ]
+
+
+def test_import_skips_heavy_modules(tmp_path: Path):
+    _, modules = _run(tmp_path)
+    assert "uploader.cli" in modules
+    assert _heavy(modules) == []
+
+
+def test_validate_skips_heavy_modules(tmp_path: Path):
+    bom = tmp_path / "bom.csv"
+    bom.write_text("\n".join([HEADER, *ROWS]) + "\n")
+
+    code, modules = _run(tmp_path, "validate", "--input-file", str(bom))
+
+    assert code == 0
+    assert "uploader.validator" in modules
+    assert _heavy(modules) == []
+
+
+def _import_times() -> dict[str, int]:
+    """Time importing the CLI, giving each module's cumulative microseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import uploader.cli"],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    # Lines read "import time: self | cumulative | module"
+    return {
+        fields[2].strip(): int(fields[1])
+        for line in result.stderr.splitlines()
+        if len(fields := line.removeprefix("import time:").split("|")) == 3
+        and fields[1].strip().isdigit()
+    }
+
+
+def test_import_time_within_budget():
+    ratios = []
+    for _ in range(IMPORT_RUNS):
+        times = _import_times()
+        typer = times["typer"]
+        ratios.append((times["uploader.cli"] - typer) / typer)
+    assert min(ratios) < IMPORT_BUDGET
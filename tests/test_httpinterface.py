@@ -0,0 +1,153 @@
+"""
+Offline tests of the HTTP interface against the stand-in cost tool.
+"""
+
+import math
+from typing import Iterator
+
+import pytest
+
+from uploader.data import FSUKSystems, RowData
+from uploader.httpinterface import HttpInterface
+from uploader.mockserver import MockCostTool
+from uploader.webinterface import InvalidCredentialsError
+
+SYSTEM = FSUKSystems.BR
+ASSEMBLY = "Caliper"
+
+
+def _part(name: str, make_or_buy: str = "Buy", cost: float = 2.5) -> RowData:
+    return RowData(
+        system="",
+        assembly="",
+        part=name,
+        make_or_buy=make_or_buy,
+        step_type="",
+        subtype="",
+        comment="",
+        quantity=2,
+        cost=cost,
+        cost_comment="",
+        carbon_footprint=math.nan,
+        carbon_comment="",
+    )
+
+
+def _step(subtype: str, cost: float = 1.5) -> RowData:
+    return RowData(
+        system="",
+        assembly="",
+        part="",
+        make_or_buy="",
+        step_type="Material",
+        subtype=subtype,
+        comment="",
+        quantity=3,
+        cost=cost,
+        cost_comment="",
+        carbon_footprint=0.25,
+        carbon_comment="",
+    )
+
+
+@pytest.fixture
+def tool() -> Iterator[MockCostTool]:
+    # Small pages, so that the grid has several of them
+    with MockCostTool(page_size=2, max_page_size=2) as tool:
+        yield tool
+
+
+@pytest.fixture
+def interface(tool: MockCostTool) -> Iterator[HttpInterface]:
+    interface = HttpInterface(base_url=tool.base_url)
+    interface.log_in_to_account(tool.username, tool.password)
+    yield interface
+    interface.quit()
+
+
+def test_log_in_to_account(tool: MockCostTool, interface: HttpInterface):
+    assert interface.credentials == (tool.username, tool.password)
+    assert len(tool.sessions) == 1
+
+
+def test_invalid_credentials_are_rejected(tool: MockCostTool):
+    interface = HttpInterface(base_url=tool.base_url)
+    with pytest.raises(InvalidCredentialsError):
+        interface.log_in_to_account(tool.username, "wrong")
+    assert not tool.sessions
+
+
+def test_create_snapshot(tool: MockCostTool, interface: HttpInterface):
+    interface.create_snapshot(1, "Snapshot")
+
+    assert [revision.label for revision in tool.revisions] == [
+        "Initial revision",
+        "Snapshot",
+    ]
+    assert interface.snapshot_label == "Snapshot"
+    # The stand-in grid accepts none of the larger page sizes
+    assert interface.page_size is None
+
+
+def test_upload_part(tool: MockCostTool, interface: HttpInterface):
+    interface.create_snapshot(1, "Snapshot")
+    interface.upload_part(_part("Disc"), SYSTEM, ASSEMBLY)
+    interface.upload_part(_part("Bracket", "Make"), SYSTEM, ASSEMBLY)
+
+    disc, bracket = tool.revisions[-1].parts
+    assert (disc.system, disc.assembly, disc.name) == (SYSTEM, ASSEMBLY, "Disc")
+    assert (disc.quantity, disc.make_or_buy, disc.cost) == (2, "Buy", "2.5")
+    assert (bracket.make_or_buy, bracket.cost) == ("Make", "")
+    assert interface.part_index == {"Disc": 1, "Bracket": 1}
+
+
+def test_upload_step(tool: MockCostTool, interface: HttpInterface):
+    interface.create_snapshot(1, "Snapshot")
+    interface.upload_part(_part("Disc"), SYSTEM, ASSEMBLY)
+    assert interface.select_part("Disc")
+    interface.upload_step(_step("Steel"))
+
+    (action,) = tool.revisions[-1].parts[0].actions
+    assert (action.step_type, action.subtype, action.quantity) == (
+        "Material",
+        "Steel",
+        3,
+    )
+    assert (action.cost, action.carbon_footprint) == ("1.5", "0.25")
+
+
+def test_parts_are_found_on_later_pages(
+    tool: MockCostTool, interface: HttpInterface
+):
+    interface.create_snapshot(1, "Snapshot")
+    for name in ("Disc", "Pad", "Piston", "Seal", "Bracket"):
+        interface.upload_part(_part(name), SYSTEM, ASSEMBLY)
+    interface.index_parts()
+
+    assert interface.part_index["Bracket"] == 3
+    assert interface.select_part("Bracket")
+    assert interface.grid_page == 3
+    assert interface.part_is_selected("Bracket")
+    assert not interface.select_part("Rotor")
+
+
+def test_scrape_snapshot(tool: MockCostTool, interface: HttpInterface):
+    interface.create_snapshot(1, "Snapshot")
+    for name in ("Disc", "Pad", "Piston"):
+        interface.upload_part(_part(name), SYSTEM, ASSEMBLY)
+        interface.select_part(name)
+        interface.upload_step(_step(f"{name} steel"))
+
+    rows = interface.scrape_snapshot()
+
+    assert [str(row) for row in rows] == [
+        SYSTEM,
+        ASSEMBLY,
+        "Disc",
+        "Material: Disc steel",
+        "Pad",
+        "Material: Pad steel",
+        "Piston",
+        "Material: Piston steel",
+    ]
+    assert rows[3].cost == 1.5 and rows[3].quantity == 3
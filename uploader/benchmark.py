@@ -0,0 +1,149 @@
+"""
+This module benchmarks uploads against the local stand-in for the FSUK cost tool.
+"""
+
+import logging
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from rich import print
+from rich.table import Table
+
+from uploader.browser import Backend, BrowserOptions
+from uploader.data import FSUKSystems, RowData
+from uploader.mockserver import MockCostTool
+from uploader.shards import ShardBy
+from uploader.uploader import UploadStatistics, upload_bill_of_materials
+
+logger = logging.getLogger("uploader.benchmark")
+
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class BenchmarkResult(object):
+    """Throughput and latency of an upload to the stand-in cost tool."""
+
+    statistics: UploadStatistics
+    requests: dict[str, int]
+    page_navigations: int
+
+    @property
+    def page_loads(self) -> int:
+        return sum(self.requests.values())
+
+
+def generate_bill_of_materials(
+    parts: int, steps_per_part: int = 2, parts_per_assembly: int = 10
+) -> list[RowData]:
+    """Generate a synthetic Bill of Materials spread across every system."""
+    systems = list(FSUKSystems)
+    assemblies = math.ceil(parts / parts_per_assembly)
+
+    bom: list[RowData] = []
+    for s, system in enumerate(systems[:assemblies]):
+        bom.append(_row(system=system.name))
+        for assembly in range(s, assemblies, len(systems)):
+            bom.append(_row(assembly=f"Assembly {assembly}"))
+            first = assembly * parts_per_assembly
+            for part in range(first, min(first + parts_per_assembly, parts)):
+                bom.append(_row(part=f"Part {part}", make_or_buy="Buy"))
+                for step in range(steps_per_part):
+                    bom.append(
+                        _row(step_type="Material", subtype=f"Step {step}")
+                    )
+    return bom
+
+
+def _row(
+    system: str = "",
+    assembly: str = "",
+    part: str = "",
+    make_or_buy: str = "",
+    step_type: str = "",
+    subtype: str = "",
+) -> RowData:
+    return RowData(
+        system=system,
+        assembly=assembly,
+        part=part,
+        make_or_buy=make_or_buy,
+        step_type=step_type,
+        subtype=subtype,
+        comment="",
+        quantity=1,
+        cost=1.0,
+        cost_comment="",
+        carbon_footprint=0.1,
+        carbon_comment="",
+    )
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Get a percentile of some values using the nearest-rank method."""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def run_benchmark(
+    parts: int = 100,
+    steps_per_part: int = 2,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    page_size: int = 10,
+    sessions: int = 1,
+    shard_by: ShardBy = ShardBy.SYSTEM,
+    backend: Backend = Backend.HTTP,
+    browser_options: Optional[BrowserOptions] = None,
+) -> BenchmarkResult:
+    """Upload a synthetic Bill of Materials to the stand-in cost tool."""
+    bom = generate_bill_of_materials(parts, steps_per_part)
+    logger.info(
+        f"Benchmarking {len(bom)} rows, {latency * 1000:.0f}ms latency, "
+        f"{sessions} sessions, {backend} backend"
+    )
+
+    with MockCostTool(
+        page_size=page_size, latency=latency, jitter=jitter
+    ) as tool:
+        statistics = upload_bill_of_materials(
+            bom,
+            tool.username,
+            tool.password,
+            snapshot_label="Benchmark",
+            sessions=sessions,
+            shard_by=shard_by,
+            backend=backend,
+            base_url=tool.base_url,
+            browser_options=browser_options,
+        )
+        return BenchmarkResult(
+            statistics, dict(tool.requests), tool.page_navigations
+        )
+
+
+def print_benchmark(result: BenchmarkResult) -> None:
+    """Print the throughput and latency of a benchmark."""
+    statistics = result.statistics
+    print(
+        f"Uploaded {statistics.rows} rows in {statistics.duration:.2f}s "
+        f"({statistics.rows_per_second:.1f} rows/s)"
+    )
+    print(
+        f"{result.page_loads} requests, "
+        f"{result.page_navigations} page navigations, "
+        f"{statistics.pages_visited} grid pages visited"
+    )
+
+    table = Table("Operation", "Count", *(f"p{q} (ms)" for q in PERCENTILES))
+    for name, durations in sorted(statistics.operations.items()):
+        table.add_row(
+            name,
+            str(len(durations)),
+            *(f"{percentile(durations, q) * 1000:.1f}" for q in PERCENTILES),
+        )
+    print(table)
@@ -0,0 +1,73 @@
+"""
+This module describes how the FSUK website is reached, and how browsers are
+launched, trading page rendering for speed where uploads do not need it.
+
+Selenium is only imported once a browser is launched, so that commands which
+never open the website start quickly.
+"""
+
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from selenium import webdriver
+
+BASE_URL = "https://teams.formulastudent.com"
+
+
+class Backend(StrEnum):
+    """How the FSUK website is driven during an upload."""
+
+    BROWSER = "browser"
+    HTTP = "http"
+
+
+class PageLoadStrategy(StrEnum):
+    """How long the browser waits for a page before handing back control."""
+
+    NORMAL = "normal"
+    EAGER = "eager"
+    NONE = "none"
+
+
+# Firefox preferences that stop the browser fetching what uploads never look at
+BLOCK_ASSETS_PREFERENCES = {
+    # Images and web fonts
+    "permissions.default.image": 2,
+    "browser.display.use_document_fonts": 0,
+    "gfx.downloadable_fonts.enabled": False,
+    # Analytics and other trackers
+    "privacy.trackingprotection.enabled": True,
+    "privacy.trackingprotection.socialtracking.enabled": True,
+}
+
+
+@dataclass
+class BrowserOptions(object):
+    """How a new browser is launched."""
+
+    headless: bool = False
+    page_load_strategy: PageLoadStrategy = PageLoadStrategy.NORMAL
+    block_assets: bool = False
+
+    @property
+    def ready_states(self) -> tuple[str, ...]:
+        """Get the document ready states at which a page counts as loaded."""
+        if self.page_load_strategy == PageLoadStrategy.NORMAL:
+            return ("complete",)
+        # Explicit waits for elements take over once the document is parsed
+        return ("interactive", "complete")
+
+    def firefox_options(self) -> "webdriver.FirefoxOptions":
+        """Get the Firefox options for launching a browser."""
+        from selenium import webdriver
+
+        options = webdriver.FirefoxOptions()
+        options.page_load_strategy = str(self.page_load_strategy)
+        if self.headless:
+            options.add_argument("-headless")
+        if self.block_assets:
+            for name, value in BLOCK_ASSETS_PREFERENCES.items():
+                options.set_preference(name, value)
+        return options
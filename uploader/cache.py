@@ -0,0 +1,261 @@
+"""
+This module stores data between runs in a per-user cache directory.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from uploader.data import BillOfMaterials, Cursor, FSUKSystems
+
+logger = logging.getLogger("uploader.cache")
+
+APPLICATION_NAME = "fsuk-bom-uploader"
+
+# Parsed Bills of Materials are evicted, least recently used first, beyond this
+PARSE_CACHE_SIZE = 256 * 1024 * 1024
+PARSE_CACHE_VERSION = 1
+PARSE_CACHE_MAGIC = b"FSBOM"
+_HEADER = struct.Struct("<5sBI")
+_SEPARATOR = "\0"
+_SYSTEMS = list(FSUKSystems)
+_SYSTEM_CODES = {system: code for code, system in enumerate(_SYSTEMS)}
+_NO_SYSTEM = 255
+_TEXT_COLUMNS = (
+    "assemblies",
+    "parts",
+    "make_or_buys",
+    "step_types",
+    "subtypes",
+    "comments",
+    "cost_comments",
+    "carbon_comments",
+)
+_NUMBER_COLUMNS = ("quantities", "costs", "carbon_footprints")
+
+
+def cache_directory() -> Path:
+    """Get the per-user cache directory, creating it if necessary."""
+    if sys.platform == "win32":
+        root = Path(
+            os.environ.get("LOCALAPPDATA", Path.home() / "AppData/Local")
+        )
+    else:
+        root = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    directory = root / APPLICATION_NAME
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def _cookie_path(account: str) -> Path:
+    """Get the path of the cookie cache for an account."""
+    digest = hashlib.sha256(account.encode()).hexdigest()[:16]
+    return cache_directory() / f"cookies-{digest}.json"
+
+
+def load_cookies(account: str) -> list[dict[str, Any]]:
+    """Load the unexpired cookies cached for an account."""
+    path = _cookie_path(account)
+    if not path.exists():
+        return []
+
+    try:
+        cookies = json.loads(path.read_text())
+    except json.JSONDecodeError:
+        return []
+
+    now = time.time()
+    return [cookie for cookie in cookies if cookie.get("expiry", now + 1) > now]
+
+
+def save_cookies(account: str, cookies: list[dict[str, Any]]) -> None:
+    """Cache the cookies of an authenticated session."""
+    path = _cookie_path(account)
+    # Create the file private, so the cookies are never readable by others;
+    # files cached by older versions are narrowed too
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w") as file:
+        file.write(json.dumps(cookies))
+    path.chmod(0o600)
+    logger.debug(f"Cached {len(cookies)} cookies in '{path}'")
+
+
+def clear_cookies(account: str) -> None:
+    """Remove the cookies cached for an account."""
+    _cookie_path(account).unlink(missing_ok=True)
+
+
+def parse_cache_key(filepath: Path, delimiter: str, skip_rows: int) -> str:
+    """Get the key of a parsed file, from its contents and how it was read."""
+    with open(filepath, "rb") as file:
+        digest = hashlib.file_digest(file, "sha256")
+    digest.update(f"{delimiter}|{skip_rows}|{PARSE_CACHE_VERSION}".encode())
+    return digest.hexdigest()[:32]
+
+
+def _parsed_path(key: str) -> Path:
+    return cache_directory() / f"parsed-{key}.bin"
+
+
+def load_parsed(key: str) -> Optional[tuple[BillOfMaterials, Cursor]]:
+    """Load a cached Bill of Materials, if it has been parsed before."""
+    path = _parsed_path(key)
+    try:
+        data = path.read_bytes()
+        parsed = _decode(data)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        if path.exists():
+            logger.debug(f"Ignoring unreadable parse cache '{path}': {e}")
+        return None
+
+    # Mark the entry as recently used, so that it is evicted last
+    os.utime(path)
+    logger.debug(f"Loaded {len(parsed[0])} parsed rows from '{path}'")
+    return parsed
+
+
+def save_parsed(key: str, bom: BillOfMaterials, cursor: Cursor) -> None:
+    """Cache a parsed Bill of Materials, evicting old entries if necessary."""
+    columns = [getattr(bom, name) for name in _TEXT_COLUMNS]
+    if any(_SEPARATOR in text for column in columns for text in column):
+        return
+
+    # Each writer has its own temporary file, so that runs parsing the same
+    # file at once do not overwrite each other's
+    path = _parsed_path(key)
+    temporary = path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        temporary.write_bytes(_encode(bom, cursor))
+        temporary.replace(path)
+    finally:
+        temporary.unlink(missing_ok=True)
+    logger.debug(f"Cached {len(bom)} parsed rows in '{path}'")
+    _evict_parsed(PARSE_CACHE_SIZE)
+
+
+def _evict_parsed(limit: int) -> None:
+    """Remove the least recently used parsed files beyond a total size."""
+    entries = []
+    for path in cache_directory().glob("parsed-*.bin"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        logger.debug(f"Evicted '{path}' from the parse cache")
+
+
+def _encode(bom: BillOfMaterials, cursor: Cursor) -> bytes:
+    """
+    Encode a Bill of Materials column by column.
+
+    A JSON header gives the cursor and the length of each section. Numbers and
+    row types are stored as raw arrays, and each text column as one string.
+    """
+    systems = bytes(
+        _SYSTEM_CODES[system] if system is not None else _NO_SYSTEM
+        for system in bom.systems
+    )
+    sections = [bytes(bom.row_types), systems]
+    sections += [getattr(bom, name).tobytes() for name in _NUMBER_COLUMNS]
+    sections += [
+        _SEPARATOR.join(getattr(bom, name)).encode() for name in _TEXT_COLUMNS
+    ]
+    header = json.dumps(
+        {
+            "rows": len(bom),
+            "cursor": [
+                cursor.system.name if cursor.system is not None else None,
+                cursor.assembly,
+                cursor.part,
+            ],
+            "sections": [len(section) for section in sections],
+        }
+    ).encode()
+    return b"".join(
+        [
+            _HEADER.pack(PARSE_CACHE_MAGIC, PARSE_CACHE_VERSION, len(header)),
+            header,
+            *sections,
+        ]
+    )
+
+
+def _decode(data: bytes) -> tuple[BillOfMaterials, Cursor]:
+    """Decode a Bill of Materials encoded by `_encode`."""
+    magic, version, header_length = _HEADER.unpack_from(data)
+    if magic != PARSE_CACHE_MAGIC or version != PARSE_CACHE_VERSION:
+        raise ValueError("Unrecognised parse cache format")
+    start = _HEADER.size + header_length
+    header = json.loads(data[_HEADER.size : start])
+
+    sections = []
+    for length in header["sections"]:
+        sections.append(data[start : start + length])
+        start += length
+    if start != len(data):
+        raise ValueError("Truncated parse cache")
+
+    rows = header["rows"]
+    row_types, systems, *numbers = sections[: 2 + len(_NUMBER_COLUMNS)]
+    texts = sections[2 + len(_NUMBER_COLUMNS) :]
+
+    bom = BillOfMaterials()
+    bom.row_types = bytearray(row_types)
+    bom.systems = [
+        _SYSTEMS[system] if system != _NO_SYSTEM else None for system in systems
+    ]
+    for name, section in zip(_NUMBER_COLUMNS, numbers):
+        getattr(bom, name).frombytes(section)
+    for name, section in zip(_TEXT_COLUMNS, texts):
+        setattr(bom, name, section.decode().split(_SEPARATOR) if rows else [])
+
+    lengths = {len(getattr(bom, name)) for name in _TEXT_COLUMNS}
+    lengths |= {len(getattr(bom, name)) for name in _NUMBER_COLUMNS}
+    if lengths | {len(bom.row_types), len(bom.systems)} != {rows}:
+        raise ValueError("Inconsistent parse cache")
+
+    system, assembly, part = header["cursor"]
+    cursor = Cursor(
+        FSUKSystems[system] if system is not None else None, assembly, part
+    )
+    return bom, cursor
+
+
+def _timings_path(site: str) -> Path:
+    """Get the path of the operation timings recorded for a site."""
+    digest = hashlib.sha256(site.encode()).hexdigest()[:16]
+    return cache_directory() / f"timings-{digest}.json"
+
+
+def load_timings(site: str) -> dict[str, list[float]]:
+    """Load the durations of operations recorded in earlier uploads."""
+    path = _timings_path(site)
+    if not path.exists():
+        return {}
+
+    try:
+        return json.loads(path.read_text())
+    except json.JSONDecodeError:
+        return {}
+
+
+def save_timings(site: str, timings: dict[str, list[float]]) -> None:
+    """Record the durations of operations, for estimating later uploads."""
+    path = _timings_path(site)
+    path.write_text(json.dumps(timings))
+    logger.debug(f"Saved timings of {len(timings)} operations in '{path}'")
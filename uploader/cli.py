@@ -1,29 +1,150 @@
 """
-This module provides a command-line interface for uploading a Bill of Materials.
+This module provides a command-line interface for validating, inspecting and
+uploading a Bill of Materials.
+
+Only the modules a command needs are imported when it runs, so that validating a
+file does not load the browser or the upload machinery.
 """
 
 import logging
+from contextlib import contextmanager
+from copy import copy
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 import typer
-from rich.logging import RichHandler
 
-from uploader.importer import load_data
-from uploader.uploader import upload_bill_of_materials
-from uploader.validator import validate_bill_of_materials
+from uploader.browser import (
+    BASE_URL,
+    Backend,
+    BrowserOptions,
+    PageLoadStrategy,
+)
+from uploader.shards import ShardBy
 
 app = typer.Typer()
 
 logger = logging.getLogger("uploader")
-formatter = logging.Formatter("%(message)s")
-handler = RichHandler(show_time=False, show_path=False)
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-
 webdriver_logger = logging.getLogger("uploader.webdriver")
 
 
+def _set_log_level(level: int) -> None:
+    """Show console logs at or above a level, adding the handler if needed."""
+    if not logger.handlers:
+        from rich.logging import RichHandler
+
+        handler = RichHandler(show_time=False, show_path=False)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+
+@contextmanager
+def _tracing(path: Optional[Path]) -> Iterator[None]:
+    """Trace the operations run inside a block, if a trace file is given."""
+    if path is None:
+        yield
+        return
+
+    from uploader.tracing import start_tracing, stop_tracing
+
+    tracer = start_tracing()
+    try:
+        yield
+    finally:
+        stop_tracing()
+        tracer.export_chrome_trace(path)
+        tracer.print_summary()
+
+
+@app.command()
+def validate(
+    filepath: Optional[Path] = typer.Option(
+        None,
+        "--input-file",
+        "-f",
+        help="Path to the Bill of Materials. If not provided, a file selection dialog will open.",
+    ),
+    delimiter: str = typer.Option(
+        "|", "--delimiter", "-d", help="Delimiter for CSV file."
+    ),
+    skip_rows: int = typer.Option(
+        0, "--skiprows", "-s", help="Rows of CSV to skip"
+    ),
+    cache: bool = typer.Option(
+        True,
+        "--cache/--no-cache",
+        help="Reuse rows parsed from the same file in earlier runs",
+    ),
+    report: Optional[Path] = typer.Option(
+        None,
+        "--report",
+        help="Write every validation issue to this JSON or CSV file",
+    ),
+    verbose: bool = typer.Option(
+        False, "--verbose", "-v", help="Show more detailed console logs"
+    ),
+) -> None:
+    """Check a Bill of Materials for errors, without opening the website."""
+
+    _set_log_level(logging.DEBUG if verbose else logging.INFO)
+
+    from uploader.importer import ImportError as BomImportError
+    from uploader.importer import stream_data
+    from uploader.pipeline import RowPipeline
+    from uploader.validator import ValidationError, first_file_row
+
+    try:
+        rows, _ = stream_data(
+            filepath, delimiter=delimiter, skip_rows=skip_rows, cache=cache
+        )
+        bom = RowPipeline(rows, first_row=first_file_row(skip_rows))
+        try:
+            bom.collect()
+        finally:
+            if report is not None:
+                bom.report.write(report)
+    except (BomImportError, ValidationError) as e:
+        logger.error(e)
+        raise typer.Exit(1)
+
+
+@app.command()
+def inspect(
+    filepath: Optional[Path] = typer.Option(
+        None,
+        "--input-file",
+        "-f",
+        help="Path to the Bill of Materials. If not provided, a file selection dialog will open.",
+    ),
+    delimiter: str = typer.Option(
+        "|", "--delimiter", "-d", help="Delimiter for CSV file."
+    ),
+    skip_rows: int = typer.Option(
+        0, "--skiprows", "-s", help="Rows of CSV to skip"
+    ),
+    cache: bool = typer.Option(
+        True,
+        "--cache/--no-cache",
+        help="Reuse rows parsed from the same file in earlier runs",
+    ),
+    verbose: bool = typer.Option(
+        False, "--verbose", "-v", help="Show more detailed console logs"
+    ),
+) -> None:
+    """Summarise the systems, parts and costs of a Bill of Materials."""
+
+    _set_log_level(logging.DEBUG if verbose else logging.WARNING)
+
+    from uploader.importer import load_data
+    from uploader.summary import print_summary, summarise_bill_of_materials
+
+    rows, cursor = load_data(
+        filepath, delimiter=delimiter, skip_rows=skip_rows, cache=cache
+    )
+    print_summary(summarise_bill_of_materials(rows, cursor))
+
+
 @app.command()
 def upload(
     filepath: Optional[Path] = typer.Option(
@@ -38,13 +159,102 @@ def upload(
     skip_rows: int = typer.Option(
         0, "--skiprows", "-s", help="Rows of CSV to skip"
     ),
-    username: str = typer.Option(..., "--username", "-u", prompt="Username"),
-    password: str = typer.Option(
-        ..., "--password", "-p", prompt="Password", hide_input=True
+    cache: bool = typer.Option(
+        True,
+        "--cache/--no-cache",
+        help="Reuse rows parsed from the same file in earlier runs",
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        "-r",
+        help="Resume the last upload of this file, skipping finished rows",
+    ),
+    dry_run: bool = typer.Option(
+        False,
+        "--dry-run",
+        help="Print the planned operations and an estimated upload time, "
+        "without opening the website",
     ),
+    username: Optional[str] = typer.Option(None, "--username", "-u"),
+    password: Optional[str] = typer.Option(None, "--password", "-p"),
     base_revision: int = typer.Option(
         1, "--baserevision", "-b", help="Bill of Materials revision to clone"
     ),
+    poll_frequency: float = typer.Option(
+        0.05,
+        "--poll",
+        help="Seconds between checks while waiting for the website",
+    ),
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        "-i",
+        help="Only upload rows that are not already in the base revision",
+    ),
+    sessions: int = typer.Option(
+        1,
+        "--sessions",
+        "-n",
+        min=1,
+        help="Number of browser sessions to upload with in parallel",
+    ),
+    shard_by: ShardBy = typer.Option(
+        ShardBy.SYSTEM,
+        "--shard-by",
+        help="Subtrees to split the Bill of Materials into for parallel upload",
+    ),
+    backend: Backend = typer.Option(
+        Backend.BROWSER,
+        "--backend",
+        help="Drive the website with a browser, or post its forms directly",
+    ),
+    base_url: str = typer.Option(
+        BASE_URL, "--base-url", help="Address of the website to upload to"
+    ),
+    headless: bool = typer.Option(
+        False, "--headless", help="Run browsers without showing a window"
+    ),
+    page_load_strategy: PageLoadStrategy = typer.Option(
+        PageLoadStrategy.NORMAL,
+        "--page-load-strategy",
+        help="How long browsers wait for pages to render before continuing",
+    ),
+    block_assets: bool = typer.Option(
+        False,
+        "--block-assets",
+        help="Stop browsers loading images, fonts and analytics",
+    ),
+    strict: bool = typer.Option(
+        True,
+        "--strict/--no-strict",
+        help="Validate every row before uploading any, or upload rows as they pass",
+    ),
+    report: Optional[Path] = typer.Option(
+        None,
+        "--report",
+        help="Write every validation issue to this JSON or CSV file",
+    ),
+    verify: bool = typer.Option(
+        False,
+        "--verify",
+        help="Read the snapshot back after uploading and check it matches",
+    ),
+    discrepancies: Optional[Path] = typer.Option(
+        None,
+        "--discrepancies",
+        help="Verify the snapshot, writing every discrepancy to this JSON or CSV file",
+    ),
+    failures: Optional[Path] = typer.Option(
+        None,
+        "--failures",
+        help="Write every row that could not be uploaded to this JSON or CSV file",
+    ),
+    trace: Optional[Path] = typer.Option(
+        None,
+        "--trace",
+        help="Write a Chrome trace of every operation to this file",
+    ),
     verbose: bool = typer.Option(
         False, "--verbose", "-v", help="Show more detailed console logs"
     ),
@@ -54,15 +264,208 @@ def upload(
 ) -> None:
     """Upload a Bill of Materials to the FSUK website."""
 
-    logger.setLevel(logging.DEBUG if verbose or debug else logging.INFO)
+    _set_log_level(logging.DEBUG if verbose or debug else logging.INFO)
     webdriver_logger.setLevel(logging.DEBUG if debug else logging.INFO)
 
-    bom, cursor = load_data(filepath, delimiter=delimiter, skip_rows=skip_rows)
-    validate_bill_of_materials(bom)
-    upload_bill_of_materials(
-        bom,
-        username,
-        password,
-        initial_cursor=cursor,
-        base_revision=base_revision,
+    from uploader.estimator import (
+        estimate_upload,
+        load_latency_model,
+        print_dry_run,
+        record_upload_timings,
+    )
+    from uploader.failures import write_failures
+    from uploader.importer import _prompt_for_file, stream_data
+    from uploader.journal import UploadJournal, journal_path
+    from uploader.pipeline import RowPipeline
+    from uploader.uploader import (
+        plan_bill_of_materials,
+        upload_bill_of_materials,
+        verify_upload,
+    )
+    from uploader.validator import first_file_row
+    from uploader.verify import print_verification
+
+    if filepath is None:
+        filepath = _prompt_for_file()
+
+    browser_options = BrowserOptions(headless, page_load_strategy, block_assets)
+    journal = UploadJournal(journal_path(filepath), skip_rows=skip_rows)
+    if resume:
+        journal.resume()
+        skip_rows = journal.skip_rows
+
+    # Import and validate rows while the website is being opened
+    rows, cursor = stream_data(
+        filepath, delimiter=delimiter, skip_rows=skip_rows, cache=cache
+    )
+    bom = RowPipeline(rows, strict=strict, first_row=first_file_row(skip_rows))
+    if dry_run:
+        try:
+            plans = plan_bill_of_materials(
+                bom.collect(),
+                initial_cursor=cursor,
+                sessions=sessions,
+                shard_by=shard_by,
+                journal=journal if resume else None,
+            )
+        finally:
+            if report is not None:
+                bom.finished.wait()
+                bom.report.write(report)
+        model = load_latency_model(backend, base_url)
+        print_dry_run(plans, estimate_upload(plans, model))
+        return
+
+    if username is None:
+        username = typer.prompt("Username")
+    if password is None:
+        password = typer.prompt("Password", hide_input=True)
+    try:
+        with _tracing(trace):
+            statistics = upload_bill_of_materials(
+                bom,
+                username,
+                password,
+                initial_cursor=copy(cursor),
+                base_revision=base_revision,
+                poll_frequency=poll_frequency,
+                sessions=sessions,
+                shard_by=shard_by,
+                journal=journal,
+                incremental=incremental,
+                backend=backend,
+                base_url=base_url,
+                browser_options=browser_options,
+            )
+        record_upload_timings(backend, base_url, statistics.operations)
+        if failures is not None:
+            write_failures(statistics.failures, failures)
+
+        if verify or discrepancies is not None:
+            assert journal.label is not None
+            verification = verify_upload(
+                bom.collect(),
+                username,
+                password,
+                journal.label,
+                initial_cursor=cursor,
+                poll_frequency=poll_frequency,
+                backend=backend,
+                base_url=base_url,
+                browser_options=browser_options,
+            )
+            print_verification(verification)
+            if discrepancies is not None:
+                verification.write(discrepancies)
+    finally:
+        if report is not None:
+            bom.finished.wait()
+            bom.report.write(report)
+
+    # Rows that failed stay out of the journal, so resuming retries them
+    if statistics.failures:
+        raise typer.Exit(1)
+
+
+@app.command()
+def serve(
+    browsers: int = typer.Option(
+        1, "--browsers", "-n", min=1, help="Number of browsers to keep open"
+    ),
+    headless: bool = typer.Option(
+        False, "--headless", help="Run browsers without showing a window"
+    ),
+    page_load_strategy: PageLoadStrategy = typer.Option(
+        PageLoadStrategy.NORMAL,
+        "--page-load-strategy",
+        help="How long browsers wait for pages to render before continuing",
+    ),
+    block_assets: bool = typer.Option(
+        False,
+        "--block-assets",
+        help="Stop browsers loading images, fonts and analytics",
+    ),
+    verbose: bool = typer.Option(
+        False, "--verbose", "-v", help="Show more detailed console logs"
+    ),
+) -> None:
+    """Keep browsers open for uploads to attach to, until interrupted."""
+
+    _set_log_level(logging.DEBUG if verbose else logging.INFO)
+
+    from uploader.sessions import serve_sessions
+
+    serve_sessions(
+        browsers, BrowserOptions(headless, page_load_strategy, block_assets)
     )
+
+
+@app.command()
+def benchmark(
+    parts: int = typer.Option(
+        100, "--parts", min=1, help="Number of parts to upload"
+    ),
+    steps: int = typer.Option(
+        2, "--steps", min=0, help="Number of steps per part"
+    ),
+    latency: float = typer.Option(
+        0.0, "--latency", help="Seconds the stand-in server takes per request"
+    ),
+    jitter: float = typer.Option(
+        0.0, "--jitter", help="Random extra seconds added to each request"
+    ),
+    page_size: int = typer.Option(
+        10, "--page-size", min=1, help="Initial page size of the parts grid"
+    ),
+    sessions: int = typer.Option(
+        1, "--sessions", "-n", min=1, help="Number of parallel sessions"
+    ),
+    shard_by: ShardBy = typer.Option(
+        ShardBy.SYSTEM, "--shard-by", help="Subtrees to split uploads by"
+    ),
+    backend: Backend = typer.Option(
+        Backend.HTTP, "--backend", help="How to drive the stand-in website"
+    ),
+    headless: bool = typer.Option(
+        False, "--headless", help="Run browsers without showing a window"
+    ),
+    page_load_strategy: PageLoadStrategy = typer.Option(
+        PageLoadStrategy.NORMAL,
+        "--page-load-strategy",
+        help="How long browsers wait for pages to render before continuing",
+    ),
+    block_assets: bool = typer.Option(
+        False,
+        "--block-assets",
+        help="Stop browsers loading images, fonts and analytics",
+    ),
+    trace: Optional[Path] = typer.Option(
+        None,
+        "--trace",
+        help="Write a Chrome trace of every operation to this file",
+    ),
+    verbose: bool = typer.Option(
+        False, "--verbose", "-v", help="Show more detailed console logs"
+    ),
+) -> None:
+    """Measure upload throughput against a local stand-in of the website."""
+
+    _set_log_level(logging.DEBUG if verbose else logging.WARNING)
+
+    from uploader.benchmark import print_benchmark, run_benchmark
+
+    with _tracing(trace):
+        result = run_benchmark(
+            parts,
+            steps,
+            latency=latency,
+            jitter=jitter,
+            page_size=page_size,
+            sessions=sessions,
+            shard_by=shard_by,
+            backend=backend,
+            browser_options=BrowserOptions(
+                headless, page_load_strategy, block_assets
+            ),
+        )
+    print_benchmark(result)
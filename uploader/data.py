@@ -2,9 +2,12 @@
 This module contains data structures and validation functions for Bill of Materials data.
 """
 
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
 from dataclasses import InitVar, dataclass, field
 from enum import StrEnum
-from typing import Optional
+from sys import intern
+from typing import Optional, overload
 
 VALID_MAKE_OR_BUY = ["Make", "Buy"]
 VALID_STEP_TYPES = ["Material", "Process", "Fasteners", "Tooling"]
@@ -51,13 +54,30 @@ FSUK_SYSTEM_MAP: dict[str, FSUKSystems] = {
 def _determine_fsuk_system(system: str) -> FSUKSystems:
     """Determine the FSUK system from a string."""
     if system in FSUKSystems.__members__:
+        return FSUKSystems[system]
+    if system in FSUKSystems:
         return FSUKSystems(system)
     if system in FSUK_SYSTEM_MAP.keys():
         return FSUK_SYSTEM_MAP[system]
     raise KeyError(f"Invalid system '{system}'")
 
 
-@dataclass
+def _determine_row_type(
+    fsuk_system: Optional[FSUKSystems], assembly: str, part: str, step_type: str
+) -> RowType:
+    """Determine the type of a row from the first column it fills."""
+    if fsuk_system is not None:
+        return RowType.SYSTEM
+    if assembly != "":
+        return RowType.ASSEMBLY
+    if part != "":
+        return RowType.PART
+    if step_type != "":
+        return RowType.STEP
+    return RowType.UNDEFINED
+
+
+@dataclass(slots=True)
 class RowData(object):
     """A row of data in the Bill of Materials."""
 
@@ -74,6 +94,7 @@ class RowData(object):
     carbon_footprint: float
     carbon_comment: str
     fsuk_system: Optional[FSUKSystems] = field(init=False)
+    row_type: RowType = field(init=False, repr=False, compare=False)
 
     def __post_init__(self, system: str) -> None:
         if system:
@@ -81,23 +102,22 @@ class RowData(object):
         else:
             self.fsuk_system = None
 
-    @property
-    def row_type(self) -> RowType:
-        if self.fsuk_system is not None:
-            row_type = RowType.SYSTEM
-        elif self.assembly != "":
-            row_type = RowType.ASSEMBLY
-        elif self.part != "":
-            row_type = RowType.PART
-        elif self.step_type != "":
-            row_type = RowType.STEP
-        else:
-            row_type = RowType.UNDEFINED
-
-        return row_type
+        # Work out the row type once, sharing the strings that repeat across
+        # many rows of that type
+        self.row_type = _determine_row_type(
+            self.fsuk_system, self.assembly, self.part, self.step_type
+        )
+        match self.row_type:
+            case RowType.ASSEMBLY:
+                self.assembly = intern(self.assembly)
+            case RowType.PART:
+                self.make_or_buy = intern(self.make_or_buy)
+            case RowType.STEP:
+                self.step_type = intern(self.step_type)
+                self.subtype = intern(self.subtype)
 
     def requires_quantity(self) -> bool:
-        return self.row_type in [RowType.PART, RowType.STEP]
+        return self.row_type in (RowType.PART, RowType.STEP)
 
     def __str__(self) -> str:
         """Get a string identifier for the row."""
@@ -115,7 +135,7 @@ class RowData(object):
         return identifier
 
 
-@dataclass
+@dataclass(slots=True)
 class Cursor(object):
     """Dataclass holding information about where to upload rows."""
 
@@ -125,3 +145,141 @@ class Cursor(object):
 
     def __str__(self) -> str:
         return f"{self.system} - {self.assembly} - {self.part}"
+
+
+ROW_TYPES = list(RowType)
+
+
+class BillOfMaterials(Sequence[RowData]):
+    """
+    A Bill of Materials stored column by column.
+
+    Numbers are kept in typed arrays and row types as single bytes, so large
+    Bills of Materials take a fraction of the memory of a list of rows. Rows are
+    rebuilt when indexed.
+    """
+
+    def __init__(self, rows: Iterable[RowData] = ()) -> None:
+        self.row_types = bytearray()
+        self.systems: list[Optional[FSUKSystems]] = []
+        self.assemblies: list[str] = []
+        self.parts: list[str] = []
+        self.make_or_buys: list[str] = []
+        self.step_types: list[str] = []
+        self.subtypes: list[str] = []
+        self.comments: list[str] = []
+        self.quantities = array("q")
+        self.costs = array("d")
+        self.cost_comments: list[str] = []
+        self.carbon_footprints = array("d")
+        self.carbon_comments: list[str] = []
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def from_columns(
+        cls,
+        system: list[str],
+        assembly: list[str],
+        part: list[str],
+        make_or_buy: list[str],
+        step_type: list[str],
+        subtype: list[str],
+        comment: list[str],
+        quantity: list[int],
+        cost: list[float],
+        cost_comment: list[str],
+        carbon_footprint: list[float],
+        carbon_comment: list[str],
+    ) -> "BillOfMaterials":
+        """Build a Bill of Materials from whole columns, without any rows."""
+        fsuk_systems = {
+            name: _determine_fsuk_system(name) for name in set(system) if name
+        }
+        bom = cls()
+        bom.systems = [fsuk_systems[name] if name else None for name in system]
+        bom.row_types = bytearray(
+            ROW_TYPES.index(_determine_row_type(*values))
+            for values in zip(bom.systems, assembly, part, step_type)
+        )
+        bom.assemblies = assembly
+        bom.parts = part
+        bom.make_or_buys = make_or_buy
+        bom.step_types = step_type
+        bom.subtypes = subtype
+        bom.comments = comment
+        bom.quantities = array("q", quantity)
+        bom.costs = array("d", cost)
+        bom.cost_comments = cost_comment
+        bom.carbon_footprints = array("d", carbon_footprint)
+        bom.carbon_comments = carbon_comment
+        return bom
+
+    def append(self, row: RowData) -> None:
+        self.row_types.append(ROW_TYPES.index(row.row_type))
+        self.systems.append(row.fsuk_system)
+        self.assemblies.append(row.assembly)
+        self.parts.append(row.part)
+        self.make_or_buys.append(row.make_or_buy)
+        self.step_types.append(row.step_type)
+        self.subtypes.append(row.subtype)
+        self.comments.append(row.comment)
+        self.quantities.append(row.quantity)
+        self.costs.append(row.cost)
+        self.cost_comments.append(row.cost_comment)
+        self.carbon_footprints.append(row.carbon_footprint)
+        self.carbon_comments.append(row.carbon_comment)
+
+    def __len__(self) -> int:
+        return len(self.row_types)
+
+    @overload
+    def __getitem__(self, index: int) -> RowData: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[RowData]: ...
+
+    def __getitem__(self, index: int | slice) -> RowData | list[RowData]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        system = self.systems[index]
+        return RowData(
+            system=system.name if system is not None else "",
+            assembly=self.assemblies[index],
+            part=self.parts[index],
+            make_or_buy=self.make_or_buys[index],
+            step_type=self.step_types[index],
+            subtype=self.subtypes[index],
+            comment=self.comments[index],
+            quantity=self.quantities[index],
+            cost=self.costs[index],
+            cost_comment=self.cost_comments[index],
+            carbon_footprint=self.carbon_footprints[index],
+            carbon_comment=self.carbon_comments[index],
+        )
+
+    def __iter__(self) -> Iterator[RowData]:
+        # Walk the columns together, rather than indexing each one per row
+        for values in zip(
+            self.systems,
+            self.assemblies,
+            self.parts,
+            self.make_or_buys,
+            self.step_types,
+            self.subtypes,
+            self.comments,
+            self.quantities,
+            self.costs,
+            self.cost_comments,
+            self.carbon_footprints,
+            self.carbon_comments,
+        ):
+            system = values[0]
+            yield RowData(
+                system.name if system is not None else "", *values[1:]
+            )
+
+    def row_type(self, index: int) -> RowType:
+        """Get the type of a row without rebuilding it."""
+        return ROW_TYPES[self.row_types[index]]
@@ -0,0 +1,109 @@
+"""
+This module compares a Bill of Materials with the contents of an existing snapshot.
+"""
+
+import logging
+import math
+from copy import copy
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, Sequence
+
+from uploader.data import Cursor, RowData, RowType
+
+logger = logging.getLogger("uploader.diff")
+
+COST_TOLERANCE = 0.005
+
+type RowKey = tuple[str, ...]
+
+
+@dataclass
+class BomDiff(object):
+    """Rows of a Bill of Materials that differ from an existing snapshot."""
+
+    inserts: list[int] = field(default_factory=list)
+    updates: list[int] = field(default_factory=list)
+    unchanged: list[int] = field(default_factory=list)
+
+    @property
+    def existing(self) -> set[int]:
+        """Get the rows that are already in the snapshot."""
+        return set(self.updates) | set(self.unchanged)
+
+
+def diff_bill_of_materials(
+    existing: list[RowData],
+    bom: list[RowData],
+    initial_cursor: Optional[Cursor] = None,
+) -> BomDiff:
+    """Compare a Bill of Materials with the rows already in a snapshot."""
+    existing_rows = {key: row for _, key, row in _key_rows(existing, Cursor())}
+
+    diff = BomDiff()
+    cursor = copy(initial_cursor) if initial_cursor is not None else Cursor()
+    for i, key, row in _key_rows(bom, cursor):
+        if key not in existing_rows:
+            diff.inserts.append(i)
+        elif _row_changed(existing_rows[key], row):
+            diff.updates.append(i)
+        else:
+            diff.unchanged.append(i)
+
+    logger.info(
+        f"{len(diff.inserts)} new rows, {len(diff.updates)} changed rows, "
+        f"{len(diff.unchanged)} unchanged rows"
+    )
+    return diff
+
+
+def _key_rows(
+    bom: Sequence[RowData], cursor: Cursor
+) -> Iterator[tuple[int, RowKey, RowData]]:
+    """Key each part and step by its position in the system/assembly tree."""
+    step_counts: dict[RowKey, int] = {}
+    for i, row in enumerate(bom):
+        match row.row_type:
+            case RowType.SYSTEM:
+                cursor.system = row.fsuk_system
+            case RowType.ASSEMBLY:
+                cursor.assembly = row.assembly.strip()
+            case RowType.PART:
+                cursor.part = row.part.strip()
+                yield (
+                    i,
+                    (str(cursor.system), cursor.assembly or "", cursor.part),
+                    row,
+                )
+            case RowType.STEP:
+                # Number repeated steps so that each has a unique key
+                step_key = (
+                    str(cursor.system),
+                    cursor.assembly or "",
+                    cursor.part or "",
+                    row.step_type.strip(),
+                    row.subtype.strip(),
+                )
+                step_counts[step_key] = step_counts.get(step_key, 0) + 1
+                yield i, step_key + (str(step_counts[step_key]),), row
+
+
+def _row_changed(existing: RowData, row: RowData) -> bool:
+    """Check whether the uploaded values of a part or step have changed."""
+    if existing.quantity != row.quantity:
+        return True
+    if row.row_type == RowType.PART:
+        if existing.make_or_buy != row.make_or_buy:
+            return True
+        return row.make_or_buy == "Buy" and _values_differ(
+            existing.cost, row.cost
+        )
+    return _values_differ(existing.cost, row.cost) or _values_differ(
+        existing.carbon_footprint, row.carbon_footprint
+    )
+
+
+def _values_differ(existing: float, value: float) -> bool:
+    """Compare two displayed values, treating missing values as equal."""
+    if math.isnan(existing) or math.isnan(value):
+        return math.isnan(existing) != math.isnan(value)
+    return not math.isclose(existing, value, abs_tol=COST_TOLERANCE)
@@ -0,0 +1,378 @@
+"""
+This module drives the parts grid of the FSUK BoM editor, independently of
+whether the website is reached through a browser or by posting its forms.
+
+Interfaces subclass SnapshotEditor and provide the primitives for reading and
+clicking the grid; paging, selecting parts, restoring expired sessions and
+reading snapshots back are shared.
+"""
+
+import logging
+import math
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+from .browser import BASE_URL
+from .data import RowData
+from .tracing import span
+from .webdriver import SessionExpiredError, timed, watched
+
+logger = logging.getLogger("uploader.editor")
+
+# Parts grid pager
+CHANGE_PAGE_SIZE_FIELD = "ctl00_cp_g_ctl00_ctl02_ctl00_ChangePageSizeTextBox"
+CHANGE_PAGE_SIZE_BUTTON = (
+    "ctl00_cp_g_ctl00_ctl02_ctl00_ChangePageSizeLinkButton"
+)
+# Page sizes to try, largest first, until the grid accepts one
+PAGE_SIZES = (200, 100, 50)
+CURRENT_PAGE = "ctl00_cp_g_ctl00_ctl02_ctl00_GoToPageTextBox"
+GO_TO_PAGE_BUTTON = "ctl00_cp_g_ctl00_ctl02_ctl00_GoToPageLinkButton"
+PAGE_COUNT_LABEL = "ctl00_cp_g_ctl00_ctl02_ctl00_PageOfLabel"
+SELECTED_ROW_CLASS = "rgSelectedRow"
+
+# Master tables of the snapshot grids, excluding any layout table around them
+PART_GRID_TABLE = "ctl00_cp_g_ctl00"
+ACTION_GRID_TABLE = "ctl00_cp_ag_ctl00"
+
+# Snapshot grids, with labels identified by the suffix of their IDs
+PART_GRID_LABELS = {
+    "system": "_systemLabel",
+    "assembly": "_assemblyLabel",
+    "part": "_partNameLabel",
+    "make_or_buy": "_mbLabel",
+    "quantity": "_qtyLabel",
+    "cost": "_costLabel",
+}
+ACTION_GRID_LABELS = {
+    "step_type": "_actionTypeLabel",
+    "subtype": "_subTypeLabel",
+    "quantity": "_actionQtyLabel",
+    "cost": "_actionCostLabel",
+    "carbon_footprint": "_carbonFootprintLabel",
+}
+
+
+class SnapshotEditor(ABC):
+    """
+    Base class for interfaces to the BoM editor of an open snapshot.
+
+    Rows of the grid are whatever the interface reads them as; they are only
+    passed back to the interface's own primitives.
+    """
+
+    def __init__(self, base_url: str = BASE_URL) -> None:
+        self.base_url = base_url
+        self.part_index: dict[str, int] = {}
+        self.page_size: Optional[int] = None
+        self.snapshot_label: Optional[str] = None
+        self.credentials: Optional[tuple[str, str]] = None
+        self.grid_page = 1
+        self.selected_part: Optional[str] = None
+        self.pages_visited = 0
+
+    def _url(self, url: str) -> str:
+        """Get the URL of a page on the site being uploaded to."""
+        return self.base_url + url.removeprefix(BASE_URL)
+
+    # Primitives provided by each interface
+
+    @abstractmethod
+    def log_in_to_account(self, username: str, password: str) -> None:
+        """Log in to the website with a team's account."""
+
+    @abstractmethod
+    def open_snapshot(self, label: str) -> None:
+        """Open a snapshot in the BoM editor by its label."""
+
+    def _wait_for_grid(self) -> None:
+        """Wait until the grid is ready to be read or clicked."""
+        pass
+
+    @abstractmethod
+    def _read_field(self, id: str) -> str:
+        """Get the value of a field, or an empty string if it is missing."""
+
+    @abstractmethod
+    def _read_text(self, id: str) -> str:
+        """Get the text of an element, or an empty string if it is missing."""
+
+    @abstractmethod
+    def _submit_pager(self, field: str, value: int, button: str) -> None:
+        """Enter a value into a pager field and wait for the grid to reload."""
+
+    @abstractmethod
+    def _part_rows(self) -> list[Any]:
+        """Read the rows of the current page of the parts grid."""
+
+    @abstractmethod
+    def _action_rows(self) -> list[Any]:
+        """Read the rows of the selected part's steps, once they have loaded."""
+
+    @abstractmethod
+    def _read_labels(
+        self, row: Any, suffixes: dict[str, str]
+    ) -> dict[str, str]:
+        """Read the text of the labels in a grid row."""
+
+    @abstractmethod
+    def _row_is_selected(self, row: Any) -> bool:
+        """Check whether a row of the parts grid is selected."""
+
+    @abstractmethod
+    def _click_row(self, row: Any) -> None:
+        """Click a row of the parts grid to select its part."""
+
+    # Sessions
+
+    def restore_session(self) -> None:
+        """
+        Log in again after the session expires, reopening the snapshot at the
+        same page of the grid with the same part selected.
+        """
+        if self.credentials is None or self.snapshot_label is None:
+            raise SessionExpiredError
+        page, part = self.grid_page, self.selected_part
+        self.log_in_to_account(*self.credentials)
+        self.open_snapshot(self.snapshot_label)
+        if page != self._current_page() and page <= self._page_count():
+            self._go_to_page(page)
+
+        # Steps are added to the selected part, so select it again
+        if part is not None:
+            self.select_part(part)
+        logger.info(f"Session restored at page {page} of the parts grid")
+
+    def recover(self) -> None:
+        """Reopen the snapshot after a failure, discarding any open form."""
+        if self.snapshot_label is None:
+            return
+        logger.debug(f"Reopening snapshot '{self.snapshot_label}' to recover")
+        try:
+            self.open_snapshot(self.snapshot_label)
+        except SessionExpiredError:
+            self.restore_session()
+
+    # Parts grid
+
+    @watched
+    def index_parts(self) -> None:
+        """Record the page of the parts grid on which each part appears."""
+        self._wait_for_grid()
+        self._keep_page_size()
+        self.part_index.clear()
+
+        page_count = self._page_count()
+        for page in range(1, page_count + 1):
+            if self._current_page() != page:
+                self._go_to_page(page)
+            self._index_current_page()
+
+        logger.debug(
+            f"Indexed {len(self.part_index)} parts across {page_count} pages"
+        )
+
+    def _record_new_part(self, part: str) -> None:
+        """Record where a part that was just saved landed in the grid."""
+        # Assume the last page if it is not on the current one
+        self._index_current_page()
+        if part.strip() not in self.part_index:
+            self.part_index[part.strip()] = self._page_count()
+
+    @watched
+    @timed
+    def select_part(self, part: str) -> bool:
+        """Select a part in the grid, returning whether it was found."""
+        self._wait_for_grid()
+        self._keep_page_size()
+
+        # Jump straight to the indexed page
+        page = self.part_index.get(part)
+        if page is not None and page != self._current_page():
+            self._go_to_page(page)
+        if self._click_part(part):
+            return True
+
+        # The index is stale, so fall back to searching every page
+        logger.debug(f"Part '{part}' not on page {page}, searching grid")
+        for page in range(1, self._page_count() + 1):
+            if self._current_page() != page:
+                self._go_to_page(page)
+            self._index_current_page()
+            if self._click_part(part):
+                return True
+
+        return False
+
+    @watched
+    def part_is_selected(self, part: str) -> bool:
+        """Check whether a part is still selected in the grid."""
+        self._wait_for_grid()
+        row = self._part_row(part)
+        return row is not None and self._row_is_selected(row)
+
+    def _part_name(self, row: Any) -> str:
+        return self._read_labels(row, {"part": PART_GRID_LABELS["part"]})[
+            "part"
+        ]
+
+    def _part_row(self, part: str) -> Optional[Any]:
+        for row in self._part_rows():
+            if self._part_name(row) == part:
+                return row
+        return None
+
+    def _click_part(self, part: str) -> bool:
+        """Select a part if it is on the current page of the grid."""
+        row = self._part_row(part)
+        if row is None:
+            return False
+        self._click_row(row)
+        self.selected_part = part
+        return True
+
+    def _index_current_page(self) -> None:
+        """Record the parts visible on the current page of the grid."""
+        page = self._current_page()
+        for row in self._part_rows():
+            self.part_index[self._part_name(row)] = page
+
+    def _current_page(self) -> int:
+        current_page = self._read_field(CURRENT_PAGE)
+        return int(current_page) if current_page else 1
+
+    def _page_count(self) -> int:
+        page_count_label = self._read_text(PAGE_COUNT_LABEL)
+        if not page_count_label:
+            return 1
+        return int(page_count_label.replace("of ", "").strip())
+
+    def _go_to_page(self, page: int) -> None:
+        """Jump to a page of the grid and wait for it to load."""
+        logger.debug(f"Going to page {page}")
+        self.grid_page = page
+        with span("go_to_page", page=page):
+            self._submit_pager(CURRENT_PAGE, page, GO_TO_PAGE_BUTTON)
+        self.pages_visited += 1
+
+    def _page_size(self) -> int:
+        page_size = self._read_field(CHANGE_PAGE_SIZE_FIELD)
+        return int(page_size) if page_size else 0
+
+    def _set_page_size(self, page_size: int) -> None:
+        """Change the number of parts shown on each page of the grid."""
+        logger.debug(f"Setting page size to {page_size}")
+        self.grid_page = 1
+        with span("set_page_size", page_size=page_size):
+            self._submit_pager(
+                CHANGE_PAGE_SIZE_FIELD, page_size, CHANGE_PAGE_SIZE_BUTTON
+            )
+        self.pages_visited += 1
+
+    def _maximise_page_size(self) -> None:
+        """Show as many parts on each page of the grid as the site allows."""
+        if not self._page_size():
+            return
+        candidates = PAGE_SIZES if self.page_size is None else (self.page_size,)
+        for page_size in candidates:
+            if self._page_size() != page_size:
+                self._set_page_size(page_size)
+            if self._page_size() == page_size:
+                logger.info(f"Showing {page_size} parts per page")
+                self.page_size = page_size
+                return
+
+    def _keep_page_size(self) -> None:
+        """Restore the chosen page size if the grid has reset it."""
+        if self.page_size is not None and self._page_size() != self.page_size:
+            self._set_page_size(self.page_size)
+
+    # Snapshots
+
+    @watched
+    @timed
+    def scrape_snapshot(self) -> list[RowData]:
+        """Read the parts and steps already in the open snapshot."""
+        logger.info("Reading existing parts and steps from snapshot")
+        self._wait_for_grid()
+
+        # Read the steps of each part while its page of the grid is open
+        parts: list[tuple[dict[str, str], list[RowData]]] = []
+        for page in range(1, self._page_count() + 1):
+            if self._current_page() != page:
+                self._go_to_page(page)
+            labels = [
+                self._read_labels(row, PART_GRID_LABELS)
+                for row in self._part_rows()
+            ]
+            for part in labels:
+                steps: list[RowData] = []
+                if self.select_part(part["part"]):
+                    steps = [
+                        scraped_row(
+                            **self._read_labels(row, ACTION_GRID_LABELS)
+                        )
+                        for row in self._action_rows()
+                    ]
+                parts.append((part, steps))
+
+        rows = _group_parts(parts)
+        logger.info(f"Read {len(rows)} rows from snapshot")
+        return rows
+
+
+def _group_parts(
+    parts: list[tuple[dict[str, str], list[RowData]]],
+) -> list[RowData]:
+    """Group parts by system and assembly, as in an imported file."""
+    parts.sort(key=lambda item: (item[0]["system"], item[0]["assembly"]))
+    rows: list[RowData] = []
+    system, assembly = None, None
+    for part, steps in parts:
+        if part["system"] != system:
+            system = part["system"]
+            rows.append(scraped_row(system=system))
+        if part["assembly"] != assembly:
+            assembly = part["assembly"]
+            rows.append(scraped_row(assembly=assembly))
+        del part["system"], part["assembly"]
+        rows.append(scraped_row(**part))
+        rows += steps
+    return rows
+
+
+def _parse_number(text: str) -> float:
+    """Parse a number displayed in a grid, ignoring currency formatting."""
+    try:
+        return float(text.replace(",", "").lstrip("£"))
+    except ValueError:
+        return math.nan
+
+
+def scraped_row(
+    system: str = "",
+    assembly: str = "",
+    part: str = "",
+    make_or_buy: str = "",
+    step_type: str = "",
+    subtype: str = "",
+    quantity: str = "",
+    cost: str = "",
+    carbon_footprint: str = "",
+) -> RowData:
+    """Create a row of data from the labels read from a grid."""
+    parsed_quantity = _parse_number(quantity)
+    return RowData(
+        system=system,
+        assembly=assembly,
+        part=part,
+        make_or_buy=make_or_buy,
+        step_type=step_type,
+        subtype=subtype,
+        comment="",
+        quantity=0 if math.isnan(parsed_quantity) else int(parsed_quantity),
+        cost=_parse_number(cost),
+        cost_comment="",
+        carbon_footprint=_parse_number(carbon_footprint),
+        carbon_comment="",
+    )
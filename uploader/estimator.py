@@ -0,0 +1,136 @@
+"""
+This module estimates how long an upload will take, from the durations of
+operations recorded in earlier uploads to the same website.
+"""
+
+import datetime as dt
+import logging
+import statistics
+from dataclasses import dataclass, field
+
+from rich import print
+
+from uploader.cache import load_timings, save_timings
+from uploader.scheduler import UploadPlan
+
+logger = logging.getLogger("uploader.estimator")
+
+# Only the most recent durations of each operation are kept
+TIMING_SAMPLES = 500
+
+# Seconds each operation takes, until an upload has been timed
+DEFAULT_DURATIONS = {
+    "log_in_to_account": 5.0,
+    "create_snapshot": 10.0,
+    "open_snapshot": 5.0,
+    "upload_part": 3.0,
+    "select_part": 1.0,
+    "upload_step": 2.5,
+}
+
+
+@dataclass
+class LatencyModel(object):
+    """Durations of each operation on a website, in seconds."""
+
+    timings: dict[str, list[float]] = field(default_factory=dict)
+
+    @property
+    def calibrated(self) -> bool:
+        """Whether every operation has been timed in an earlier upload."""
+        return all(self.timings.get(name) for name in DEFAULT_DURATIONS)
+
+    def duration(self, operation: str) -> float:
+        """Get the mean duration of an operation."""
+        samples = self.timings.get(operation)
+        if not samples:
+            return DEFAULT_DURATIONS[operation]
+        return statistics.fmean(samples)
+
+    def record(self, operations: dict[str, list[float]]) -> None:
+        """Add the durations of operations timed during an upload."""
+        for name, durations in operations.items():
+            samples = self.timings.setdefault(name, []) + durations
+            self.timings[name] = samples[-TIMING_SAMPLES:]
+
+
+@dataclass
+class UploadEstimate(object):
+    """Predicted duration of an upload, overall and for each session."""
+
+    session_durations: list[float]
+    calibrated: bool
+
+    @property
+    def duration(self) -> float:
+        return max(self.session_durations, default=0.0)
+
+
+def _site(backend: str, base_url: str) -> str:
+    return f"{backend}@{base_url}"
+
+
+def load_latency_model(backend: str, base_url: str) -> LatencyModel:
+    """Load the durations recorded in earlier uploads to a website."""
+    return LatencyModel(load_timings(_site(backend, base_url)))
+
+
+def record_upload_timings(
+    backend: str, base_url: str, operations: dict[str, list[float]]
+) -> None:
+    """Add the durations of operations timed during an upload to its model."""
+    model = load_latency_model(backend, base_url)
+    model.record(operations)
+    try:
+        save_timings(_site(backend, base_url), model.timings)
+    except OSError as e:
+        logger.warning(f"Unable to save upload timings: {e}")
+
+
+def estimate_upload(
+    plans: list[UploadPlan], model: LatencyModel
+) -> UploadEstimate:
+    """
+    Estimate how long each session takes to carry out its plan.
+
+    Every session logs in, then the first creates the snapshot and the others
+    open it once it exists. Changing page is counted as part of selecting a part.
+    """
+    setup = model.duration("log_in_to_account") + model.duration(
+        "create_snapshot"
+    )
+    durations = []
+    for n, plan in enumerate(plans):
+        duration = setup
+        if n > 0:
+            duration += model.duration("open_snapshot")
+        duration += plan.part_count * model.duration("upload_part")
+        duration += plan.step_count * model.duration("upload_step")
+        duration += plan.selections * model.duration("select_part")
+        durations.append(duration)
+    return UploadEstimate(durations, model.calibrated)
+
+
+def print_dry_run(plans: list[UploadPlan], estimate: UploadEstimate) -> None:
+    """Print the operations an upload would carry out, and how long it would take."""
+    for n, plan in enumerate(plans):
+        if len(plans) > 1:
+            print(f"Session {n + 1}:")
+        for line in plan.describe():
+            print(f"  {line}")
+
+    print(
+        f"{sum(plan.part_count for plan in plans)} parts, "
+        f"{sum(plan.step_count for plan in plans)} steps, "
+        f"{sum(plan.navigations for plan in plans)} page navigations"
+    )
+    for n, duration in enumerate(estimate.session_durations):
+        if len(plans) > 1:
+            print(f"Session {n + 1}: {_format_duration(duration)}")
+    print(f"Estimated upload time: {_format_duration(estimate.duration)}")
+    if not estimate.calibrated:
+        print("Using default timings; run an upload to calibrate the estimate")
+
+
+def _format_duration(seconds: float) -> str:
+    return str(dt.timedelta(seconds=round(seconds)))
@@ -0,0 +1,171 @@
+"""
+This module retries operations that fail on the FSUK website, and records the
+rows that could not be uploaded.
+"""
+
+import csv
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field, fields
+from http.client import HTTPException
+from pathlib import Path
+from typing import Callable, Optional
+
+from selenium.common.exceptions import WebDriverException
+
+from uploader.data import Cursor
+from uploader.scheduler import Operation, OperationKind
+from uploader.webdriver import SessionExpiredError
+from uploader.webinterface import (
+    InvalidCredentialsError,
+    SnapshotNotFoundError,
+    WebInterfaceError,
+)
+
+logger = logging.getLogger("uploader.failures")
+
+RETRY_ATTEMPTS = 4
+# Seconds before the first retry, doubling before each retry after it
+RETRY_DELAY = 1.0
+TRANSIENT_ERRORS = (
+    SessionExpiredError,
+    WebDriverException,
+    WebInterfaceError,
+    HTTPException,
+    OSError,
+)
+# Errors that retrying cannot fix; retrying a log-in can also lock the account
+PERMANENT_ERRORS = (InvalidCredentialsError, SnapshotNotFoundError)
+FAILURE_FORMATS = (".json", ".csv")
+
+
+def retry[R](
+    operation: Callable[[], R],
+    description: str,
+    recover: Callable[[], None] = lambda: None,
+    attempts: int = RETRY_ATTEMPTS,
+    delay: float = RETRY_DELAY,
+) -> R:
+    """
+    Run an operation, retrying it with exponential backoff if it fails with a
+    transient error.
+
+    Between attempts, the website is recovered to a known state. Errors that
+    are not transient, permanent errors such as invalid credentials, and the
+    error of the last attempt, are raised.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return operation()
+        except PERMANENT_ERRORS:
+            raise
+        except TRANSIENT_ERRORS as e:
+            if attempt == attempts:
+                raise
+            logger.warning(
+                f"Unable to {description} ({e}); "
+                f"retrying in {delay:.1f}s ({attempt}/{attempts - 1})"
+            )
+
+        time.sleep(delay)
+        delay *= 2
+        try:
+            recover()
+        except PERMANENT_ERRORS:
+            raise
+        except TRANSIENT_ERRORS as e:
+            logger.debug(f"Unable to recover before retrying: {e}")
+    raise AssertionError("unreachable")
+
+
+@dataclass
+class UploadFailure(object):
+    """A row that could not be uploaded, even when retried."""
+
+    row: int
+    kind: str
+    system: Optional[str]
+    assembly: Optional[str]
+    part: Optional[str]
+    data: str
+    error: str
+
+    def __str__(self) -> str:
+        return f"Row {self.row}: {self.kind} '{self.data}' failed: {self.error}"
+
+
+@dataclass
+class DeferredQueue(object):
+    """
+    Operations that failed, to be retried once the rest of the upload is done.
+
+    When a part fails, the steps beneath it are deferred along with it.
+    """
+
+    entries: list[tuple[Operation, str]] = field(default_factory=list)
+    failed_parts: list[Cursor] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def defer(self, op: Operation, error: Exception | str) -> None:
+        """Park an operation until the end of the upload."""
+        logger.warning(f"Deferring {op.kind} '{op.row}': {error}")
+        self.entries.append((op, str(error)))
+        if op.kind == OperationKind.PART:
+            self.failed_parts.append(op.cursor)
+
+    def part_failed(self, cursor: Cursor) -> bool:
+        """Check whether the part at a cursor was deferred."""
+        return cursor in self.failed_parts
+
+    def take(self) -> list[Operation]:
+        """Remove every deferred operation from the queue, in order."""
+        operations = [op for op, _ in self.entries]
+        self.entries.clear()
+        self.failed_parts.clear()
+        return operations
+
+    def failures(self) -> list[UploadFailure]:
+        """Describe every operation still in the queue as a failure."""
+        return [
+            UploadFailure(
+                row=op.index,
+                kind=str(op.kind),
+                system=op.cursor.system.name if op.cursor.system else None,
+                assembly=op.cursor.assembly,
+                part=op.cursor.part,
+                data=str(op.row),
+                error=error,
+            )
+            for op, error in self.entries
+        ]
+
+
+def write_failures(failures: list[UploadFailure], path: Path) -> None:
+    """Write the rows that failed to upload as JSON or CSV."""
+    match path.suffix.lower():
+        case ".json":
+            path.write_text(
+                json.dumps(
+                    {
+                        "failure_count": len(failures),
+                        "failures": [asdict(failure) for failure in failures],
+                    },
+                    indent=2,
+                )
+            )
+        case ".csv":
+            with open(path, "w", newline="") as file:
+                writer = csv.DictWriter(
+                    file,
+                    fieldnames=[f.name for f in fields(UploadFailure)],
+                )
+                writer.writeheader()
+                writer.writerows(asdict(failure) for failure in failures)
+        case _:
+            raise ValueError(
+                f"Invalid failures format '{path.suffix}'; must be one of {FAILURE_FORMATS}"
+            )
+    logger.info(f"Wrote {len(failures)} upload failures to '{path}'")
@@ -0,0 +1,403 @@
+"""
+This module defines an interface for uploading to the FSUK website by posting its
+WebForms directly, without a browser.
+"""
+
+import logging
+import math
+from dataclasses import dataclass
+from http.client import (
+    HTTPConnection,
+    HTTPException,
+    HTTPResponse,
+    HTTPSConnection,
+)
+from http.cookies import SimpleCookie
+from time import perf_counter
+from typing import Optional
+from urllib.parse import urlencode, urljoin, urlsplit
+
+from .browser import BASE_URL
+from .data import RowData
+from .editor import (
+    ACTION_GRID_LABELS,
+    ACTION_GRID_TABLE,
+    PART_GRID_LABELS,
+    PART_GRID_TABLE,
+    SELECTED_ROW_CLASS,
+    SnapshotEditor,
+)
+from .tracing import span
+from .webdriver import (
+    OperationRecord,
+    SessionExpiredError,
+    WaitRecord,
+    timed,
+    watched,
+)
+from .webforms import Element, Page, TableRow, parse_page
+from .webinterface import (
+    ACTION_CARBON_COMMENT_FIELD,
+    ACTION_CARBON_FOOTPRINT_FIELD,
+    ACTION_COMMENT_FIELD,
+    ACTION_COST_COMMENT_FIELD,
+    ACTION_COST_FIELD,
+    ACTION_QUANTITY_FIELD,
+    ACTION_SUBTYPE_FIELD,
+    ACTION_TYPE_DROPDOWN,
+    ASSEMBLY_DROPDOWN,
+    BOM_LIST_TABLE,
+    BOM_LIST_URL,
+    BUY_RADIO_BUTTON,
+    COMMENT_FIELD,
+    COST_COMMENT_FIELD,
+    COST_FIELD,
+    LOGIN_PAGE_URL,
+    MAKE_RADIO_BUTTON,
+    MAKE_SNAPSHOT_BUTTON,
+    NEW_ACTION_BUTTON,
+    NEW_PART_BUTTON,
+    PART_NAME_FIELD,
+    PASSWORD_FIELD,
+    QUANTITY_FIELD,
+    SAVE_ACTION_BUTTON,
+    SAVE_PART_BUTTON,
+    SNAPSHOT_LABEL_FIELD,
+    SUBMIT_CREDENTIALS_BUTTON,
+    SYSTEM_DROPDOWN,
+    TIMEOUT_LOGIN_URL,
+    USERNAME_FIELD,
+    WELCOME_PAGE_URL,
+    InvalidCredentialsError,
+    SnapshotNotFoundError,
+    WebInterfaceError,
+)
+
+logger = logging.getLogger("uploader.httpinterface")
+
+MAXIMUM_REDIRECTS = 10
+
+
+@dataclass
+class HttpError(WebInterfaceError):
+    """Raised if the FSUK website responds with an error."""
+
+    url: str
+    status: int
+
+    def __str__(self) -> str:
+        return f"Request to '{self.url}' failed with status {self.status}."
+
+
+@dataclass
+class UnexpectedPageError(WebInterfaceError):
+    """Raised if a page does not contain an expected element."""
+
+    url: str
+    element: str
+
+    def __str__(self) -> str:
+        return f"Expected element '{self.element}' on page '{self.url}'."
+
+
+class HttpInterface(SnapshotEditor):
+    """Interface for uploading to the FSUK website without a browser."""
+
+    def __init__(
+        self, timeout_time: float = 10, base_url: str = BASE_URL
+    ) -> None:
+        super().__init__(base_url)
+        self.timeout_time = timeout_time
+        self.connections: dict[tuple[str, str], HTTPConnection] = {}
+        self.cookies: dict[str, str] = {}
+        self.page = Page("")
+        self.wait_records: list[WaitRecord] = []
+        self.operation_records: list[OperationRecord] = []
+
+    # Requests
+
+    def _connection(self, scheme: str, host: str) -> HTTPConnection:
+        """Get a pooled keep-alive connection to a host."""
+        key = (scheme, host)
+        if key not in self.connections:
+            connection_type = (
+                HTTPSConnection if scheme == "https" else HTTPConnection
+            )
+            self.connections[key] = connection_type(
+                host, timeout=self.timeout_time
+            )
+        return self.connections[key]
+
+    def _request(
+        self, url: str, fields: Optional[dict[str, str]] = None
+    ) -> Page:
+        """Load a page, posting form fields if given and following redirects."""
+        for _ in range(MAXIMUM_REDIRECTS):
+            parts = urlsplit(url)
+            path = parts.path + (f"?{parts.query}" if parts.query else "")
+            method = "GET" if fields is None else "POST"
+            body = None if fields is None else urlencode(fields)
+            headers = {
+                "Cookie": "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+            }
+            if body is not None:
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+            logger.debug(f"{method} '{url}'")
+            with span("request", "http", method=method, path=path) as trace:
+                start = perf_counter()
+                try:
+                    response, retries = self._send(
+                        parts.scheme, parts.netloc, method, path, body, headers
+                    )
+                    content = response.read().decode()
+                finally:
+                    self.wait_records.append(
+                        WaitRecord(
+                            f"request '{parts.path}'", perf_counter() - start
+                        )
+                    )
+                trace.update(status=response.status, retries=retries)
+
+            for header in response.headers.get_all("Set-Cookie") or []:
+                cookie = SimpleCookie(header)
+                for name, morsel in cookie.items():
+                    self.cookies[name] = morsel.value
+
+            if response.status in (301, 302, 303):
+                url = urljoin(url, response.headers["Location"])
+                if _is_timeout_login(url):
+                    raise SessionExpiredError
+                fields = None
+                continue
+            if response.status >= 400:
+                raise HttpError(url, response.status)
+
+            with span("parse_page", "http", bytes=len(content)):
+                self.page = parse_page(url, content)
+            return self.page
+
+        raise HttpError(url, 310)
+
+    def _send(
+        self,
+        scheme: str,
+        host: str,
+        method: str,
+        path: str,
+        body: Optional[str],
+        headers: dict[str, str],
+    ) -> tuple[HTTPResponse, int]:
+        """
+        Send a request, reconnecting once if the pooled connection closed.
+
+        Returns the response and the number of retries it took.
+        """
+        for attempt in range(2):
+            connection = self._connection(scheme, host)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                return connection.getresponse(), attempt
+            except (HTTPException, ConnectionError):
+                connection.close()
+                del self.connections[(scheme, host)]
+                if attempt:
+                    raise
+        raise AssertionError("unreachable")
+
+    def _get(self, url: str) -> Page:
+        """Load a page of the site being uploaded to."""
+        return self._request(self._url(url))
+
+    def _submit(
+        self,
+        submitter: Optional[str | Element] = None,
+        argument: Optional[str] = None,
+    ) -> Page:
+        """Post the current page's form, as if a control had been clicked."""
+        if isinstance(submitter, str):
+            self._expect(submitter)
+        fields = self.page.submission(submitter, argument)
+        return self._request(urljoin(self.page.url, self.page.action), fields)
+
+    def _expect(self, id: str) -> None:
+        if id not in self.page:
+            raise UnexpectedPageError(self.page.url, id)
+
+    def _set(self, id: str, value: str | int | float) -> None:
+        self._expect(id)
+        if isinstance(value, float) and math.isnan(value):
+            value = ""
+        self.page.set(id, value)
+
+    # Operations
+
+    @timed
+    def log_in_to_account(self, username: str, password: str) -> None:
+
+        self.credentials = (username, password)
+        logger.info("Attempting login")
+        self._get(LOGIN_PAGE_URL)
+        self._set(USERNAME_FIELD, username)
+        self._set(PASSWORD_FIELD, password)
+        self._submit(SUBMIT_CREDENTIALS_BUTTON)
+
+        if self.page.url != self._url(WELCOME_PAGE_URL):
+            raise InvalidCredentialsError
+        logger.info("Login successful")
+
+    @timed
+    def create_snapshot(self, base_revision: int, label: str) -> None:
+        logger.info(
+            f"Creating snapshot '{label}', base revision = {base_revision}"
+        )
+        self._get(BOM_LIST_URL)
+
+        for row in self.page.table(BOM_LIST_TABLE):
+            if len(row.cells) <= 2 or row.cells[2] != str(base_revision):
+                continue
+            snapshot_button = row.find_by_text("input", "Snapshot")
+            if snapshot_button is not None:
+                self._submit(snapshot_button)
+                break
+
+        self._set(SNAPSHOT_LABEL_FIELD, label)
+        self._submit(MAKE_SNAPSHOT_BUTTON)
+        self.open_snapshot(label)
+
+    @timed
+    def open_snapshot(self, label: str) -> None:
+        """Open an existing snapshot in the BoM editor."""
+        logger.info(f"Opening snapshot '{label}'")
+        self._get(BOM_LIST_URL)
+
+        for row in self.page.table(BOM_LIST_TABLE):
+            edit_link = row.find_by_text("a", "Edit")
+            if label in row.cells and edit_link is not None:
+                self._request(
+                    urljoin(self.page.url, edit_link.attributes["href"])
+                )
+                self.snapshot_label = label
+                self._maximise_page_size()
+                self.index_parts()
+                return
+        raise SnapshotNotFoundError(label)
+
+    @watched
+    @timed
+    def upload_part(
+        self,
+        data: RowData,
+        system: str,
+        assembly: str,
+        upload_cost: bool = True,
+    ) -> None:
+
+        # Create a new part
+        self._submit(NEW_PART_BUTTON)
+
+        # Enter information
+        self._set(SYSTEM_DROPDOWN, system)
+        self._set(ASSEMBLY_DROPDOWN, assembly)
+        self._set(PART_NAME_FIELD, data.part)
+        self._set(QUANTITY_FIELD, data.quantity)
+        self._set(COMMENT_FIELD, data.comment)
+        if data.make_or_buy == "Make":
+            self.page.check(MAKE_RADIO_BUTTON)
+        else:
+            self.page.check(BUY_RADIO_BUTTON)
+            if upload_cost:
+                self._set(COST_FIELD, data.cost)
+                self._set(COST_COMMENT_FIELD, data.cost_comment)
+
+        # Save part
+        self._submit(SAVE_PART_BUTTON)
+        if SAVE_PART_BUTTON in self.page:
+            raise WebInterfaceError(f"Part '{data.part}' was not saved")
+
+        self._record_new_part(data.part)
+
+    @watched
+    @timed
+    def upload_step(self, data: RowData, upload_cost: bool = True) -> None:
+
+        # Create a new action
+        self._submit(NEW_ACTION_BUTTON)
+
+        # Enter information
+        self._set(ACTION_TYPE_DROPDOWN, data.step_type)
+        self._set(ACTION_SUBTYPE_FIELD, data.subtype)
+        self._set(ACTION_QUANTITY_FIELD, data.quantity)
+        self._set(ACTION_COMMENT_FIELD, data.comment)
+        if upload_cost:
+            self._set(ACTION_COST_FIELD, data.cost)
+            self._set(ACTION_COST_COMMENT_FIELD, data.cost_comment)
+            self._set(ACTION_CARBON_FOOTPRINT_FIELD, data.carbon_footprint)
+            self._set(ACTION_CARBON_COMMENT_FIELD, data.carbon_comment)
+
+        # Save action
+        self._submit(SAVE_ACTION_BUTTON)
+        if SAVE_ACTION_BUTTON in self.page:
+            raise WebInterfaceError(f"Step '{data}' was not saved")
+
+    def wait_statistics(self) -> dict[str, tuple[int, float]]:
+        """Get the number of requests and total time spent on them."""
+        total = sum(record.duration for record in self.wait_records)
+        return {"request": (len(self.wait_records), total)}
+
+    def release(self) -> None:
+        """Close the pooled connections."""
+        for connection in self.connections.values():
+            connection.close()
+        self.connections.clear()
+
+    def quit(self) -> None:
+        self.release()
+
+    # Parts grid
+
+    def _read_field(self, id: str) -> str:
+        if id not in self.page:
+            return ""
+        return self.page.element(id).value or ""
+
+    def _read_text(self, id: str) -> str:
+        if id not in self.page:
+            return ""
+        return self.page.text(id)
+
+    def _submit_pager(self, field: str, value: int, button: str) -> None:
+        self._set(field, value)
+        self._submit(button)
+
+    def _part_rows(self) -> list[TableRow]:
+        suffix = PART_GRID_LABELS["part"]
+        rows = self.page.table(PART_GRID_TABLE)
+        return [row for row in rows if row.find(suffix) is not None]
+
+    def _action_rows(self) -> list[TableRow]:
+        suffix = ACTION_GRID_LABELS["step_type"]
+        rows = self.page.table(ACTION_GRID_TABLE)
+        return [row for row in rows if row.find(suffix) is not None]
+
+    def _read_labels(
+        self, row: TableRow, suffixes: dict[str, str]
+    ) -> dict[str, str]:
+        labels: dict[str, str] = {}
+        for name, suffix in suffixes.items():
+            element = row.find(suffix)
+            labels[name] = element.text.strip() if element is not None else ""
+        return labels
+
+    def _row_is_selected(self, row: TableRow) -> bool:
+        return SELECTED_ROW_CLASS in row.element.attributes.get("class", "")
+
+    def _click_row(self, row: TableRow) -> None:
+        self._submit(row.element)
+
+
+def _is_timeout_login(url: str) -> bool:
+    """Check whether a URL is the page expired sessions are sent to."""
+    return (
+        urlsplit(url).path.lower() == urlsplit(TIMEOUT_LOGIN_URL).path.lower()
+    )
@@ -1,19 +1,42 @@
 """
-This module loads a Bill of Materials from a csv file.
+This module loads a Bill of Materials from a CSV, Excel, JSON Lines or Parquet
+file.
 """
 
 import logging
-from csv import DictReader
+import math
+from contextlib import closing
+from copy import copy
 from dataclasses import dataclass
 from pathlib import Path
-from tkinter.filedialog import askopenfilename
-from typing import Any, Optional
-
-from uploader.data import Cursor, RowData, _determine_fsuk_system
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from uploader.cache import load_parsed, parse_cache_key, save_parsed
+from uploader.data import (
+    BillOfMaterials,
+    Cursor,
+    RowData,
+    _determine_fsuk_system,
+)
+from uploader.readers import FILE_FORMATS, ColumnReader, FileFormat
+from uploader.validator import first_file_row
 
 logger = logging.getLogger("uploader.importer")
 
-VALID_FORMATS = [("CSV", ".csv")]
+VALID_FORMATS = [
+    (format.name, format.suffix) for format in FILE_FORMATS.values()
+]
+TEXT_FIELDS = [
+    "system",
+    "assembly",
+    "part",
+    "make_or_buy",
+    "step_type",
+    "subtype",
+    "comment",
+    "cost_comment",
+    "carbon_comment",
+]
 REQUIRED_FIELDS = {
     "system",
     "assembly",
@@ -77,57 +100,228 @@ class RowError(ImportError):
 
     row: str
     error: Exception
+    row_number: Optional[int] = None
 
     def __str__(self) -> str:
+        row = "" if self.row_number is None else f" {self.row_number}"
         return (
-            f"An error occured while loading the following row:\n{self.row}\n"
-            f"Error details: {self.error}"
+            f"An error occured while loading the following row{row}:\n"
+            f"{self.row}\nError details: {self.error}"
         )
 
 
 def load_data(
-    filepath: Optional[Path] = None, *, delimiter: str = "|", skip_rows: int = 0
+    filepath: Optional[Path] = None,
+    *,
+    delimiter: str = "|",
+    skip_rows: int = 0,
+    cache: bool = True,
 ) -> tuple[list[RowData], Cursor]:
-    """Import a Bill of Materials from a CSV file."""
+    """Import a Bill of Materials from a file."""
+
+    rows, cursor = stream_data(
+        filepath, delimiter=delimiter, skip_rows=skip_rows, cache=cache
+    )
+    data = list(rows)
+
+    logger.info(f"Loaded {len(data)} rows of data.")
+    if skip_rows and data:
+        logger.info(f"First row: {data[0]}")
+    return data, cursor
+
+
+def stream_data(
+    filepath: Optional[Path] = None,
+    *,
+    delimiter: str = "|",
+    skip_rows: int = 0,
+    cache: bool = True,
+) -> tuple[Iterable[RowData], Cursor]:
+    """
+    Open a Bill of Materials, parsing its rows as they are read.
+
+    The reader is chosen by the file's suffix, and the delimiter only applies to
+    CSV files. Skipped rows are fast-forwarded past, reading only the columns
+    needed to position the cursor. If the same file has been read the same way
+    before, its rows are loaded from the parse cache instead.
+    """
 
     if filepath is None:
         filepath = _prompt_for_file()
 
     logger.info(f"Loading data from '{filepath}'...")
-    valid_formats = [format[1] for format in VALID_FORMATS]
-    if filepath.suffix not in valid_formats:
-        raise InvalidFileFormatError(filepath, valid_formats)
-
-    with open(filepath, newline="") as file:
-        reader = DictReader(file, delimiter=delimiter)
-
-        if reader.fieldnames is None:
+    file_format = FILE_FORMATS.get(filepath.suffix.lower())
+    if file_format is None:
+        raise InvalidFileFormatError(filepath, list(FILE_FORMATS))
+
+    key = parse_cache_key(filepath, delimiter, skip_rows) if cache else None
+    if key is not None and (parsed := load_parsed(key)) is not None:
+        bom, cursor = parsed
+        logger.info(f"Loaded {len(bom)} parsed rows from cache")
+        return bom, cursor
+
+    if file_format.read_columns is not None:
+        bom, cursor = _load_columns(
+            filepath, file_format.read_columns, skip_rows
+        )
+        if key is not None:
+            _save_parsed(key, bom, cursor)
+        return bom, cursor
+
+    rows, cursor = _stream_records(filepath, file_format, delimiter, skip_rows)
+    if key is not None:
+        rows = _cache_rows(key, rows, copy(cursor))
+    return rows, cursor
+
+
+def _stream_records(
+    filepath: Path, file_format: FileFormat, delimiter: str, skip_rows: int
+) -> tuple[Iterator[RowData], Cursor]:
+    """Open a file record by record, checking its columns first."""
+    assert file_format.read_records is not None
+    records = file_format.read_records(filepath, delimiter)
+    try:
+        fieldnames = next(records, None)
+        if fieldnames is None:
             raise NoDataError(filepath)
 
-        if not REQUIRED_FIELDS.issubset(set(reader.fieldnames)):
+        fieldnames = [str(name) for name in fieldnames]
+        if not REQUIRED_FIELDS.issubset(fieldnames):
             raise IncorrectColumnsError(filepath)
 
-        data: list[RowData] = []
-        cursor = Cursor()
+        cursor = _fast_forward(fieldnames, records, skip_rows)
+    except BaseException:
+        records.close()
+        raise
+
+    if skip_rows:
+        logger.info(f"Initial cursor position: {cursor}")
+    return _parse_rows(filepath, fieldnames, records), cursor
+
+
+def _load_columns(
+    filepath: Path, read_columns: ColumnReader, skip_rows: int
+) -> tuple[BillOfMaterials, Cursor]:
+    """Load a file column by column, without building a row for each line."""
+    columns = read_columns(filepath)
+    if not columns:
+        raise NoDataError(filepath)
+    if not REQUIRED_FIELDS.issubset(columns):
+        raise IncorrectColumnsError(filepath)
+
+    cursor = Cursor()
+    for system, assembly, part in zip(
+        *(columns[name][:skip_rows] for name in ("system", "assembly", "part"))
+    ):
+        cursor = _update_cursor_position(
+            cursor, _text(system), _text(assembly), _text(part)
+        )
+    if skip_rows:
+        logger.info(f"Initial cursor position: {cursor}")
+
+    # Keep the file's order of columns, for reporting invalid rows
+    columns = {
+        name: values[skip_rows:]
+        for name, values in columns.items()
+        if name in REQUIRED_FIELDS
+    }
+    first_row = first_file_row(skip_rows)
+    bom = BillOfMaterials.from_columns(
+        **{name: list(map(_text, columns[name])) for name in TEXT_FIELDS},
+        **{
+            name: _parse_column(filepath, columns, name, parse, first_row)
+            for name, parse in (
+                ("quantity", _parse_quantity),
+                ("cost", _parse_number),
+                ("carbon_footprint", _parse_number),
+            )
+        },
+    )
+    return bom, cursor
+
+
+def _parse_column(
+    filepath: Path,
+    columns: dict[str, list[Any]],
+    name: str,
+    parse: Callable[[Any], Any],
+    first_row: int,
+) -> list[Any]:
+    """Parse each value of a column, reporting the row of any invalid one."""
+    parsed = []
+    for index, value in enumerate(columns[name]):
+        try:
+            parsed.append(parse(value))
+        except Exception as e:
+            row = {field: column[index] for field, column in columns.items()}
+            raise RowError(filepath, str(row), e, first_row + index)
+    return parsed
+
+
+def _fast_forward(
+    fieldnames: list[str], records: Iterator[list[Any]], skip_rows: int
+) -> Cursor:
+    """Skip rows without parsing them, tracking only the cursor position."""
+    cursor = Cursor()
+    if skip_rows <= 0:
+        return cursor
+
+    columns = [
+        fieldnames.index(name) for name in ("system", "assembly", "part")
+    ]
+    skipped = 0
+    for values in records:
+        system, assembly, part = (
+            _text(values[column]) if column < len(values) else ""
+            for column in columns
+        )
+        cursor = _update_cursor_position(cursor, system, assembly, part)
+        skipped += 1
+        if skipped == skip_rows:
+            break
+    return cursor
 
-        for i, row in enumerate(reader):
-            if i < skip_rows:
-                cursor = _update_cursor_position(cursor, row)
-                continue
+
+def _parse_rows(
+    filepath: Path, fieldnames: list[str], records: Iterator[list[Any]]
+) -> Iterator[RowData]:
+    """Parse the remaining rows of a file, closing it once they are read."""
+    with closing(records):
+        for values in records:
+            # Short rows are padded with blanks
+            row = dict(zip(fieldnames, values))
+            for name in fieldnames[len(values) :]:
+                row[name] = ""
             try:
-                data.append(_parse_row_data(row))
+                data = _parse_row_data(row)
             except Exception as e:
                 raise RowError(filepath, row=str(row), error=e)
+            yield data
 
-    logger.info(f"Loaded {len(data)} rows of data.")
-    if skip_rows:
-        logger.info(f"Initial cursor position: {cursor}")
-        logger.info(f"First row: {data[0]}")
-    return data, cursor
+
+def _cache_rows(
+    key: str, rows: Iterator[RowData], cursor: Cursor
+) -> Iterator[RowData]:
+    """Pass rows through, caching them once every row has been parsed."""
+    bom = BillOfMaterials()
+    for row in rows:
+        bom.append(row)
+        yield row
+    _save_parsed(key, bom, cursor)
+
+
+def _save_parsed(key: str, bom: BillOfMaterials, cursor: Cursor) -> None:
+    try:
+        save_parsed(key, bom, cursor)
+    except OSError as e:
+        logger.warning(f"Unable to cache parsed rows: {e}")
 
 
 def _prompt_for_file() -> Path:
     """Prompt the user to select a Bill of Materials file."""
+    # Tk is slow to load, and missing on headless machines that pass a file
+    from tkinter.filedialog import askopenfilename
+
     title_text = "Select a Bill of Materials to upload"
     filepath = askopenfilename(title=title_text, filetypes=VALID_FORMATS)
     if filepath == "":
@@ -135,37 +329,54 @@ def _prompt_for_file() -> Path:
     return Path(filepath)
 
 
-def _update_cursor_position(cursor: Cursor, row: dict[str, str]) -> Cursor:
+def _update_cursor_position(
+    cursor: Cursor, system: str, assembly: str, part: str
+) -> Cursor:
     """Update the position of the cursor."""
-    if row["system"]:
-        cursor.system = _determine_fsuk_system(row["system"])
-    if row["assembly"]:
-        cursor.assembly = row["assembly"]
-    if row["part"]:
-        cursor.part = row["part"]
+    if system:
+        cursor.system = _determine_fsuk_system(system)
+    if assembly:
+        cursor.assembly = assembly
+    if part:
+        cursor.part = part
     return cursor
 
 
 def _parse_row_data(row: dict[str, Any]) -> RowData:
     """Parse a row data dictionary into a RowData object."""
-    if not row["quantity"]:
-        row["quantity"] = 0
-    if not row["cost"]:
-        row["cost"] = "NaN"
-    if not row["carbon_footprint"]:
-        row["carbon_footprint"] = "NaN"
-
     return RowData(
-        system=row["system"],
-        assembly=row["assembly"],
-        part=row["part"],
-        make_or_buy=row["make_or_buy"],
-        step_type=row["step_type"],
-        subtype=row["subtype"],
-        comment=row["comment"],
-        quantity=int(row["quantity"]),
-        cost=float(row["cost"]),
-        cost_comment=row["cost_comment"],
-        carbon_footprint=float(row["carbon_footprint"]),
-        carbon_comment=row["carbon_comment"],
+        system=_text(row["system"]),
+        assembly=_text(row["assembly"]),
+        part=_text(row["part"]),
+        make_or_buy=_text(row["make_or_buy"]),
+        step_type=_text(row["step_type"]),
+        subtype=_text(row["subtype"]),
+        comment=_text(row["comment"]),
+        quantity=_parse_quantity(row["quantity"]),
+        cost=_parse_number(row["cost"]),
+        cost_comment=_text(row["cost_comment"]),
+        carbon_footprint=_parse_number(row["carbon_footprint"]),
+        carbon_comment=_text(row["carbon_comment"]),
     )
+
+
+def _text(value: Any) -> str:
+    """Read a value as text, such as a part named with a number."""
+    return value if isinstance(value, str) else str(value)
+
+
+def _parse_quantity(value: Any) -> int:
+    """
+    Parse a quantity, treating blanks as zero.
+
+    Numbers read from typed formats must be whole, as they must be in CSV files,
+    rather than being truncated.
+    """
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"Quantity {value} is not a whole number")
+    return int(value) if value != "" else 0
+
+
+def _parse_number(value: Any) -> float:
+    """Parse a cost or carbon footprint, treating blanks as missing."""
+    return float(value) if value != "" else math.nan
@@ -0,0 +1,93 @@
+"""
+This module records which rows of a Bill of Materials have been uploaded, so that
+an interrupted upload can be resumed.
+"""
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any, Optional
+
+logger = logging.getLogger("uploader.journal")
+
+JOURNAL_SUFFIX = ".journal"
+
+
+@dataclass
+class NothingToResumeError(Exception):
+    """Raised if there is no upload in the journal to resume."""
+
+    path: Path
+
+    def __str__(self) -> str:
+        return f"No upload to resume in journal '{self.path}'."
+
+
+def journal_path(filepath: Path) -> Path:
+    """Get the path of the journal for a Bill of Materials."""
+    return filepath.with_name(filepath.name + JOURNAL_SUFFIX)
+
+
+class UploadJournal(object):
+    """Append-only record of the rows uploaded to a snapshot."""
+
+    def __init__(self, path: Path, skip_rows: int = 0) -> None:
+        self.path = path
+        self.skip_rows = skip_rows
+        self.label: Optional[str] = None
+        self.completed: set[int] = set()
+        self._lock = Lock()
+
+    def start(self, label: str) -> None:
+        """Start recording an upload to a new snapshot."""
+        self.label = label
+        self.completed = set()
+        self._append({"label": label, "skip_rows": self.skip_rows})
+        logger.debug(f"Recording upload to '{label}' in '{self.path}'")
+
+    def resume(self) -> None:
+        """Load the most recent upload recorded in the journal."""
+        if not self.path.exists():
+            raise NothingToResumeError(self.path)
+
+        with open(self.path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a partially written final line
+                    continue
+                if "skip_rows" in entry:
+                    self.label = entry["label"]
+                    self.skip_rows = entry["skip_rows"]
+                    self.completed = set()
+                elif entry["label"] == self.label:
+                    self.completed.add(entry["row"])
+
+        if self.label is None:
+            raise NothingToResumeError(self.path)
+
+        logger.info(
+            f"Resuming upload to '{self.label}' "
+            f"({len(self.completed)} rows already uploaded)"
+        )
+
+    def is_complete(self, row: int) -> bool:
+        """Check whether a row (relative to the skipped rows) was uploaded."""
+        return row + self.skip_rows in self.completed
+
+    def record(self, row: int) -> None:
+        """Record that a row (relative to the skipped rows) was uploaded."""
+        with self._lock:
+            self.completed.add(row + self.skip_rows)
+        self._append({"label": self.label, "row": row + self.skip_rows})
+
+    def _append(self, entry: dict[str, Any]) -> None:
+        """Durably append an entry to the journal."""
+        with self._lock, open(self.path, "a") as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
@@ -0,0 +1,748 @@
+"""
+This module implements a local stand-in for the FSUK cost tool, for testing uploads
+without access to the real website.
+
+Pages are plain ASP.NET-style forms using the element IDs the web interface looks
+for. Page state round-trips through a __VIEWSTATE field, and __EVENTVALIDATION lists
+the controls that may post back, as on the real site.
+"""
+
+import base64
+import html
+import json
+import logging
+import random
+import secrets
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from uploader.data import VALID_STEP_TYPES, FSUKSystems
+from uploader.editor import (
+    CHANGE_PAGE_SIZE_BUTTON,
+    CHANGE_PAGE_SIZE_FIELD,
+    CURRENT_PAGE,
+    GO_TO_PAGE_BUTTON,
+    PAGE_COUNT_LABEL,
+)
+from uploader.webinterface import (
+    ACTION_CARBON_COMMENT_FIELD,
+    ACTION_CARBON_FOOTPRINT_FIELD,
+    ACTION_COMMENT_FIELD,
+    ACTION_COST_COMMENT_FIELD,
+    ACTION_COST_FIELD,
+    ACTION_QUANTITY_FIELD,
+    ACTION_SUBTYPE_FIELD,
+    ACTION_TYPE_DROPDOWN,
+    ASSEMBLY_DROPDOWN,
+    BOM_LIST_TABLE,
+    BUY_RADIO_BUTTON,
+    COMMENT_FIELD,
+    COST_COMMENT_FIELD,
+    COST_FIELD,
+    MAKE_RADIO_BUTTON,
+    MAKE_SNAPSHOT_BUTTON,
+    NEW_ACTION_BUTTON,
+    NEW_PART_BUTTON,
+    PART_NAME_FIELD,
+    PASSWORD_FIELD,
+    QUANTITY_FIELD,
+    REFRESH_BUTTON,
+    SAVE_ACTION_BUTTON,
+    SAVE_PART_BUTTON,
+    SNAPSHOT_LABEL_FIELD,
+    SUBMIT_CREDENTIALS_BUTTON,
+    SYSTEM_DROPDOWN,
+    USERNAME_FIELD,
+    WELCOME_TEXT,
+)
+
+logger = logging.getLogger("uploader.mockserver")
+
+LOGIN_PATH = "/Account/LogIn"
+TIMEOUT_LOGIN_PATH = "/Account/LogIn.aspx"
+WELCOME_PATH = "/Account/Welcome"
+BOM_LIST_PATH = "/BOM/BOMList"
+BOM_EDIT_PATH = "/BOM/BOMEdit"
+
+AUTH_COOKIE = ".ASPXAUTH"
+GRID = "ctl00_cp_g"
+ACTION_GRID = "ctl00_cp_ag"
+MB_OPTIONS = "ctl00_cp_mbOptions"
+NEXT_PAGE_BUTTON = "ctl00_cp_g_ctl00_ctl02_ctl00_NextPageButton"
+FIRST_PAGE_BUTTON = "ctl00_cp_g_ctl00_ctl02_ctl00_FirstPageButton"
+PAGER_CONTROLS = (
+    GO_TO_PAGE_BUTTON,
+    NEXT_PAGE_BUTTON,
+    FIRST_PAGE_BUTTON,
+    CHANGE_PAGE_SIZE_BUTTON,
+)
+PART_NAME_CHARACTER_LIMIT = 50
+MAXIMUM_QUANTITY = 999
+
+POSTBACK_SCRIPT = """<script>
+function __doPostBack(target, argument) {
+    var form = document.forms[0];
+    form.__EVENTTARGET.value = target;
+    form.__EVENTARGUMENT.value = argument;
+    form.submit();
+}
+</script>"""
+
+
+def _name(id: str) -> str:
+    """Get the form field name ASP.NET generates for a control ID."""
+    if id.startswith(MB_OPTIONS):
+        return MB_OPTIONS.replace("_", "$")
+    return id.replace("_", "$")
+
+
+@dataclass
+class MockAction(object):
+    """An action (step) of a part in the stand-in cost tool."""
+
+    step_type: str
+    subtype: str
+    quantity: int
+    comment: str = ""
+    cost: str = ""
+    cost_comment: str = ""
+    carbon_footprint: str = ""
+    carbon_comment: str = ""
+
+
+@dataclass
+class MockPart(object):
+    """A part in the stand-in cost tool."""
+
+    system: str
+    assembly: str
+    name: str
+    quantity: int
+    make_or_buy: str
+    comment: str = ""
+    cost: str = ""
+    cost_comment: str = ""
+    actions: list[MockAction] = field(default_factory=list)
+
+
+@dataclass
+class MockRevision(object):
+    """A revision (snapshot) of a Bill of Materials in the stand-in cost tool."""
+
+    revision: int
+    label: str
+    parts: list[MockPart] = field(default_factory=list)
+
+
+class MockCostTool(object):
+    """A local stand-in for the FSUK cost tool, served on a background thread."""
+
+    def __init__(
+        self,
+        username: str = "team",
+        password: str = "password",
+        page_size: int = 10,
+        max_page_size: int = 50,
+        session_lifetime: Optional[float] = None,
+        revisions: Optional[list[MockRevision]] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+    ) -> None:
+        self.username = username
+        self.password = password
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.session_lifetime = session_lifetime
+        self.revisions = revisions or [MockRevision(1, "Initial revision")]
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.sessions: dict[str, float] = {}
+        self.requests: Counter[str] = Counter()
+        self.lock = Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        if self.server is None:
+            raise RuntimeError("Stand-in server is not running")
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, port: int = 0) -> "MockCostTool":
+        """Start serving on a background thread."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _RequestHandler)
+        self.server.daemon_threads = True
+        setattr(self.server, "tool", self)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"Stand-in cost tool serving at {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self) -> "MockCostTool":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def revision(self, revision: int) -> MockRevision:
+        for bom in self.revisions:
+            if bom.revision == revision:
+                return bom
+        raise KeyError(f"No revision {revision}")
+
+    def create_snapshot(self, base_revision: int, label: str) -> MockRevision:
+        """Clone a revision into a new snapshot."""
+        with self.lock:
+            base = self.revision(base_revision)
+            parts = [
+                MockPart(
+                    **{**part.__dict__, "actions": list(part.actions)},
+                )
+                for part in base.parts
+            ]
+            revision = max(bom.revision for bom in self.revisions) + 1
+            snapshot = MockRevision(revision, label, parts)
+            self.revisions.append(snapshot)
+        return snapshot
+
+    def log_in(self) -> str:
+        """Start an authenticated session, returning its token."""
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[token] = time.monotonic()
+        return token
+
+    def is_authenticated(self, token: Optional[str]) -> bool:
+        """Check a session token, extending the session if it is valid."""
+        with self.lock:
+            if token is None or token not in self.sessions:
+                return False
+            now = time.monotonic()
+            if (
+                self.session_lifetime is not None
+                and now - self.sessions[token] > self.session_lifetime
+            ):
+                del self.sessions[token]
+                return False
+            self.sessions[token] = now
+            return True
+
+    def record_request(self, kind: str) -> None:
+        """Count a page load or postback, then wait out the server latency."""
+        with self.lock:
+            self.requests[kind] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    @property
+    def page_navigations(self) -> int:
+        """Get the number of times the parts grid was paged."""
+        return sum(
+            count
+            for kind, count in self.requests.items()
+            if kind.removeprefix("postback ") in PAGER_CONTROLS
+        )
+
+    def expire_sessions(self) -> None:
+        """End every session, as if they had all timed out."""
+        with self.lock:
+            self.sessions.clear()
+
+
+class _InvalidPostbackError(Exception):
+    """Raised if a postback is not allowed by the page's event validation."""
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Serves the pages of the stand-in cost tool."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    @property
+    def tool(self) -> MockCostTool:
+        return getattr(self.server, "tool")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def _handle(self, method: str) -> None:
+        url = urlsplit(self.path)
+        self.query = {
+            key: values[0] for key, values in parse_qs(url.query).items()
+        }
+        self.form: dict[str, str] = {}
+        if method == "POST":
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length).decode()
+            self.form = {
+                key: values[0]
+                for key, values in parse_qs(
+                    body, keep_blank_values=True
+                ).items()
+            }
+
+        target = self.form.get("__EVENTTARGET") or next(
+            (name for name in self.form if name.endswith("Button")), None
+        )
+        if target is not None:
+            self.tool.record_request(f"postback {target.replace('$', '_')}")
+        else:
+            self.tool.record_request(f"{method} {url.path}")
+
+        cookies = SimpleCookie(self.headers.get("Cookie", ""))
+        token = cookies[AUTH_COOKIE].value if AUTH_COOKIE in cookies else None
+
+        try:
+            if url.path in (LOGIN_PATH, TIMEOUT_LOGIN_PATH):
+                self._login(method)
+            elif not self.tool.is_authenticated(token):
+                self._redirect(TIMEOUT_LOGIN_PATH)
+            elif (
+                target
+                in (
+                    _name(SAVE_PART_BUTTON),
+                    _name(SAVE_ACTION_BUTTON),
+                )
+                and random.random() < self.tool.failure_rate
+            ):
+                # A flaky site fails some saves without applying them
+                self._respond("Service unavailable", 503)
+            elif url.path == WELCOME_PATH:
+                self._respond(self._render("Welcome", "", []))
+            elif url.path == BOM_LIST_PATH:
+                self._bom_list(method)
+            elif url.path == BOM_EDIT_PATH:
+                self._bom_editor(method)
+            else:
+                self._respond("Not found", status=404)
+        except _InvalidPostbackError as e:
+            self._respond(f"Invalid postback or callback argument: {e}", 500)
+
+    # Responses
+
+    def _respond(
+        self, body: str, status: int = 200, headers: Optional[dict] = None
+    ) -> None:
+        content = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _redirect(self, path: str, headers: Optional[dict] = None) -> None:
+        self._respond("", 302, {"Location": path, **(headers or {})})
+
+    def _render(
+        self,
+        title: str,
+        content: str,
+        postbacks: list[str],
+        state: Optional[dict[str, Any]] = None,
+        action: str = "",
+    ) -> str:
+        """Render a page, with its view state and the controls it accepts."""
+        view_state = _encode(state or {})
+        event_validation = _encode([_name(id) for id in postbacks])
+        return f"""<!DOCTYPE html>
+<html><head><title>{title}</title>{POSTBACK_SCRIPT}</head>
+<body>
+<span id="{WELCOME_TEXT}">Welcome, {html.escape(self.tool.username)}</span>
+<form method="post" action="{action or self.path}">
+<input type="hidden" name="__EVENTTARGET" value="" />
+<input type="hidden" name="__EVENTARGUMENT" value="" />
+<input type="hidden" name="__VIEWSTATE" value="{view_state}" />
+<input type="hidden" name="__VIEWSTATEGENERATOR" value="CA0B0334" />
+<input type="hidden" name="__EVENTVALIDATION" value="{event_validation}" />
+{content}
+</form>
+</body></html>"""
+
+    # Postbacks
+
+    def _postback(self) -> tuple[dict[str, Any], Optional[str], str]:
+        """Get the view state, the control that posted back and its argument."""
+        if "__VIEWSTATE" not in self.form:
+            raise _InvalidPostbackError("missing view state")
+        allowed = _decode(self.form.get("__EVENTVALIDATION", ""))
+        if not isinstance(allowed, list):
+            raise _InvalidPostbackError("missing event validation")
+
+        target = self.form.get("__EVENTTARGET") or None
+        if target is None:
+            # A submit button posts its own name instead of an event target
+            buttons = [name for name in allowed if name in self.form]
+            target = buttons[0] if buttons else None
+        if target is not None and target not in allowed:
+            raise _InvalidPostbackError(target)
+
+        return (
+            _decode(self.form["__VIEWSTATE"]),
+            target,
+            self.form.get("__EVENTARGUMENT", ""),
+        )
+
+    def _field(self, id: str) -> str:
+        return self.form.get(_name(id), "").strip()
+
+    # Login
+
+    def _login(self, method: str) -> None:
+        error = ""
+        if method == "POST":
+            self._postback()
+            username = self._field(USERNAME_FIELD)
+            password = self._field(PASSWORD_FIELD)
+            if (username, password) == (self.tool.username, self.tool.password):
+                token = self.tool.log_in()
+                cookie = f"{AUTH_COOKIE}={token}; Path=/; HttpOnly"
+                self._redirect(WELCOME_PATH, {"Set-Cookie": cookie})
+                return
+            error = "<span class='error'>Invalid username or password</span>"
+
+        content = f"""{error}
+{_input(USERNAME_FIELD)}
+{_input(PASSWORD_FIELD, type="password")}
+{_button(SUBMIT_CREDENTIALS_BUTTON, "Log In")}"""
+        self._respond(
+            self._render("Log In", content, [SUBMIT_CREDENTIALS_BUTTON])
+        )
+
+    # BoM list
+
+    def _bom_list(self, method: str) -> None:
+        if method == "POST":
+            state, target, _ = self._postback()
+            if target == _name(MAKE_SNAPSHOT_BUTTON):
+                label = self._field(SNAPSHOT_LABEL_FIELD)
+                self.tool.create_snapshot(state["base_revision"], label)
+            elif target is not None and target.endswith("$snapshotButton"):
+                base_revision = int(target.split("$")[-2].lstrip("r"))
+                content = f"""{_input(SNAPSHOT_LABEL_FIELD)}
+{_button(MAKE_SNAPSHOT_BUTTON, "Make Snapshot")}"""
+                self._respond(
+                    self._render(
+                        "New Snapshot",
+                        content,
+                        [MAKE_SNAPSHOT_BUTTON],
+                        {"base_revision": base_revision},
+                    )
+                )
+                return
+
+        rows = []
+        snapshot_buttons = []
+        for bom in reversed(self.tool.revisions):
+            button_id = f"ctl00_ContentPlaceHolder1_bomList_r{bom.revision}_snapshotButton"
+            snapshot_buttons.append(button_id)
+            rows.append(
+                f"""<tr><td>{html.escape(self.tool.username)}</td>
+<td>{html.escape(bom.label)}</td><td>{bom.revision}</td>
+<td>{_button(button_id, "Snapshot")}
+<a href="{BOM_EDIT_PATH}?rev={bom.revision}">Edit</a></td></tr>"""
+            )
+        content = f"""<table id="{BOM_LIST_TABLE}">
+<tr><th>Team</th><th>Label</th><th>Revision</th><th></th></tr>
+{"".join(rows)}
+</table>"""
+        self._respond(
+            self._render(
+                "Bill of Materials",
+                content,
+                snapshot_buttons,
+                action=BOM_LIST_PATH,
+            )
+        )
+
+    # BoM editor
+
+    def _bom_editor(self, method: str) -> None:
+        if method == "GET":
+            state: dict[str, Any] = {
+                "revision": int(self.query.get("rev", 1)),
+                "page": 1,
+                "page_size": self.tool.page_size,
+                "selected": None,
+                "modal": None,
+            }
+            message = ""
+        else:
+            state, target, argument = self._postback()
+            message = self._editor_event(state, target, argument)
+
+        bom = self.tool.revision(state["revision"])
+        page_count = max(1, -(-len(bom.parts) // state["page_size"]))
+        state["page"] = min(max(1, state["page"]), page_count)
+        first = (state["page"] - 1) * state["page_size"]
+        parts = bom.parts[first : first + state["page_size"]]
+
+        part_rows = []
+        for i, part in enumerate(parts):
+            selected = state["selected"] == first + i
+            prefix = f"{GRID}_ctl00_ctl{4 + 2 * i:02d}"
+            part_rows.append(
+                f"""<tr id="{GRID}_ctl00__{i}" class="{"rgSelectedRow" if selected else "rgRow"}" onclick="__doPostBack('{_name(GRID)}','RowClick;{i}')">
+<td>{_label(prefix + "_systemLabel", part.system)}</td>
+<td>{_label(prefix + "_assemblyLabel", part.assembly)}</td>
+<td>{_label(prefix + "_partNameLabel", part.name)}</td>
+<td>{_label(prefix + "_mbLabel", part.make_or_buy)}</td>
+<td>{_label(prefix + "_qtyLabel", part.quantity)}</td>
+<td>{_label(prefix + "_costLabel", part.cost)}</td></tr>"""
+            )
+
+        action_rows = []
+        if state["selected"] is not None:
+            part = bom.parts[state["selected"]]
+            for i, action in enumerate(part.actions):
+                prefix = f"{ACTION_GRID}_ctl00_ctl{4 + 2 * i:02d}"
+                action_rows.append(
+                    f"""<tr class="rgRow">
+<td>{_label(prefix + "_actionTypeLabel", action.step_type)}</td>
+<td>{_label(prefix + "_subTypeLabel", action.subtype)}</td>
+<td>{_label(prefix + "_actionQtyLabel", action.quantity)}</td>
+<td>{_label(prefix + "_actionCostLabel", action.cost)}</td>
+<td>{_label(prefix + "_carbonFootprintLabel", action.carbon_footprint)}</td></tr>"""
+                )
+
+        postbacks = [
+            REFRESH_BUTTON,
+            NEW_PART_BUTTON,
+            NEW_ACTION_BUTTON,
+            GRID,
+            GO_TO_PAGE_BUTTON,
+            CHANGE_PAGE_SIZE_BUTTON,
+            NEXT_PAGE_BUTTON,
+            FIRST_PAGE_BUTTON,
+        ]
+        modal = ""
+        if state["modal"] == "part":
+            modal = _part_modal()
+            postbacks.append(SAVE_PART_BUTTON)
+        elif state["modal"] == "action":
+            modal = _action_modal()
+            postbacks.append(SAVE_ACTION_BUTTON)
+
+        content = f"""<span class="message">{html.escape(message)}</span>
+{_button(REFRESH_BUTTON, "Refresh")}
+{_button(NEW_PART_BUTTON, "New Part")}
+{_button(NEW_ACTION_BUTTON, "New Action")}
+<table class="layout"><tr><td>
+<table id="{GRID}_ctl00">
+{"".join(part_rows)}
+</table>
+</td></tr></table>
+<div class="rgPager">
+<input type="submit" id="{FIRST_PAGE_BUTTON}" name="{_name(FIRST_PAGE_BUTTON)}" title="First Page" value=" " />
+<input type="submit" id="{NEXT_PAGE_BUTTON}" name="{_name(NEXT_PAGE_BUTTON)}" title="Next Page" value=" " />
+{_input(CURRENT_PAGE, state["page"])}
+<span id="{PAGE_COUNT_LABEL}">of {page_count}</span>
+{_link_button(GO_TO_PAGE_BUTTON, "Go")}
+{_input(CHANGE_PAGE_SIZE_FIELD, state["page_size"])}
+{_link_button(CHANGE_PAGE_SIZE_BUTTON, "Change")}
+</div>
+<table id="{ACTION_GRID}_ctl00">
+{"".join(action_rows)}
+</table>
+{modal}"""
+        self._respond(
+            self._render(
+                "BoM Editor",
+                content,
+                postbacks,
+                state,
+                action=f"{BOM_EDIT_PATH}?rev={state['revision']}",
+            )
+        )
+
+    def _editor_event(
+        self, state: dict[str, Any], target: Optional[str], argument: str
+    ) -> str:
+        """Apply a postback to the editor state, returning any message."""
+        bom = self.tool.revision(state["revision"])
+        page_first = (state["page"] - 1) * state["page_size"]
+        modal, state["modal"] = state["modal"], None
+
+        match target:
+            case None:
+                return ""
+            case name if name == _name(REFRESH_BUTTON):
+                return ""
+            case name if name == _name(NEW_PART_BUTTON):
+                state["modal"] = "part"
+            case name if name == _name(NEW_ACTION_BUTTON):
+                if state["selected"] is None:
+                    return "Select a part before adding an action"
+                state["modal"] = "action"
+            case name if name == _name(GRID):
+                row = int(argument.split(";")[1])
+                state["selected"] = page_first + row
+            case name if name == _name(GO_TO_PAGE_BUTTON):
+                state["page"] = _int(self._field(CURRENT_PAGE), state["page"])
+            case name if name == _name(NEXT_PAGE_BUTTON):
+                state["page"] += 1
+            case name if name == _name(FIRST_PAGE_BUTTON):
+                state["page"] = 1
+            case name if name == _name(CHANGE_PAGE_SIZE_BUTTON):
+                page_size = _int(self._field(CHANGE_PAGE_SIZE_FIELD), 0)
+                if 1 <= page_size <= self.tool.max_page_size:
+                    state["page_size"] = page_size
+                    state["page"] = 1
+            case name if name == _name(SAVE_PART_BUTTON) and modal == "part":
+                return self._save_part(bom, state)
+            case name if (
+                name == _name(SAVE_ACTION_BUTTON) and modal == "action"
+            ):
+                return self._save_action(bom, state)
+        return ""
+
+    def _save_part(self, bom: MockRevision, state: dict[str, Any]) -> str:
+        name = self._field(PART_NAME_FIELD)
+        quantity = _int(self._field(QUANTITY_FIELD), 0)
+        system = self._field(SYSTEM_DROPDOWN)
+        if system not in FSUKSystems or not name:
+            state["modal"] = "part"
+            return "Please complete all required fields"
+        if len(name) > PART_NAME_CHARACTER_LIMIT:
+            state["modal"] = "part"
+            return "Part name is too long"
+        if not 1 <= quantity <= MAXIMUM_QUANTITY:
+            state["modal"] = "part"
+            return "Invalid quantity"
+
+        make_or_buy = self.form.get(_name(MB_OPTIONS), "Make")
+        with self.tool.lock:
+            bom.parts.append(
+                MockPart(
+                    system=system,
+                    assembly=self._field(ASSEMBLY_DROPDOWN),
+                    name=name,
+                    quantity=quantity,
+                    make_or_buy=make_or_buy,
+                    comment=self._field(COMMENT_FIELD),
+                    cost=self._field(COST_FIELD)
+                    if make_or_buy == "Buy"
+                    else "",
+                    cost_comment=self._field(COST_COMMENT_FIELD),
+                )
+            )
+        return f"Part '{name}' saved"
+
+    def _save_action(self, bom: MockRevision, state: dict[str, Any]) -> str:
+        quantity = _int(self._field(ACTION_QUANTITY_FIELD), 0)
+        if not 1 <= quantity <= MAXIMUM_QUANTITY:
+            state["modal"] = "action"
+            return "Invalid quantity"
+
+        action = MockAction(
+            step_type=self._field(ACTION_TYPE_DROPDOWN),
+            subtype=self._field(ACTION_SUBTYPE_FIELD),
+            quantity=quantity,
+            comment=self._field(ACTION_COMMENT_FIELD),
+            cost=self._field(ACTION_COST_FIELD),
+            cost_comment=self._field(ACTION_COST_COMMENT_FIELD),
+            carbon_footprint=self._field(ACTION_CARBON_FOOTPRINT_FIELD),
+            carbon_comment=self._field(ACTION_CARBON_COMMENT_FIELD),
+        )
+        with self.tool.lock:
+            bom.parts[state["selected"]].actions.append(action)
+        return f"Action '{action.subtype}' saved"
+
+
+def _encode(value: Any) -> str:
+    return base64.b64encode(json.dumps(value).encode()).decode()
+
+
+def _decode(value: str) -> Any:
+    try:
+        return json.loads(base64.b64decode(value))
+    except ValueError:
+        return None
+
+
+def _int(text: str, default: int) -> int:
+    try:
+        return int(float(text))
+    except ValueError:
+        return default
+
+
+def _input(id: str, value: Any = "", type: str = "text") -> str:
+    return f'<input type="{type}" id="{id}" name="{_name(id)}" value="{html.escape(str(value))}" />'
+
+
+def _button(id: str, text: str) -> str:
+    return (
+        f'<input type="submit" id="{id}" name="{_name(id)}" value="{text}" />'
+    )
+
+
+def _link_button(id: str, text: str) -> str:
+    return f"<a id=\"{id}\" href=\"javascript:__doPostBack('{_name(id)}','')\">{text}</a>"
+
+
+def _label(id: str, text: Any) -> str:
+    return f'<span id="{id}">{html.escape(str(text))}</span>'
+
+
+def _select(id: str, options: list[str]) -> str:
+    rendered = "".join(
+        f'<option value="{html.escape(option)}">{html.escape(option)}</option>'
+        for option in options
+    )
+    return f'<select id="{id}" name="{_name(id)}"><option value=""></option>{rendered}</select>'
+
+
+def _textarea(id: str) -> str:
+    return f'<textarea id="{id}" name="{_name(id)}"></textarea>'
+
+
+def _part_modal() -> str:
+    return f"""<div class="modal" id="partModal">
+{_select(SYSTEM_DROPDOWN, [system.value for system in FSUKSystems])}
+{_input(ASSEMBLY_DROPDOWN)}
+{_input(PART_NAME_FIELD)}
+{_input(QUANTITY_FIELD, 1)}
+{_textarea(COMMENT_FIELD)}
+<input type="radio" id="{MAKE_RADIO_BUTTON}" name="{_name(MAKE_RADIO_BUTTON)}" value="Make" checked />
+<input type="radio" id="{BUY_RADIO_BUTTON}" name="{_name(BUY_RADIO_BUTTON)}" value="Buy" />
+{_input(COST_FIELD)}
+{_input(COST_COMMENT_FIELD)}
+{_button(SAVE_PART_BUTTON, "Save")}
+</div>"""
+
+
+def _action_modal() -> str:
+    return f"""<div class="modal" id="actionModal">
+{_select(ACTION_TYPE_DROPDOWN, VALID_STEP_TYPES)}
+{_input(ACTION_SUBTYPE_FIELD)}
+{_input(ACTION_QUANTITY_FIELD, 1)}
+{_textarea(ACTION_COMMENT_FIELD)}
+{_input(ACTION_COST_FIELD)}
+{_input(ACTION_COST_COMMENT_FIELD)}
+{_input(ACTION_CARBON_FOOTPRINT_FIELD)}
+{_input(ACTION_CARBON_COMMENT_FIELD)}
+{_button(SAVE_ACTION_BUTTON, "Save")}
+</div>"""
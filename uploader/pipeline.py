@@ -0,0 +1,116 @@
+"""
+This module imports and validates a Bill of Materials in the background, so that
+rows are ready by the time the website is.
+"""
+
+import logging
+from itertools import batched
+from queue import SimpleQueue
+from threading import Event, Thread
+from typing import Iterable, Iterator, Optional, Sequence
+
+from uploader.data import BillOfMaterials, RowData
+from uploader.validator import (
+    HEADER_ROWS,
+    ValidationError,
+    ValidationReport,
+    find_issues,
+)
+
+logger = logging.getLogger("uploader.pipeline")
+
+_END = None
+
+# Rows validated together; large enough for the column rules to pay off, small
+# enough that the first rows are released almost immediately
+CHUNK_SIZE = 256
+
+
+class RowPipeline(object):
+    """
+    Parses and validates rows on a background thread, queueing them for upload.
+
+    In strict mode, no rows are released until every row has passed
+    validation. Otherwise rows are released as soon as they pass, and the first
+    invalid row stops the upload. Issues are numbered by row of the file,
+    starting from `first_row`.
+    """
+
+    def __init__(
+        self,
+        rows: Iterable[RowData],
+        strict: bool = True,
+        first_row: int = HEADER_ROWS + 1,
+    ) -> None:
+        self.strict = strict
+        self.rows: list[RowData] = []
+        self.report = ValidationReport(first_row=first_row)
+        self.error: Optional[BaseException] = None
+        self.finished = Event()
+        self.queue: SimpleQueue[Optional[RowData]] = SimpleQueue()
+        self.thread = Thread(target=self._produce, args=(rows,), daemon=True)
+        self.thread.start()
+
+    def _produce(self, rows: Iterable[RowData]) -> None:
+        try:
+            for chunk, columns in _chunks(rows):
+                first_row = self.report.first_row + self.report.rows
+                issues = find_issues(columns, first_row)
+                for issue in issues:
+                    logger.warning(issue)
+                self.report.issues.extend(issues)
+                self.report.rows += len(chunk)
+
+                # Without strict mode, release the rows before the first
+                # invalid one and stop there
+                if issues and not self.strict:
+                    chunk = chunk[: issues[0].row - first_row]
+                for row in chunk:
+                    self.rows.append(row)
+                    self.queue.put(row)
+                if issues and not self.strict:
+                    raise ValidationError(self.report.error_count)
+
+            if self.report.error_count:
+                raise ValidationError(self.report.error_count)
+            logger.info(f"Loaded and validated {len(self.rows)} rows of data.")
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.finished.set()
+            self.queue.put(_END)
+
+    def collect(self) -> list[RowData]:
+        """Wait until every row has been imported and validated."""
+        self.finished.wait()
+        if self.error is not None:
+            raise self.error
+        return self.rows
+
+    def __iter__(self) -> Iterator[RowData]:
+        """Yield rows as they are released for upload."""
+        if self.strict:
+            yield from self.collect()
+            return
+
+        while (row := self.queue.get()) is not _END:
+            yield row
+        if self.error is not None:
+            raise self.error
+
+    @property
+    def total(self) -> Optional[int]:
+        """Get the number of rows, once they have all been read."""
+        return len(self.rows) if self.finished.is_set() else None
+
+
+def _chunks(
+    rows: Iterable[RowData],
+) -> Iterator[tuple[Sequence[RowData], BillOfMaterials]]:
+    """Split rows into chunks, each with its columns for validation."""
+    # Rows that are already in columns are checked in one pass
+    if isinstance(rows, BillOfMaterials):
+        yield rows, rows
+        return
+    for chunk in batched(rows, CHUNK_SIZE):
+        yield chunk, BillOfMaterials(chunk)
@@ -0,0 +1,213 @@
+"""
+This module reads the records of a Bill of Materials from each supported file
+format.
+
+Record readers yield the header, then one list of values per row. Values are
+strings, or numbers where the format stores them as numbers. Columnar readers
+return each whole column at once, so it can be loaded straight into a
+BillOfMaterials.
+"""
+
+import csv
+import json
+import logging
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+from xml.etree import ElementTree
+
+logger = logging.getLogger("uploader.readers")
+
+type RecordReader = Callable[[Path, str], Iterator[list[Any]]]
+type ColumnReader = Callable[[Path], dict[str, list[Any]]]
+
+
+@dataclass
+class FileFormat(object):
+    """A file format a Bill of Materials can be imported from."""
+
+    name: str
+    suffix: str
+    read_records: Optional[RecordReader] = None
+    read_columns: Optional[ColumnReader] = None
+
+
+FILE_FORMATS: dict[str, FileFormat] = {}
+
+
+@dataclass
+class MissingDependencyError(Exception):
+    """Raised if a file format needs a package that is not installed."""
+
+    format: str
+    package: str
+
+    def __str__(self) -> str:
+        return (
+            f"Reading {self.format} files requires '{self.package}'; "
+            f"install it with 'pip install {self.package}'."
+        )
+
+
+def register_format(
+    name: str,
+    suffix: str,
+    read_records: Optional[RecordReader] = None,
+    read_columns: Optional[ColumnReader] = None,
+) -> None:
+    """Add a file format, replacing any other format with the same suffix."""
+    FILE_FORMATS[suffix] = FileFormat(name, suffix, read_records, read_columns)
+
+
+def read_csv(filepath: Path, delimiter: str) -> Iterator[list[Any]]:
+    """Read the header and rows of a CSV file, skipping blank lines."""
+    with open(filepath, newline="") as file:
+        for values in csv.reader(file, delimiter=delimiter):
+            if values:
+                yield values
+
+
+def read_jsonl(filepath: Path, delimiter: str) -> Iterator[list[Any]]:
+    """
+    Read a file of JSON objects, one per line.
+
+    The header is taken from the keys of the first object, and missing keys in
+    later objects are read as blank.
+    """
+    with open(filepath) as file:
+        fieldnames: Optional[list[str]] = None
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if fieldnames is None:
+                fieldnames = list(record)
+                yield fieldnames
+            yield [_blank_if_null(record.get(name)) for name in fieldnames]
+
+
+XLSX_NAMESPACE = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+XLSX_RELATIONSHIP = (
+    "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+)
+XLSX_PACKAGE_NAMESPACE = (
+    "{http://schemas.openxmlformats.org/package/2006/relationships}"
+)
+XLSX_ROW = f"{XLSX_NAMESPACE}row"
+XLSX_CELL = f"{XLSX_NAMESPACE}c"
+XLSX_VALUE = f"{XLSX_NAMESPACE}v"
+XLSX_TEXT = f"{XLSX_NAMESPACE}t"
+
+
+def read_xlsx(filepath: Path, delimiter: str) -> Iterator[list[Any]]:
+    """
+    Read the rows of the first worksheet of an Excel workbook.
+
+    Only the standard library is used, streaming the worksheet's XML. Numbers
+    are read as numbers, and everything else as text.
+    """
+    with zipfile.ZipFile(filepath) as workbook:
+        shared_strings = _xlsx_shared_strings(workbook)
+        columns: dict[str, int] = {}
+        with workbook.open(_xlsx_first_sheet(workbook)) as sheet:
+            for _, element in ElementTree.iterparse(sheet):
+                if element.tag != XLSX_ROW:
+                    continue
+                values: list[Any] = []
+                for cell in element.iter(XLSX_CELL):
+                    # Blank cells are left out, so place cells by reference
+                    letters = cell.get("r", "").rstrip("0123456789")
+                    column = columns.get(letters)
+                    if column is None:
+                        column = columns[letters] = _xlsx_column(letters)
+                    if column < 0:
+                        column = len(values)
+                    values.extend([""] * (column - len(values)))
+                    values.append(_xlsx_value(cell, shared_strings))
+                element.clear()
+                if any(value != "" for value in values):
+                    yield values
+
+
+def _xlsx_first_sheet(workbook: zipfile.ZipFile) -> str:
+    """Find the path of the first worksheet in a workbook."""
+    root = ElementTree.fromstring(workbook.read("xl/workbook.xml"))
+    sheet = root.find(f"{XLSX_NAMESPACE}sheets/{XLSX_NAMESPACE}sheet")
+    if sheet is None:
+        raise ValueError("Workbook contains no worksheets")
+
+    relationships = ElementTree.fromstring(
+        workbook.read("xl/_rels/workbook.xml.rels")
+    )
+    for relationship in relationships.iter(
+        f"{XLSX_PACKAGE_NAMESPACE}Relationship"
+    ):
+        if relationship.get("Id") == sheet.get(XLSX_RELATIONSHIP):
+            # Targets are relative to the workbook, unless absolute
+            target = relationship.get("Target", "")
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return f"xl/{target}"
+    raise ValueError("Unable to locate the first worksheet")
+
+
+def _xlsx_shared_strings(workbook: zipfile.ZipFile) -> list[str]:
+    """Read the table of strings shared between cells."""
+    if "xl/sharedStrings.xml" not in workbook.namelist():
+        return []
+    root = ElementTree.fromstring(workbook.read("xl/sharedStrings.xml"))
+    return [
+        "".join(text.text or "" for text in item.iter(XLSX_TEXT))
+        for item in root.iter(f"{XLSX_NAMESPACE}si")
+    ]
+
+
+def _xlsx_column(letters: str) -> int:
+    """Get the index of a column from its letters, or -1 if there are none."""
+    column = 0
+    for letter in letters:
+        column = column * 26 + ord(letter) - ord("A") + 1
+    return column - 1
+
+
+def _xlsx_value(cell: ElementTree.Element, shared_strings: list[str]) -> Any:
+    """Read the value of a cell."""
+    match cell.get("t"):
+        case "s":
+            value = cell.findtext(XLSX_VALUE)
+            return shared_strings[int(value)] if value else ""
+        case "inlineStr":
+            return "".join(text.text or "" for text in cell.iter(XLSX_TEXT))
+        case "str" | "b" | "e":
+            return cell.findtext(XLSX_VALUE) or ""
+        case _:
+            value = cell.findtext(XLSX_VALUE)
+            if not value:
+                return ""
+            number = float(value)
+            return int(number) if number.is_integer() else number
+
+
+def read_parquet(filepath: Path) -> dict[str, list[Any]]:
+    """Read every column of a Parquet file."""
+    try:
+        import pyarrow.parquet as parquet
+    except ModuleNotFoundError:
+        raise MissingDependencyError("Parquet", "pyarrow")
+
+    table = parquet.read_table(filepath)
+    return {
+        name: [_blank_if_null(value) for value in column.to_pylist()]
+        for name, column in zip(table.column_names, table.columns)
+    }
+
+
+def _blank_if_null(value: Any) -> Any:
+    return "" if value is None else value
+
+
+register_format("CSV", ".csv", read_records=read_csv)
+register_format("Excel", ".xlsx", read_records=read_xlsx)
+register_format("JSON Lines", ".jsonl", read_records=read_jsonl)
+register_format("Parquet", ".parquet", read_columns=read_parquet)
@@ -0,0 +1,150 @@
+"""
+This module plans the order in which parts and steps are uploaded, so that the
+parts grid is navigated as little as possible.
+"""
+
+import logging
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Container, Iterator, Mapping, Optional
+
+from uploader.data import Cursor, RowData
+from uploader.tree import BomTree, PartNode
+
+logger = logging.getLogger("uploader.scheduler")
+
+
+class OperationKind(StrEnum):
+    """Enum of the operations performed on the FSUK website."""
+
+    PART = "part"
+    STEP = "step"
+
+
+@dataclass
+class Operation(object):
+    """A part or step to upload, and the grid page its part is expected on."""
+
+    kind: OperationKind
+    index: int
+    row: RowData
+    cursor: Cursor
+    page: Optional[int] = None
+
+    def __str__(self) -> str:
+        page = f" (page {self.page})" if self.page is not None else ""
+        return f"{self.index}: {self.kind} '{self.row}'{page}"
+
+
+@dataclass
+class UploadPlan(object):
+    """The operations of an upload, in the order they will be performed."""
+
+    operations: list[Operation]
+
+    @property
+    def part_count(self) -> int:
+        return sum(op.kind == OperationKind.PART for op in self.operations)
+
+    @property
+    def step_count(self) -> int:
+        return sum(op.kind == OperationKind.STEP for op in self.operations)
+
+    @property
+    def selections(self) -> int:
+        """Count the runs of steps, each needing its part selected."""
+        selections = 0
+        previous: Optional[Operation] = None
+        for op in self.operations:
+            if op.kind == OperationKind.STEP and (
+                previous is None
+                or previous.kind != OperationKind.STEP
+                or previous.cursor != op.cursor
+            ):
+                selections += 1
+            previous = op
+        return selections
+
+    @property
+    def navigations(self) -> int:
+        """Estimate how many times the parts grid changes page to select parts."""
+        return sum(page is not None for page, _ in self._with_navigations())
+
+    def describe(self) -> Iterator[str]:
+        """Describe each operation, and each change of page, in order."""
+        for page, op in self._with_navigations():
+            if page is not None:
+                yield f"Go to page {page}"
+            yield str(op)
+
+    def _with_navigations(self) -> Iterator[tuple[Optional[int], Operation]]:
+        """Pair each operation with the page the grid must change to first."""
+        current: Optional[int] = None
+        for op in self.operations:
+            navigate = None
+            if op.page is not None:
+                if op.kind == OperationKind.STEP and current not in (
+                    None,
+                    op.page,
+                ):
+                    navigate = op.page
+                current = op.page
+            yield navigate, op
+
+
+def plan_upload(
+    tree: BomTree,
+    part_pages: Optional[Mapping[str, int]] = None,
+    page_size: Optional[int] = None,
+    skip: Container[int] = (),
+) -> UploadPlan:
+    """
+    Plan the upload of every part and step in a tree.
+
+    New parts are added to the end of the parts grid, where it is left after
+    saving them, so each is uploaded followed by its steps. Steps for parts that
+    are already on the website are uploaded afterwards, grouped by the page
+    their part is on from the last page back, so each page is visited once.
+    Every parent part is uploaded before its steps. Rows in `skip` are left out.
+    """
+    part_pages = part_pages if part_pages is not None else {}
+    operations: list[Operation] = []
+    existing_parts: list[tuple[PartNode, Optional[int]]] = []
+    new_parts = 0
+
+    for part in tree.parts():
+        page = part_pages.get(part.name) if part.name is not None else None
+        if part.index is None or part.row is None or part.index in skip:
+            existing_parts.append((part, page))
+            continue
+
+        if page_size:
+            page = (len(part_pages) + new_parts) // page_size + 1
+        new_parts += 1
+        operations.append(
+            Operation(
+                OperationKind.PART, part.index, part.row, part.cursor, page
+            )
+        )
+        operations.extend(_step_operations(part, page, skip))
+
+    existing_parts.sort(key=lambda item: (item[1] is None, -(item[1] or 0)))
+    for part, page in existing_parts:
+        operations.extend(_step_operations(part, page, skip))
+
+    plan = UploadPlan(operations)
+    logger.info(
+        f"Planned {plan.part_count} parts and {plan.step_count} steps, "
+        f"expecting {plan.navigations} page navigations"
+    )
+    return plan
+
+
+def _step_operations(
+    part: PartNode, page: Optional[int], skip: Container[int]
+) -> list[Operation]:
+    return [
+        Operation(OperationKind.STEP, step.index, step.row, part.cursor, page)
+        for step in part.steps
+        if step.index not in skip
+    ]
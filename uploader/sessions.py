@@ -0,0 +1,208 @@
+"""
+This module keeps a pool of warm browser sessions that uploads can attach to.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from selenium import webdriver
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+
+from uploader.browser import BrowserOptions, PageLoadStrategy
+from uploader.cache import cache_directory
+
+logger = logging.getLogger("uploader.sessions")
+
+POOL_FILENAME = "sessions.json"
+HEALTH_CHECK_INTERVAL = 30
+
+
+@dataclass
+class PooledSession(object):
+    """A browser session kept open by the session broker."""
+
+    executor_url: str
+    session_id: str
+    headless: bool = False
+    page_load_strategy: str = PageLoadStrategy.NORMAL
+    block_assets: bool = False
+
+    @property
+    def options(self) -> BrowserOptions:
+        """Get the options the browser was launched with."""
+        return BrowserOptions(
+            self.headless,
+            PageLoadStrategy(self.page_load_strategy),
+            self.block_assets,
+        )
+
+    @property
+    def lock_path(self) -> Path:
+        return cache_directory() / f"session-{self.session_id}.lock"
+
+
+class _AttachedFirefox(webdriver.Remote):
+    """Remote WebDriver attached to an existing session instead of a new one."""
+
+    def __init__(self, session: PooledSession) -> None:
+        self._existing_session_id = session.session_id
+        super().__init__(
+            command_executor=session.executor_url,
+            options=webdriver.FirefoxOptions(),
+        )
+
+    def start_session(self, capabilities: dict) -> None:
+        self.session_id = self._existing_session_id
+        self.caps = {}
+
+
+class ClaimedSession(object):
+    """A pooled browser session claimed for use by this process."""
+
+    def __init__(self, session: PooledSession, driver: RemoteWebDriver) -> None:
+        self.session = session
+        self.driver = driver
+        self.options = session.options
+
+    def release(self) -> None:
+        """Return the session to the pool."""
+        self.session.lock_path.unlink(missing_ok=True)
+        logger.debug(f"Released browser session {self.session.session_id}")
+
+
+def _pool_path() -> Path:
+    return cache_directory() / POOL_FILENAME
+
+
+def _read_pool() -> list[PooledSession]:
+    """Read the sessions advertised by the session broker."""
+    try:
+        entries = json.loads(_pool_path().read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+    return [PooledSession(**entry) for entry in entries]
+
+
+def _write_pool(sessions: list[PooledSession]) -> None:
+    _pool_path().write_text(json.dumps([asdict(s) for s in sessions]))
+
+
+def _process_is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _is_alive(driver: RemoteWebDriver) -> bool:
+    """Check that a browser still answers commands."""
+    try:
+        _ = driver.current_url
+    except Exception:
+        return False
+    return True
+
+
+def _lock(session: PooledSession) -> bool:
+    """
+    Lock a session for this process, taking over stale locks.
+
+    The lock is written to a temporary file and linked into place, so another
+    process never sees a lock without its owner's PID.
+    """
+    pid = os.getpid()
+    temporary = session.lock_path.with_suffix(
+        f".{pid}-{threading.get_ident()}.tmp"
+    )
+    temporary.write_text(str(pid))
+    try:
+        for _ in range(2):
+            try:
+                os.link(temporary, session.lock_path)
+                return True
+            except FileExistsError:
+                pass
+            try:
+                owner = int(session.lock_path.read_text())
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                # Locks are only ever written whole, so assume it is held
+                return False
+            if _process_is_running(owner):
+                return False
+            session.lock_path.unlink(missing_ok=True)
+        return False
+    finally:
+        temporary.unlink(missing_ok=True)
+
+
+def claim_session() -> Optional[ClaimedSession]:
+    """Claim a free pooled browser session, if the session broker is running."""
+    for session in _read_pool():
+        if not _lock(session):
+            continue
+        try:
+            driver = _AttachedFirefox(session)
+        except Exception:
+            driver = None
+        if driver is None or not _is_alive(driver):
+            session.lock_path.unlink(missing_ok=True)
+            continue
+        logger.info(f"Attached to pooled browser session {session.session_id}")
+        return ClaimedSession(session, driver)
+    return None
+
+
+def _start_session(
+    options: BrowserOptions,
+) -> tuple[PooledSession, webdriver.Firefox]:
+    driver = webdriver.Firefox(options=options.firefox_options())
+    session = PooledSession(
+        driver.service.service_url,
+        driver.session_id or "",
+        options.headless,
+        options.page_load_strategy,
+        options.block_assets,
+    )
+    logger.info(f"Started browser session {session.session_id}")
+    return session, driver
+
+
+def serve_sessions(
+    browsers: int, options: Optional[BrowserOptions] = None
+) -> None:
+    """Keep a pool of warm browser sessions open until interrupted."""
+    if options is None:
+        options = BrowserOptions()
+    pool = [_start_session(options) for _ in range(browsers)]
+    _write_pool([session for session, _ in pool])
+    logger.info(f"Serving {browsers} browser sessions; press Ctrl+C to stop")
+
+    try:
+        while True:
+            time.sleep(HEALTH_CHECK_INTERVAL)
+
+            # Replace any browsers that have crashed or been closed
+            for i, (session, driver) in enumerate(pool):
+                if not _is_alive(driver):
+                    logger.warning(f"Browser session {session.session_id} died")
+                    session.lock_path.unlink(missing_ok=True)
+                    pool[i] = _start_session(options)
+                    _write_pool([session for session, _ in pool])
+    except KeyboardInterrupt:
+        logger.info("Stopping browser sessions")
+    finally:
+        _pool_path().unlink(missing_ok=True)
+        for session, driver in pool:
+            session.lock_path.unlink(missing_ok=True)
+            driver.quit()
@@ -0,0 +1,92 @@
+"""
+This module splits a Bill of Materials into independent shards for parallel upload.
+"""
+
+import logging
+from copy import copy
+from dataclasses import dataclass, field
+from enum import StrEnum
+
+from uploader.data import Cursor, RowData, RowType
+
+logger = logging.getLogger("uploader.shards")
+
+
+class ShardBy(StrEnum):
+    """Enum of the subtrees a Bill of Materials can be split into."""
+
+    SYSTEM = "system"
+    ASSEMBLY = "assembly"
+
+
+@dataclass
+class Subtree(object):
+    """A run of rows that can be uploaded independently of other subtrees."""
+
+    cursor: Cursor
+    rows: list[tuple[int, RowData]] = field(default_factory=list)
+
+
+@dataclass
+class Shard(object):
+    """A set of subtrees to be uploaded by one browser session."""
+
+    subtrees: list[Subtree] = field(default_factory=list)
+
+    @property
+    def row_count(self) -> int:
+        return sum(len(subtree.rows) for subtree in self.subtrees)
+
+
+def split_subtrees(
+    bom: list[RowData],
+    initial_cursor: Cursor,
+    shard_by: ShardBy = ShardBy.SYSTEM,
+) -> list[Subtree]:
+    """Split a Bill of Materials into system or assembly subtrees."""
+    subtree = Subtree(copy(initial_cursor))
+    subtrees = [subtree]
+    system = initial_cursor.system
+
+    for i, row in enumerate(bom):
+        if row.row_type == RowType.SYSTEM:
+            system = row.fsuk_system
+            subtree = Subtree(Cursor())
+            subtrees.append(subtree)
+        elif row.row_type == RowType.ASSEMBLY and shard_by == ShardBy.ASSEMBLY:
+            # Keep a system row together with its first assembly
+            if (
+                not subtree.rows
+                or subtree.rows[-1][1].row_type != RowType.SYSTEM
+            ):
+                subtree = Subtree(Cursor(system=system))
+                subtrees.append(subtree)
+        subtree.rows.append((i, row))
+
+    return [subtree for subtree in subtrees if subtree.rows]
+
+
+def shard_bill_of_materials(
+    bom: list[RowData],
+    sessions: int,
+    initial_cursor: Cursor,
+    shard_by: ShardBy = ShardBy.SYSTEM,
+) -> list[Shard]:
+    """Balance the subtrees of a Bill of Materials across browser sessions."""
+    subtrees = split_subtrees(bom, initial_cursor, shard_by)
+    shards = [Shard() for _ in range(min(sessions, len(subtrees)))]
+
+    # Assign the largest subtrees first, each to the least loaded shard
+    for subtree in sorted(subtrees, key=lambda s: len(s.rows), reverse=True):
+        shard = min(shards, key=lambda s: s.row_count)
+        shard.subtrees.append(subtree)
+
+    # Upload each shard's subtrees in the order they appear in the file
+    for shard in shards:
+        shard.subtrees.sort(key=lambda s: s.rows[0][0])
+
+    logger.info(
+        f"Split {len(subtrees)} {shard_by} subtrees into {len(shards)} shards "
+        f"of {[shard.row_count for shard in shards]} rows"
+    )
+    return shards
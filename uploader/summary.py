@@ -0,0 +1,96 @@
+"""
+This module summarises a Bill of Materials by system, without opening the FSUK
+website.
+"""
+
+from copy import copy
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+
+from rich import print
+from rich.table import Table
+
+from uploader.data import Cursor, RowData
+from uploader.diff import _key_rows
+from uploader.tree import build_tree
+from uploader.verify import _rollups
+
+
+@dataclass
+class SystemSummary(object):
+    """The size and total cost and carbon footprint of a system."""
+
+    system: str
+    assemblies: int = 0
+    parts: int = 0
+    steps: int = 0
+    cost: float = 0.0
+    carbon_footprint: float = 0.0
+
+
+@dataclass
+class BomSummary(object):
+    """The size of a Bill of Materials, and where its first row is uploaded."""
+
+    rows: int
+    initial_cursor: Cursor
+    systems: list[SystemSummary] = field(default_factory=list)
+
+
+def summarise_bill_of_materials(
+    bom: Sequence[RowData], initial_cursor: Optional[Cursor] = None
+) -> BomSummary:
+    """
+    Count the assemblies, parts and steps of each system, and total their cost
+    and carbon footprint as the website would.
+    """
+    cursor = initial_cursor if initial_cursor is not None else Cursor()
+    tree = build_tree(enumerate(bom), copy(cursor))
+    rollups = _rollups(list(_key_rows(bom, copy(cursor))))
+
+    summary = BomSummary(len(bom), cursor)
+    for node in tree.systems.values():
+        name = str(node.system)
+        parts = [
+            part
+            for assembly in node.assemblies.values()
+            for part in assembly.parts
+        ]
+        cost, carbon_footprint = rollups.get((name, None), (0.0, 0.0))
+        summary.systems.append(
+            SystemSummary(
+                name,
+                assemblies=len(node.assemblies),
+                # Parts already on the website only hold steps
+                parts=sum(part.row is not None for part in parts),
+                steps=sum(len(part.steps) for part in parts),
+                cost=cost,
+                carbon_footprint=carbon_footprint,
+            )
+        )
+    return summary
+
+
+def print_summary(summary: BomSummary) -> None:
+    """Print the size, cost and carbon footprint of each system."""
+    table = Table(
+        "System", "Assemblies", "Parts", "Steps", "Cost", "Carbon footprint"
+    )
+    for system in summary.systems:
+        table.add_row(
+            system.system,
+            str(system.assemblies),
+            str(system.parts),
+            str(system.steps),
+            f"{system.cost:.2f}",
+            f"{system.carbon_footprint:.2f}",
+        )
+    print(table)
+
+    print(
+        f"{summary.rows} rows, "
+        f"{sum(system.parts for system in summary.systems)} parts, "
+        f"{sum(system.steps for system in summary.systems)} steps"
+    )
+    if summary.initial_cursor != Cursor():
+        print(f"First row is uploaded beneath {summary.initial_cursor}")
@@ -0,0 +1,144 @@
+"""
+This module records timed spans around uploader operations and exports them as a
+Chrome trace.
+"""
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Iterator, Optional
+
+from rich import print
+from rich.table import Table
+
+logger = logging.getLogger("uploader.tracing")
+
+SUMMARY_LENGTH = 15
+
+
+@dataclass
+class Span(object):
+    """A timed operation, and what it operated on."""
+
+    name: str
+    category: str
+    start: float
+    duration: float
+    thread: int
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+
+class Tracer(object):
+    """Collects the spans recorded on every thread."""
+
+    def __init__(self) -> None:
+        self.origin = perf_counter()
+        self.spans: list[Span] = []
+        self.lock = threading.Lock()
+
+    def record(self, span: Span) -> None:
+        with self.lock:
+            self.spans.append(span)
+
+    def export_chrome_trace(self, path: Path) -> None:
+        """Write the spans in the Chrome trace event format."""
+        events = [
+            {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": (span.start - self.origin) * 1e6,
+                "dur": span.duration * 1e6,
+                "pid": os.getpid(),
+                "tid": span.thread,
+                "args": {k: str(v) for k, v in span.attributes.items()},
+            }
+            for span in self.spans
+        ]
+        path.write_text(json.dumps({"traceEvents": events}))
+        logger.info(f"Wrote {len(events)} spans to '{path}'")
+
+    def print_summary(self, length: int = SUMMARY_LENGTH) -> None:
+        """Print the operations that took the most time in total."""
+        by_name: dict[str, list[Span]] = {}
+        for span in self.spans:
+            if span.category != "row":
+                by_name.setdefault(span.name, []).append(span)
+
+        table = Table(
+            "Operation",
+            "Count",
+            "Total (s)",
+            "Mean (ms)",
+            "Max (ms)",
+            "Slowest",
+            title="Slowest operations",
+        )
+        ranked = sorted(
+            by_name.items(),
+            key=lambda item: sum(span.duration for span in item[1]),
+            reverse=True,
+        )
+        for name, spans in ranked[:length]:
+            total = sum(span.duration for span in spans)
+            slowest = max(spans, key=lambda span: span.duration)
+            table.add_row(
+                name,
+                str(len(spans)),
+                f"{total:.2f}",
+                f"{total / len(spans) * 1000:.1f}",
+                f"{slowest.duration * 1000:.1f}",
+                ", ".join(f"{k}={v}" for k, v in slowest.attributes.items()),
+            )
+        print(table)
+
+
+_tracer: Optional[Tracer] = None
+
+
+def start_tracing() -> Tracer:
+    """Start recording spans, returning the tracer that collects them."""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop_tracing() -> None:
+    global _tracer
+    _tracer = None
+
+
+@contextmanager
+def span(
+    name: str, category: str = "operation", **attributes: Any
+) -> Iterator[dict[str, Any]]:
+    """
+    Time a block as a span, if tracing is enabled.
+
+    Yields the span's attributes, so that results found inside the block can be
+    added to them.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield attributes
+        return
+
+    start = perf_counter()
+    try:
+        yield attributes
+    finally:
+        tracer.record(
+            Span(
+                name,
+                category,
+                start,
+                perf_counter() - start,
+                threading.get_native_id(),
+                attributes,
+            )
+        )
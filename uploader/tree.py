@@ -0,0 +1,123 @@
+"""
+This module arranges the rows of a Bill of Materials into a tree of systems,
+assemblies, parts and steps.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+from uploader.data import Cursor, FSUKSystems, RowData, RowType
+
+logger = logging.getLogger("uploader.tree")
+
+
+@dataclass
+class StepNode(object):
+    """A step, and its row in the Bill of Materials."""
+
+    index: int
+    row: RowData
+
+
+@dataclass
+class PartNode(object):
+    """
+    A part and the steps beneath it.
+
+    Parts that are already on the website, such as the part an upload resumes
+    part-way through, have no row.
+    """
+
+    name: Optional[str]
+    system: Optional[FSUKSystems]
+    assembly: Optional[str]
+    index: Optional[int] = None
+    row: Optional[RowData] = None
+    steps: list[StepNode] = field(default_factory=list)
+
+    @property
+    def cursor(self) -> Cursor:
+        return Cursor(self.system, self.assembly, self.name)
+
+
+@dataclass
+class AssemblyNode(object):
+    """An assembly and the parts beneath it."""
+
+    name: Optional[str]
+    parts: list[PartNode] = field(default_factory=list)
+
+
+@dataclass
+class SystemNode(object):
+    """A system and the assemblies beneath it."""
+
+    system: Optional[FSUKSystems]
+    assemblies: dict[Optional[str], AssemblyNode] = field(default_factory=dict)
+
+
+@dataclass
+class BomTree(object):
+    """A Bill of Materials arranged by system, assembly and part."""
+
+    systems: dict[Optional[FSUKSystems], SystemNode] = field(
+        default_factory=dict
+    )
+
+    def parts(self) -> Iterator[PartNode]:
+        """Iterate over every part, system by system."""
+        for system in self.systems.values():
+            for assembly in system.assemblies.values():
+                yield from assembly.parts
+
+    def steps(self) -> Iterator[StepNode]:
+        for part in self.parts():
+            yield from part.steps
+
+
+def build_tree(
+    rows: Iterable[tuple[int, RowData]], initial_cursor: Optional[Cursor] = None
+) -> BomTree:
+    """
+    Arrange rows into a tree, keeping the order of the file within each level.
+
+    Systems and assemblies that appear more than once are merged. Steps before
+    the first part belong to the initial cursor's part, and steps with no part
+    above them in their assembly belong to a part with no name.
+    """
+    cursor = initial_cursor if initial_cursor is not None else Cursor()
+    tree = BomTree()
+    system = cursor.system
+    assembly = cursor.assembly
+    part_name = cursor.part
+    part: Optional[PartNode] = None
+
+    def assembly_node() -> AssemblyNode:
+        system_node = tree.systems.setdefault(system, SystemNode(system))
+        return system_node.assemblies.setdefault(
+            assembly, AssemblyNode(assembly)
+        )
+
+    for i, row in rows:
+        match row.row_type:
+            case RowType.SYSTEM:
+                system = row.fsuk_system
+                assembly = part_name = part = None
+            case RowType.ASSEMBLY:
+                assembly = row.assembly.strip()
+                part_name = part = None
+            case RowType.PART:
+                part = PartNode(row.part.strip(), system, assembly, i, row)
+                assembly_node().parts.append(part)
+            case RowType.STEP:
+                if part is None:
+                    part = PartNode(part_name, system, assembly)
+                    assembly_node().parts.append(part)
+                part.steps.append(StepNode(i, row))
+
+    logger.debug(
+        f"Built tree of {len(tree.systems)} systems and "
+        f"{sum(1 for _ in tree.parts())} parts"
+    )
+    return tree
@@ -4,17 +4,66 @@ This module uploads a Bill of Materials to the FSUK website.
 
 import datetime as dt
 import logging
-from dataclasses import dataclass
-from typing import Optional
-
-from rich import print, progress
-
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from dataclasses import dataclass, field
+from functools import partial
+from threading import Event
+from typing import (
+    Callable,
+    Container,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+    Sequence,
+)
+
+from rich import progress
+
+from uploader.browser import BASE_URL, Backend, BrowserOptions
 from uploader.data import Cursor, RowData, RowType
+from uploader.diff import diff_bill_of_materials
+from uploader.editor import PAGE_SIZES
+from uploader.failures import (
+    PERMANENT_ERRORS,
+    DeferredQueue,
+    UploadFailure,
+    retry,
+)
+from uploader.httpinterface import HttpInterface
+from uploader.journal import UploadJournal
+from uploader.pipeline import RowPipeline
+from uploader.scheduler import Operation, OperationKind, UploadPlan, plan_upload
+from uploader.shards import Shard, ShardBy, shard_bill_of_materials
+from uploader.tracing import span
+from uploader.tree import build_tree
+from uploader.verify import VerificationReport, verify_snapshot
 from uploader.webinterface import WebInterface
 
 logger = logging.getLogger("uploader.uploader")
 
 
+type Interface = WebInterface | HttpInterface
+
+
+@dataclass
+class UploadStatistics(object):
+    """Timings collected from the sessions of an upload."""
+
+    rows: int
+    duration: float
+    operations: dict[str, list[float]]
+    waits: dict[str, tuple[int, float]]
+    pages_visited: int
+    failures: list[UploadFailure] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.duration if self.duration else 0.0
+
+
 @dataclass
 class UploadError(Exception):
     """Base class for errors raised during the upload process."""
@@ -56,41 +105,585 @@ class CannotLocateParentPartError(UploadError):
 
 
 def upload_bill_of_materials(
-    bom: list[RowData],
+    bom: list[RowData] | RowPipeline,
     username: str,
     password: str,
     initial_cursor: Optional[Cursor] = None,
     base_revision: int = 1,
     snapshot_label: str = "Bill of Materials",
-) -> None:
-    """Upload a Bill of Materials to the FSUK website."""
+    poll_frequency: float = 0.05,
+    sessions: int = 1,
+    shard_by: ShardBy = ShardBy.SYSTEM,
+    journal: Optional[UploadJournal] = None,
+    incremental: bool = False,
+    backend: Backend = Backend.BROWSER,
+    base_url: str = BASE_URL,
+    browser_options: Optional[BrowserOptions] = None,
+) -> UploadStatistics:
+    """
+    Upload a Bill of Materials to the FSUK website.
+
+    If a resumed journal is given, rows it records as complete are skipped and
+    the upload continues in the journal's snapshot. In incremental mode, only
+    rows that are not already in the snapshot are uploaded.
+
+    If given a pipeline that is still importing rows, the website is opened in
+    the meantime. Non-strict pipelines are uploaded from as rows arrive.
+
+    Browser options only apply to browsers launched for this upload, not to
+    those attached to from the session broker.
+    """
 
     logger.info("Running FSUK Bill of Materials Uploader")
+    start = time.perf_counter()
 
-    web_interface = WebInterface()
-    web_interface.log_in_to_account(username, password)
-
-    # Create new snapshot
     label = f"{snapshot_label} ({dt.datetime.now().strftime('%d %b %y %H:%M')})"
-    web_interface.create_snapshot(base_revision, label)
-
-    # Upload data
+    resume = False
+    if journal is not None and journal.label is not None:
+        resume = True
+        label = journal.label
+    elif journal is not None:
+        journal.start(label)
     cursor = initial_cursor if initial_cursor is not None else Cursor()
-    for i, row in progress.track(
-        enumerate(bom),
-        description="Uploading Bill of Materials...",
-        total=len(bom),
-    ):
-        logger.info(f"{i}/{len(bom)} Uploading {row.row_type.lower()} '{row}'")
-        match row.row_type:
-            case RowType.PART:
-                _upload_part(web_interface, row, cursor, True)
-            case RowType.STEP:
-                _upload_step(web_interface, row, cursor, True)
+    new_interface = partial(
+        _create_interface, backend, poll_frequency, base_url, browser_options
+    )
+
+    if sessions > 1:
+        # Shards can only be balanced once every row is known
+        if isinstance(bom, RowPipeline):
+            bom = bom.collect()
+        web_interfaces, failures = _upload_in_parallel(
+            bom,
+            username,
+            password,
+            cursor,
+            base_revision,
+            label,
+            new_interface,
+            sessions,
+            shard_by,
+            journal,
+            resume,
+            incremental,
+        )
+        _log_failures(failures)
+        return _collect_statistics(
+            web_interfaces, len(bom), time.perf_counter() - start, failures
+        )
+
+    web_interface = new_interface()
+    try:
+        web_interface.log_in_to_account(username, password)
+
+        # Create new snapshot, or reopen the one being resumed
+        if resume:
+            web_interface.open_snapshot(label)
+        else:
+            web_interface.create_snapshot(base_revision, label)
+
+        # Only wait for rows still being imported once the website is ready
+        if isinstance(bom, RowPipeline) and (bom.strict or incremental):
+            bom = bom.collect()
+
+        existing: set[int] = set()
+        if incremental:
+            existing = _find_existing_rows(web_interface, bom, cursor)
+
+        # Rows that fail are retried once every other row has been uploaded
+        deferred = DeferredQueue()
+
+        # Upload data
+        total = len(bom) if isinstance(bom, list) else None
+        with progress.Progress() as progress_bar:
+            task = progress_bar.add_task(
+                "Uploading Bill of Materials...", total=total
+            )
+
+            def on_upload() -> None:
+                if isinstance(bom, RowPipeline):
+                    progress_bar.update(task, total=bom.total)
+                progress_bar.advance(task)
+
+            # Rows still arriving from the pipeline are uploaded in file order
+            if isinstance(bom, RowPipeline):
+                _upload_rows(
+                    web_interface,
+                    enumerate(bom),
+                    cursor,
+                    total=total,
+                    on_upload=on_upload,
+                    journal=journal,
+                    existing=existing,
+                    deferred=deferred,
+                )
+            else:
+                plan = _plan_rows(
+                    enumerate(bom),
+                    cursor,
+                    web_interface.part_index,
+                    web_interface.page_size,
+                    journal,
+                    existing,
+                )
+                progress_bar.advance(task, len(bom) - len(plan.operations))
+                _upload_plan(
+                    web_interface,
+                    plan,
+                    total=total,
+                    on_upload=on_upload,
+                    journal=journal,
+                    deferred=deferred,
+                )
+        failures = _retry_deferred(web_interface, deferred, total, journal)
+    finally:
+        web_interface.release()
+
+    _log_failures(failures)
+    _log_wait_statistics(web_interface)
+    row_count = len(bom) if isinstance(bom, list) else len(bom.rows)
+    return _collect_statistics(
+        [web_interface], row_count, time.perf_counter() - start, failures
+    )
+
+
+def verify_upload(
+    bom: Sequence[RowData],
+    username: str,
+    password: str,
+    snapshot_label: str,
+    initial_cursor: Optional[Cursor] = None,
+    poll_frequency: float = 0.05,
+    backend: Backend = Backend.BROWSER,
+    base_url: str = BASE_URL,
+    browser_options: Optional[BrowserOptions] = None,
+) -> VerificationReport:
+    """
+    Check that a snapshot matches the Bill of Materials uploaded to it.
+
+    The whole snapshot is read in a fresh session, a page of the parts grid at
+    a time at the largest page size.
+    """
+    web_interface = _create_interface(
+        backend, poll_frequency, base_url, browser_options
+    )
+    try:
+        web_interface.log_in_to_account(username, password)
+        web_interface.open_snapshot(snapshot_label)
+        snapshot = web_interface.scrape_snapshot()
+    finally:
+        web_interface.release()
+    return verify_snapshot(snapshot, bom, initial_cursor)
 
-        cursor = _update_cursor(cursor, row)
 
-    logger.info("Bill of materials uploaded successfully!")
+def _upload_in_parallel(
+    bom: list[RowData],
+    username: str,
+    password: str,
+    initial_cursor: Cursor,
+    base_revision: int,
+    label: str,
+    new_interface: Callable[[], Interface],
+    sessions: int,
+    shard_by: ShardBy,
+    journal: Optional[UploadJournal],
+    resume: bool,
+    incremental: bool,
+) -> tuple[list[Interface], list[UploadFailure]]:
+    """
+    Upload shards of a Bill of Materials from several browser sessions.
+
+    Each session retries the rows it deferred once its shard is uploaded.
+    """
+    shards = shard_bill_of_materials(bom, sessions, initial_cursor, shard_by)
+    snapshot_created = Event()
+    existing: set[int] = set()
+
+    with progress.Progress() as progress_bar:
+        overall_task = progress_bar.add_task(
+            "Uploading Bill of Materials...", total=len(bom)
+        )
+
+        def upload_shard(
+            n: int, shard: Shard
+        ) -> tuple[Interface, list[UploadFailure]]:
+            task = progress_bar.add_task(
+                f"  Session {n + 1}", total=shard.row_count
+            )
+
+            def on_upload() -> None:
+                progress_bar.advance(task)
+                progress_bar.advance(overall_task)
+
+            web_interface = new_interface()
+            deferred = DeferredQueue()
+            try:
+                web_interface.log_in_to_account(username, password)
+
+                # The first session prepares the snapshot the others upload to
+                if n == 0:
+                    if resume:
+                        web_interface.open_snapshot(label)
+                    else:
+                        web_interface.create_snapshot(base_revision, label)
+                    if incremental:
+                        existing.update(
+                            _find_existing_rows(
+                                web_interface, bom, initial_cursor
+                            )
+                        )
+                    snapshot_created.set()
+                else:
+                    snapshot_created.wait()
+                    web_interface.open_snapshot(label)
+
+                for subtree in shard.subtrees:
+                    plan = _plan_rows(
+                        subtree.rows,
+                        subtree.cursor,
+                        web_interface.part_index,
+                        web_interface.page_size,
+                        journal,
+                        existing,
+                    )
+                    for _ in range(len(subtree.rows) - len(plan.operations)):
+                        on_upload()
+                    _upload_plan(
+                        web_interface,
+                        plan,
+                        total=len(bom),
+                        on_upload=on_upload,
+                        journal=journal,
+                        deferred=deferred,
+                    )
+                failures = _retry_deferred(
+                    web_interface, deferred, len(bom), journal
+                )
+            finally:
+                # Never leave the other sessions waiting for the snapshot
+                snapshot_created.set()
+                web_interface.release()
+            return web_interface, failures
+
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [
+                executor.submit(upload_shard, n, shard)
+                for n, shard in enumerate(shards)
+            ]
+            results = [future.result() for future in futures]
+
+    web_interfaces = [web_interface for web_interface, _ in results]
+    for web_interface in web_interfaces:
+        _log_wait_statistics(web_interface)
+    return web_interfaces, [
+        failure for _, failures in results for failure in failures
+    ]
+
+
+def _create_interface(
+    backend: Backend,
+    poll_frequency: float,
+    base_url: str,
+    browser_options: Optional[BrowserOptions] = None,
+) -> Interface:
+    """Open a browser or HTTP session with the FSUK website."""
+    if backend == Backend.HTTP:
+        return HttpInterface(base_url=base_url)
+    return WebInterface(
+        poll_frequency=poll_frequency,
+        base_url=base_url,
+        options=browser_options,
+    )
+
+
+def _upload_rows(
+    web_interface: Interface,
+    rows: Iterable[tuple[int, RowData]],
+    cursor: Cursor,
+    total: Optional[int],
+    on_upload: Callable[[], None] = lambda: None,
+    journal: Optional[UploadJournal] = None,
+    existing: Container[int] = (),
+    deferred: Optional[DeferredQueue] = None,
+) -> Cursor:
+    """
+    Upload rows, treating each part and its run of steps as one unit.
+
+    If a part fails, it is deferred along with its steps.
+    """
+    if deferred is None:
+        deferred = DeferredQueue()
+
+    def is_complete(i: int) -> bool:
+        if i in existing:
+            return True
+        return journal is not None and journal.is_complete(i)
+
+    for unit in _group_rows(rows):
+        steps: list[tuple[int, RowData]] = []
+        for i, row in unit:
+            if row.row_type == RowType.STEP:
+                if is_complete(i):
+                    on_upload()
+                else:
+                    steps.append((i, row))
+                continue
+
+            if not is_complete(i):
+                logger.info(
+                    f"{_position(i, total)} Uploading "
+                    f"{row.row_type.lower()} '{row}'"
+                )
+                uploaded = True
+                if row.row_type == RowType.PART:
+                    with span("row", "row", index=i, type=row.row_type):
+                        try:
+                            _upload_part(web_interface, row, cursor, True)
+                        except PERMANENT_ERRORS:
+                            raise
+                        except Exception as e:
+                            uploaded = False
+                            part_cursor = Cursor(
+                                cursor.system, cursor.assembly, row.part.strip()
+                            )
+                            deferred.defer(
+                                Operation(
+                                    OperationKind.PART, i, row, part_cursor
+                                ),
+                                e,
+                            )
+                if uploaded and journal is not None:
+                    journal.record(i)
+            cursor = _update_cursor(cursor, row)
+            on_upload()
+
+        if steps:
+            _upload_steps(
+                web_interface,
+                steps,
+                copy(cursor),
+                True,
+                total=total,
+                on_upload=on_upload,
+                journal=journal,
+                deferred=deferred,
+            )
+    return cursor
+
+
+def plan_bill_of_materials(
+    bom: list[RowData],
+    initial_cursor: Optional[Cursor] = None,
+    sessions: int = 1,
+    shard_by: ShardBy = ShardBy.SYSTEM,
+    journal: Optional[UploadJournal] = None,
+    page_size: Optional[int] = PAGE_SIZES[0],
+) -> list[UploadPlan]:
+    """
+    Plan the operations each session would carry out to upload a Bill of
+    Materials, without opening the website.
+
+    The snapshot is assumed to start with no parts, and the parts grid to show
+    the largest page size the website allows.
+    """
+    cursor = initial_cursor if initial_cursor is not None else Cursor()
+    if sessions <= 1:
+        return [_plan_rows(enumerate(bom), cursor, {}, page_size, journal)]
+
+    plans = []
+    for shard in shard_bill_of_materials(bom, sessions, cursor, shard_by):
+        operations: list[Operation] = []
+        part_pages: dict[str, int] = {}
+        for subtree in shard.subtrees:
+            plan = _plan_rows(
+                subtree.rows, subtree.cursor, part_pages, page_size, journal
+            )
+            # Later subtrees are planned around the parts uploaded before them
+            for op in plan.operations:
+                if op.kind == OperationKind.PART and op.page is not None:
+                    part_pages[op.row.part.strip()] = op.page
+            operations += plan.operations
+        plans.append(UploadPlan(operations))
+    return plans
+
+
+def _plan_rows(
+    rows: Iterable[tuple[int, RowData]],
+    cursor: Cursor,
+    part_pages: Mapping[str, int],
+    page_size: Optional[int],
+    journal: Optional[UploadJournal] = None,
+    existing: Container[int] = (),
+) -> UploadPlan:
+    """Plan the upload of rows around the parts already in the grid."""
+    rows = list(rows)
+    complete = {
+        i
+        for i, _ in rows
+        if i in existing or (journal is not None and journal.is_complete(i))
+    }
+    return plan_upload(
+        build_tree(rows, cursor),
+        part_pages,
+        page_size,
+        skip=complete,
+    )
+
+
+def _upload_plan(
+    web_interface: Interface,
+    plan: UploadPlan,
+    total: Optional[int],
+    on_upload: Callable[[], None] = lambda: None,
+    journal: Optional[UploadJournal] = None,
+    deferred: Optional[DeferredQueue] = None,
+) -> None:
+    """
+    Upload the operations of a plan, selecting each part once for its steps.
+
+    Operations that fail are deferred, along with the steps of failed parts.
+    """
+    if deferred is None:
+        deferred = DeferredQueue()
+    steps: list[Operation] = []
+
+    def upload_steps() -> None:
+        if steps:
+            _upload_steps(
+                web_interface,
+                [(op.index, op.row) for op in steps],
+                steps[0].cursor,
+                True,
+                total=total,
+                on_upload=on_upload,
+                journal=journal,
+                deferred=deferred,
+            )
+            steps.clear()
+
+    for op in plan.operations:
+        if op.kind == OperationKind.STEP:
+            if steps and steps[0].cursor != op.cursor:
+                upload_steps()
+            steps.append(op)
+            continue
+
+        upload_steps()
+        logger.info(f"{_position(op.index, total)} Uploading part '{op.row}'")
+        with span("row", "row", index=op.index, type=op.row.row_type):
+            try:
+                _upload_part(web_interface, op.row, op.cursor, True)
+            except PERMANENT_ERRORS:
+                raise
+            except Exception as e:
+                deferred.defer(op, e)
+            else:
+                if journal is not None:
+                    journal.record(op.index)
+        on_upload()
+    upload_steps()
+
+
+def _retry_deferred(
+    web_interface: Interface,
+    deferred: DeferredQueue,
+    total: Optional[int],
+    journal: Optional[UploadJournal] = None,
+) -> list[UploadFailure]:
+    """Retry the deferred operations once, returning those that still fail."""
+    if not deferred:
+        return []
+
+    operations = deferred.take()
+    logger.info(f"Retrying {len(operations)} deferred rows")
+    retry(web_interface.recover, "reopen the snapshot")
+    _upload_plan(
+        web_interface,
+        UploadPlan(operations),
+        total=total,
+        journal=journal,
+        deferred=deferred,
+    )
+    return deferred.failures()
+
+
+def _find_existing_rows(
+    web_interface: Interface, bom: list[RowData], initial_cursor: Cursor
+) -> set[int]:
+    """Find the rows of a Bill of Materials that are already in the snapshot."""
+    diff = diff_bill_of_materials(
+        web_interface.scrape_snapshot(), bom, initial_cursor
+    )
+    for i in diff.updates:
+        logger.warning(
+            f"{bom[i].row_type} '{bom[i]}' differs from the snapshot; "
+            "edit it manually on the FSUK website"
+        )
+    return diff.existing
+
+
+def _log_failures(failures: list[UploadFailure]) -> None:
+    """Log whether every row was uploaded, and which rows were not."""
+    if not failures:
+        logger.info("Bill of materials uploaded successfully!")
+        return
+
+    logger.error(f"{len(failures)} rows could not be uploaded:")
+    for failure in failures:
+        logger.error(str(failure))
+
+
+def _log_wait_statistics(web_interface: Interface) -> None:
+    """Log how long was spent waiting on the website."""
+    statistics = web_interface.wait_statistics()
+    total = sum(duration for _, duration in statistics.values())
+    logger.info(
+        f"Spent {total:.1f}s waiting for the FSUK website, visiting "
+        f"{web_interface.pages_visited} pages of the parts grid"
+    )
+    for kind, (count, duration) in statistics.items():
+        logger.debug(f"{kind}: {count} waits, {duration:.1f}s")
+
+
+def _collect_statistics(
+    web_interfaces: list[Interface],
+    rows: int,
+    duration: float,
+    failures: Optional[list[UploadFailure]] = None,
+) -> UploadStatistics:
+    """Combine the timings recorded by each session of an upload."""
+    operations: dict[str, list[float]] = {}
+    waits: dict[str, tuple[int, float]] = {}
+    pages_visited = 0
+    for web_interface in web_interfaces:
+        pages_visited += web_interface.pages_visited
+        for record in web_interface.operation_records:
+            operations.setdefault(record.name, []).append(record.duration)
+        for kind, (count, total) in web_interface.wait_statistics().items():
+            previous_count, previous_total = waits.get(kind, (0, 0.0))
+            waits[kind] = (previous_count + count, previous_total + total)
+    return UploadStatistics(
+        rows, duration, operations, waits, pages_visited, failures or []
+    )
+
+
+def _position(i: int, total: Optional[int]) -> str:
+    """Describe how far through the Bill of Materials a row is."""
+    return f"{i}/{total if total is not None else '?'}"
+
+
+def _group_rows(
+    rows: Iterable[tuple[int, RowData]],
+) -> Iterator[list[tuple[int, RowData]]]:
+    """Group rows so that each row is followed by its run of steps."""
+    unit: list[tuple[int, RowData]] = []
+    for i, row in rows:
+        if unit and row.row_type != RowType.STEP:
+            yield unit
+            unit = []
+        unit.append((i, row))
+    if unit:
+        yield unit
 
 
 def _update_cursor(cursor: Cursor, row: RowData) -> Cursor:
@@ -109,40 +702,88 @@ def _update_cursor(cursor: Cursor, row: RowData) -> Cursor:
 
 
 def _upload_part(
-    web_interface: WebInterface,
+    web_interface: Interface,
     data: RowData,
     cursor: Cursor,
     upload_cost: bool,
 ) -> None:
-    """Upload a part to the FSUK website."""
+    """Upload a part to the FSUK website, retrying transient failures."""
     if cursor.system is None:
         raise NoParentSystemError(data)
     if cursor.assembly is None:
         raise NoParentAssemblyError(data)
-    try:
+    system, assembly = cursor.system, cursor.assembly
+    name = data.part.strip()
+    existed = name in web_interface.part_index
+
+    def upload() -> None:
+        # A part saved just before an error appears once the grid is reread
+        if not existed and name in web_interface.part_index:
+            logger.info(f"Part '{data}' was saved before the error")
+            return
         web_interface.upload_part(
-            data,
-            system=cursor.system,
-            assembly=cursor.assembly,
-            upload_cost=upload_cost,
+            data, system=system, assembly=assembly, upload_cost=upload_cost
         )
-    except Exception as e:
-        print(e)
-        print(f"Error: Unable to upload part '{data}'")
 
+    retry(upload, f"upload part '{data}'", web_interface.recover)
 
-def _upload_step(
-    web_interface: WebInterface,
-    data: RowData,
+
+def _upload_steps(
+    web_interface: Interface,
+    steps: list[tuple[int, RowData]],
     cursor: Cursor,
     upload_cost: bool,
+    total: Optional[int],
+    on_upload: Callable[[], None] = lambda: None,
+    journal: Optional[UploadJournal] = None,
+    deferred: Optional[DeferredQueue] = None,
 ) -> None:
-    """Upload a step to the FSUK website."""
-    if cursor.part is None:
-        raise NoParentPartError(data)
+    """
+    Upload a run of steps belonging to the same part to the FSUK website.
 
-    part_found = web_interface.select_part(cursor.part)
-    if not part_found:
-        raise CannotLocateParentPartError(data, parent=cursor.part)
+    Steps that fail are deferred, as are all of them if their part was.
+    """
+    if deferred is None:
+        deferred = DeferredQueue()
 
-    web_interface.upload_step(data, upload_cost=upload_cost)
+    def defer(steps: list[tuple[int, RowData]], error: Exception | str) -> None:
+        for i, data in steps:
+            op = Operation(OperationKind.STEP, i, data, cursor)
+            deferred.defer(op, error)
+            on_upload()
+
+    if cursor.part is None:
+        defer(steps, NoParentPartError(steps[0][1]))
+        return
+    if deferred.part_failed(cursor):
+        defer(steps, f"part '{cursor.part}' was not uploaded")
+        return
+    part = cursor.part
+    part_selected = False
+
+    for n, (i, data) in enumerate(steps):
+        logger.info(f"{_position(i, total)} Uploading step '{data}'")
+
+        def upload() -> None:
+            nonlocal part_selected
+            # Only reselect the part if the grid has lost the selection
+            if not part_selected or not web_interface.part_is_selected(part):
+                part_selected = web_interface.select_part(part)
+                if not part_selected:
+                    raise CannotLocateParentPartError(data, parent=part)
+            web_interface.upload_step(data, upload_cost=upload_cost)
+
+        with span("row", "row", index=i, type=data.row_type):
+            try:
+                retry(upload, f"upload step '{data}'", web_interface.recover)
+            except CannotLocateParentPartError as e:
+                defer(steps[n:], e)
+                return
+            except PERMANENT_ERRORS:
+                raise
+            except Exception as e:
+                defer([(i, data)], e)
+                continue
+        if journal is not None:
+            journal.record(i)
+        on_upload()
@@ -1,14 +1,26 @@
 """
 This module checks a Bill of Materials for errors before it is uploaded.
+
+Each rule is a single pass over the columns of a BillOfMaterials, so the cost of
+validation is a handful of scans rather than a function call per rule per row.
 """
 
+import csv
+import json
 import logging
-import math
-from dataclasses import dataclass
-from typing import Callable
-
-from uploader.data import FSUKSystems, RowData, RowType
-from uploader.importer import VALID_FORMATS
+import re
+from dataclasses import asdict, dataclass, field, fields
+from itertools import compress
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+from uploader.data import (
+    ROW_TYPES,
+    BillOfMaterials,
+    FSUKSystems,
+    RowData,
+    RowType,
+)
 
 logger = logging.getLogger("uploader.validator")
 
@@ -18,7 +30,18 @@ FORBIDDEN_CHARACTERS = "<>"
 VALID_MAKE_OR_BUY = ["Make", "Buy"]
 VALID_STEP_TYPES = ["Material", "Process", "Fasteners", "Tooling"]
 
-type RowValidationFunction = Callable[[RowData], None]
+FORBIDDEN_PATTERN = re.compile(f"[{re.escape(FORBIDDEN_CHARACTERS)}]")
+REPORT_FORMATS = [".json", ".csv"]
+# Issues are numbered by row of the file as a spreadsheet shows it, with the
+# header as row 1 and blank lines left out
+HEADER_ROWS = 1
+
+_VALID_SYSTEMS = frozenset(FSUKSystems)
+
+
+def first_file_row(skip_rows: int = 0) -> int:
+    """Get the row of the file holding the first row of data that is read."""
+    return HEADER_ROWS + skip_rows + 1
 
 
 @dataclass
@@ -31,114 +54,288 @@ class ValidationError(Exception):
         return f"Found {self.error_count} errors in Bill of Materials."
 
 
-def system_is_valid(row: RowData) -> None:
+@dataclass
+class ValidationIssue(object):
+    """A rule broken by one cell of the Bill of Materials."""
+
+    row: int
+    column: str
+    rule: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"Row {self.row}: {self.message}"
+
+
+@dataclass
+class ValidationReport(object):
+    """Every rule broken by a Bill of Materials, by row and column."""
+
+    rows: int = 0
+    issues: list[ValidationIssue] = field(default_factory=list)
+    first_row: int = HEADER_ROWS + 1
+
+    @property
+    def error_count(self) -> int:
+        return len(self.issues)
+
+    def write(self, path: Path) -> None:
+        """Write the report as JSON or CSV, depending on the file suffix."""
+        match path.suffix.lower():
+            case ".json":
+                path.write_text(
+                    json.dumps(
+                        {
+                            "rows": self.rows,
+                            "first_row": self.first_row,
+                            "error_count": self.error_count,
+                            "issues": [asdict(issue) for issue in self.issues],
+                        },
+                        indent=2,
+                    )
+                )
+            case ".csv":
+                with open(path, "w", newline="") as file:
+                    writer = csv.DictWriter(
+                        file,
+                        fieldnames=[f.name for f in fields(ValidationIssue)],
+                    )
+                    writer.writeheader()
+                    writer.writerows(asdict(issue) for issue in self.issues)
+            case _:
+                raise ValueError(
+                    f"Invalid report format '{path.suffix}'; must be one of {REPORT_FORMATS}"
+                )
+        logger.info(f"Wrote validation report to '{path}'")
+
+
+type ColumnRule = Callable[[BillOfMaterials], list[ValidationIssue]]
+
+
+def _mask(bom: BillOfMaterials, *row_types: RowType) -> bytes:
+    """Get a byte per row, set if the row is one of the given types."""
+    table = bytes(row_type in row_types for row_type in ROW_TYPES).ljust(
+        256, b"\0"
+    )
+    return bom.row_types.translate(table)
+
+
+def _broken_rows(
+    values: Sequence[Any],
+    valid: Callable[[Any], bool],
+    mask: Optional[bytes] = None,
+) -> list[int]:
+    """Find the rows, out of those masked, whose value breaks a rule."""
+    # Checking with built-ins keeps the common case, with nothing broken, out of
+    # the interpreter loop
+    selected = values if mask is None else compress(values, mask)
+    if all(map(valid, selected)):
+        return []
+    return [
+        i
+        for i, value in enumerate(values)
+        if (mask is None or mask[i]) and not valid(value)
+    ]
+
+
+def system_is_valid(bom: BillOfMaterials) -> list[ValidationIssue]:
     """Check that systems are valid."""
-    if row.row_type == RowType.SYSTEM:
-        assert row.fsuk_system in FSUKSystems, (
-            f"Invalid system '{row.fsuk_system}'"
+    return [
+        ValidationIssue(
+            i,
+            "system",
+            "system_is_valid",
+            f"Invalid system '{bom.systems[i]}'",
+        )
+        for i in _broken_rows(
+            bom.systems, _VALID_SYSTEMS.__contains__, _mask(bom, RowType.SYSTEM)
         )
+    ]
 
 
-def part_name_under_character_limit(row: RowData) -> None:
+def part_name_under_character_limit(
+    bom: BillOfMaterials,
+) -> list[ValidationIssue]:
     """Check that part names are below the FSUK character limit."""
-    if row.row_type == RowType.PART:
-        assert len(row.part) <= PART_NAME_CHARACTER_LIMIT, (
-            f"Part '{row.part}' has {len(row.part)} characters, more than the allowed {PART_NAME_CHARACTER_LIMIT}"
+    return [
+        ValidationIssue(
+            i,
+            "part",
+            "part_name_under_character_limit",
+            f"Part '{bom.parts[i]}' has {len(bom.parts[i])} characters, more than the allowed {PART_NAME_CHARACTER_LIMIT}",
         )
+        for i in _broken_rows(
+            bom.parts,
+            lambda part: len(part) <= PART_NAME_CHARACTER_LIMIT,
+            _mask(bom, RowType.PART),
+        )
+    ]
 
 
-def quantity_is_positive(row: RowData) -> None:
+def quantity_is_positive(bom: BillOfMaterials) -> list[ValidationIssue]:
     """Check that quantities are positive."""
-    if row.requires_quantity():
-        assert row.quantity >= 1, (
-            f"Invalid quantity {row.quantity}; must be positive"
+    return [
+        ValidationIssue(
+            i,
+            "quantity",
+            "quantity_is_positive",
+            f"Invalid quantity {bom.quantities[i]}; must be positive",
+        )
+        for i in _broken_rows(
+            bom.quantities, (1).__le__, _mask(bom, RowType.PART, RowType.STEP)
         )
+    ]
 
 
-def quantity_below_maximum(row: RowData) -> None:
+def quantity_below_maximum(bom: BillOfMaterials) -> list[ValidationIssue]:
     """Check that quantity is below maximum."""
-    if row.requires_quantity():
-        assert row.quantity <= MAXIMUM_QUANTITY, (
-            f"Quantity of {row.quantity} is greater than maximum allowed by FSUK ({MAXIMUM_QUANTITY})"
+    return [
+        ValidationIssue(
+            i,
+            "quantity",
+            "quantity_below_maximum",
+            f"Quantity of {bom.quantities[i]} is greater than maximum allowed by FSUK ({MAXIMUM_QUANTITY})",
+        )
+        for i in _broken_rows(
+            bom.quantities,
+            MAXIMUM_QUANTITY.__ge__,
+            _mask(bom, RowType.PART, RowType.STEP),
         )
+    ]
 
 
-def valid_make_or_buy(row: RowData) -> None:
+def valid_make_or_buy(bom: BillOfMaterials) -> list[ValidationIssue]:
     """Check that the make or buy column is valid."""
-    if row.row_type == RowType.PART:
-        assert row.make_or_buy in VALID_MAKE_OR_BUY, (
-            f"Invalid M/B '{row.make_or_buy}'; must be one of {VALID_MAKE_OR_BUY}"
+    return [
+        ValidationIssue(
+            i,
+            "make_or_buy",
+            "valid_make_or_buy",
+            f"Invalid M/B '{bom.make_or_buys[i]}'; must be one of {VALID_MAKE_OR_BUY}",
         )
+        for i in _broken_rows(
+            bom.make_or_buys,
+            frozenset(VALID_MAKE_OR_BUY).__contains__,
+            _mask(bom, RowType.PART),
+        )
+    ]
 
 
-def valid_step_type(row: RowData) -> None:
+def valid_step_type(bom: BillOfMaterials) -> list[ValidationIssue]:
     """Check that the step type column is valid."""
-    if row.row_type == RowType.STEP:
-        assert row.step_type in VALID_FORMATS, (
-            f"Invalid M/P/F/T '{row.step_type}'; must be one of {VALID_STEP_TYPES}"
+    return [
+        ValidationIssue(
+            i,
+            "step_type",
+            "valid_step_type",
+            f"Invalid M/P/F/T '{bom.step_types[i]}'; must be one of {VALID_STEP_TYPES}",
+        )
+        for i in _broken_rows(
+            bom.step_types,
+            frozenset(VALID_STEP_TYPES).__contains__,
+            _mask(bom, RowType.STEP),
         )
+    ]
 
 
-def cost_is_nonnegative(row: RowData) -> None:
+def cost_is_nonnegative(bom: BillOfMaterials) -> list[ValidationIssue]:
     """Check that cost is nonnegative."""
-    if row.cost:
-        assert row.cost >= 0 or math.isnan(row.cost), (
-            f"Invalid cost {row.cost}; must be nonnegative"
+    return [
+        ValidationIssue(
+            i,
+            "cost",
+            "cost_is_nonnegative",
+            f"Invalid cost {bom.costs[i]}; must be nonnegative",
         )
+        for i in _broken_rows(bom.costs, _nonnegative)
+    ]
 
 
-def emissions_are_nonnegative(row: RowData) -> None:
+def emissions_are_nonnegative(bom: BillOfMaterials) -> list[ValidationIssue]:
     """Check that emissions are nonnegative."""
-    if row.carbon_footprint:
-        assert row.carbon_footprint >= 0 or math.isnan(row.carbon_footprint), (
-            f"Invalid emissions {row.carbon_footprint}; must be nonnegative"
+    return [
+        ValidationIssue(
+            i,
+            "carbon_footprint",
+            "emissions_are_nonnegative",
+            f"Invalid emissions {bom.carbon_footprints[i]}; must be nonnegative",
         )
+        for i in _broken_rows(bom.carbon_footprints, _nonnegative)
+    ]
 
 
-def no_forbidden_characters(row: RowData) -> None:
+def no_forbidden_characters(bom: BillOfMaterials) -> list[ValidationIssue]:
     """Check that text inputs do not contain any forbidden characters."""
-
-    def assert_no_forbidden_characters(text: str) -> None:
-        """Return a list of forbidden characters."""
-        forbidden = {char for char in text if char in FORBIDDEN_CHARACTERS}
-        assert not forbidden, (
-            f"'{text}' contains forbidden characters {''.join(forbidden)}"
-        )
-
-    if row.part:
-        assert_no_forbidden_characters(row.part)
-
-    if row.subtype:
-        assert_no_forbidden_characters(row.subtype)
-
-    if row.comment:
-        assert_no_forbidden_characters(row.comment)
-
-
-VALIDATION_FUNCTIONS: list[RowValidationFunction] = [
+    issues: list[ValidationIssue] = []
+    for column, texts in (
+        ("part", bom.parts),
+        ("subtype", bom.subtypes),
+        ("comment", bom.comments),
+    ):
+        # Search the whole column at once, and only look for the offending
+        # rows if it contains something
+        if not FORBIDDEN_PATTERN.search("\n".join(texts)):
+            continue
+        for i, text in enumerate(texts):
+            if forbidden := set(FORBIDDEN_PATTERN.findall(text)):
+                issues.append(
+                    ValidationIssue(
+                        i,
+                        column,
+                        "no_forbidden_characters",
+                        f"'{text}' contains forbidden characters {''.join(sorted(forbidden))}",
+                    )
+                )
+    return issues
+
+
+def _nonnegative(value: float) -> bool:
+    # Blank numbers are NaN, and are not checked
+    return not value < 0
+
+
+VALIDATION_RULES: list[ColumnRule] = [
     system_is_valid,
     part_name_under_character_limit,
     quantity_is_positive,
     quantity_below_maximum,
     valid_make_or_buy,
+    valid_step_type,
     cost_is_nonnegative,
     emissions_are_nonnegative,
     no_forbidden_characters,
 ]
 
 
-def validate_bill_of_materials(data: list[RowData]) -> None:
-    """Perform a list of checks on a Bill of Materials."""
-    error_count = 0
-    for i, row in enumerate(data):
-        for validation_function in VALIDATION_FUNCTIONS:
-            try:
-                validation_function(row)
-            except AssertionError as e:
-                error_count += 1
-                logger.warning(str(e))
-    if error_count > 0:
-        raise ValidationError(error_count)
-        # logger.critical(f"{error_count} error(s) found in Bill of Materials.")
-    else:
-        logger.info("Successfully validated Bill of Materials.")
+def find_issues(
+    bom: BillOfMaterials, first_row: int = 0
+) -> list[ValidationIssue]:
+    """
+    Run every rule over a Bill of Materials, returning the issues by row.
+
+    Rows are numbered from `first_row`, for checking part of a larger file.
+    """
+    issues = [issue for rule in VALIDATION_RULES for issue in rule(bom)]
+    for issue in issues:
+        issue.row += first_row
+    issues.sort(key=lambda issue: issue.row)
+    return issues
+
+
+def validate_bill_of_materials(
+    data: Sequence[RowData], first_row: int = HEADER_ROWS + 1
+) -> ValidationReport:
+    """
+    Check a Bill of Materials, raising if any rule is broken.
+
+    Issues are numbered from `first_row`, the row of the file the data starts
+    on.
+    """
+    bom = data if isinstance(data, BillOfMaterials) else BillOfMaterials(data)
+    report = ValidationReport(len(bom), find_issues(bom, first_row), first_row)
+    for issue in report.issues:
+        logger.warning(issue)
+    if report.error_count > 0:
+        raise ValidationError(report.error_count)
+    logger.info("Successfully validated Bill of Materials.")
+    return report
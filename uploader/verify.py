@@ -0,0 +1,310 @@
+"""
+This module checks an uploaded snapshot against the Bill of Materials it was
+uploaded from, row by row and by the cost and carbon footprint of each system
+and assembly.
+"""
+
+import csv
+import json
+import logging
+import math
+from copy import copy
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Optional, Sequence
+
+from rich import print
+from rich.table import Table
+
+from uploader.data import Cursor, RowData, RowType
+from uploader.diff import COST_TOLERANCE, RowKey, _key_rows, _values_differ
+
+logger = logging.getLogger("uploader.verify")
+
+# Roll-ups add up many displayed values, so allow for their rounding
+ROLLUP_TOLERANCE = 1e-4
+DISCREPANCY_FORMATS = (".json", ".csv")
+
+type RollupKey = tuple[str, Optional[str]]
+
+
+@dataclass
+class Discrepancy(object):
+    """A difference between the snapshot and the Bill of Materials."""
+
+    row: Optional[int]
+    kind: str
+    system: str
+    assembly: Optional[str]
+    part: Optional[str]
+    field: str
+    expected: str
+    actual: str
+
+    def __str__(self) -> str:
+        location = " - ".join(
+            name for name in (self.system, self.assembly, self.part) if name
+        )
+        prefix = f"Row {self.row}: " if self.row is not None else ""
+        match self.kind:
+            case "missing":
+                return f"{prefix}'{self.expected}' in {location} is not in the snapshot"
+            case "unexpected":
+                return f"'{self.actual}' in {location} is not in the Bill of Materials"
+            case _:
+                return (
+                    f"{prefix}{self.field} of {location} is {self.actual}, "
+                    f"expected {self.expected}"
+                )
+
+
+@dataclass
+class Rollup(object):
+    """The total cost and carbon footprint of a system or assembly."""
+
+    system: str
+    assembly: Optional[str]
+    expected_cost: float = 0.0
+    actual_cost: float = 0.0
+    expected_carbon_footprint: float = 0.0
+    actual_carbon_footprint: float = 0.0
+
+
+@dataclass
+class VerificationReport(object):
+    """Every difference between a snapshot and its Bill of Materials."""
+
+    rows: int = 0
+    discrepancies: list[Discrepancy] = field(default_factory=list)
+    rollups: list[Rollup] = field(default_factory=list)
+
+    @property
+    def discrepancy_count(self) -> int:
+        return len(self.discrepancies)
+
+    def write(self, path: Path) -> None:
+        """Write the report as JSON or CSV, depending on the file suffix."""
+        match path.suffix.lower():
+            case ".json":
+                path.write_text(
+                    json.dumps(
+                        {
+                            "rows": self.rows,
+                            "discrepancy_count": self.discrepancy_count,
+                            "discrepancies": [
+                                asdict(discrepancy)
+                                for discrepancy in self.discrepancies
+                            ],
+                            "rollups": [
+                                asdict(rollup) for rollup in self.rollups
+                            ],
+                        },
+                        indent=2,
+                    )
+                )
+            case ".csv":
+                with open(path, "w", newline="") as file:
+                    writer = csv.DictWriter(
+                        file,
+                        fieldnames=[f.name for f in fields(Discrepancy)],
+                    )
+                    writer.writeheader()
+                    writer.writerows(
+                        asdict(discrepancy)
+                        for discrepancy in self.discrepancies
+                    )
+            case _:
+                raise ValueError(
+                    f"Invalid report format '{path.suffix}'; must be one of {DISCREPANCY_FORMATS}"
+                )
+        logger.info(f"Wrote verification report to '{path}'")
+
+
+def verify_snapshot(
+    snapshot: Sequence[RowData],
+    bom: Sequence[RowData],
+    initial_cursor: Optional[Cursor] = None,
+) -> VerificationReport:
+    """
+    Compare the rows read from a snapshot with the Bill of Materials uploaded
+    to it.
+
+    Parts and steps are matched by their position in the system/assembly tree,
+    then their quantities, costs and carbon footprints are compared. The cost
+    and carbon footprint of each system and assembly are totalled on both sides.
+    """
+    cursor = copy(initial_cursor) if initial_cursor is not None else Cursor()
+    expected = list(_key_rows(bom, cursor))
+    scraped_rows = list(_key_rows(snapshot, Cursor()))
+    actual = {key: row for _, key, row in scraped_rows}
+
+    report = VerificationReport(rows=len(bom))
+    for i, key, row in expected:
+        scraped = actual.pop(key, None)
+        if scraped is None:
+            report.discrepancies.append(
+                _discrepancy(i, "missing", key, expected=str(row))
+            )
+            continue
+        for name, wanted, found in _compared_values(row, scraped):
+            report.discrepancies.append(
+                _discrepancy(
+                    i, "mismatch", key, name, _show(wanted), _show(found)
+                )
+            )
+    for key, row in actual.items():
+        report.discrepancies.append(
+            _discrepancy(None, "unexpected", key, actual=str(row))
+        )
+
+    report.rollups = _reconcile_rollups(
+        _rollups(expected), _rollups(scraped_rows)
+    )
+    for rollup in report.rollups:
+        key = (rollup.system, rollup.assembly)
+        for name in ("cost", "carbon_footprint"):
+            wanted = getattr(rollup, f"expected_{name}")
+            found = getattr(rollup, f"actual_{name}")
+            if not math.isclose(
+                wanted, found, rel_tol=ROLLUP_TOLERANCE, abs_tol=COST_TOLERANCE
+            ):
+                report.discrepancies.append(
+                    _discrepancy(
+                        None,
+                        "rollup",
+                        key,
+                        name,
+                        f"{wanted:.2f}",
+                        f"{found:.2f}",
+                    )
+                )
+
+    logger.info(
+        f"Verified {len(expected)} parts and steps against the snapshot, "
+        f"finding {report.discrepancy_count} discrepancies"
+    )
+    return report
+
+
+def _compared_values(
+    row: RowData, scraped: RowData
+) -> list[tuple[str, object, object]]:
+    """Get the uploaded values of a part or step that differ in the snapshot."""
+    differences: list[tuple[str, object, object]] = []
+    if row.quantity != scraped.quantity:
+        differences.append(("quantity", row.quantity, scraped.quantity))
+    if row.row_type == RowType.PART:
+        if row.make_or_buy != scraped.make_or_buy:
+            differences.append(
+                ("make_or_buy", row.make_or_buy, scraped.make_or_buy)
+            )
+        elif row.make_or_buy == "Buy" and _values_differ(
+            scraped.cost, row.cost
+        ):
+            differences.append(("cost", row.cost, scraped.cost))
+        return differences
+
+    if _values_differ(scraped.cost, row.cost):
+        differences.append(("cost", row.cost, scraped.cost))
+    if _values_differ(scraped.carbon_footprint, row.carbon_footprint):
+        differences.append(
+            ("carbon_footprint", row.carbon_footprint, scraped.carbon_footprint)
+        )
+    return differences
+
+
+def _rollups(
+    keyed_rows: list[tuple[int, RowKey, RowData]],
+) -> dict[RollupKey, tuple[float, float]]:
+    """
+    Total the cost and carbon footprint of each system and assembly.
+
+    A part costs its own cost if bought, plus the cost of each of its steps
+    times the step's quantity, all times the part's quantity.
+    """
+    parts: dict[RowKey, list[float]] = {}
+    quantities: dict[RowKey, int] = {}
+    for _, key, row in keyed_rows:
+        part_key = key[:3]
+        totals = parts.setdefault(part_key, [0.0, 0.0])
+        if row.row_type == RowType.PART:
+            quantities[part_key] = row.quantity
+            if row.make_or_buy == "Buy":
+                totals[0] += _number(row.cost)
+        else:
+            totals[0] += _number(row.cost) * row.quantity
+            totals[1] += _number(row.carbon_footprint) * row.quantity
+
+    rollups: dict[RollupKey, tuple[float, float]] = {}
+    for part_key, (cost, carbon) in parts.items():
+        system, assembly, _ = part_key
+        # Steps of parts that were already on the website count once
+        quantity = quantities.get(part_key, 1)
+        for rollup_key in ((system, None), (system, assembly)):
+            total_cost, total_carbon = rollups.get(rollup_key, (0.0, 0.0))
+            rollups[rollup_key] = (
+                total_cost + cost * quantity,
+                total_carbon + carbon * quantity,
+            )
+    return rollups
+
+
+def _reconcile_rollups(
+    expected: dict[RollupKey, tuple[float, float]],
+    actual: dict[RollupKey, tuple[float, float]],
+) -> list[Rollup]:
+    """Pair the roll-ups of the systems and assemblies in the Bill of Materials."""
+    rollups = []
+    for (system, assembly), (cost, carbon) in expected.items():
+        actual_cost, actual_carbon = actual.get((system, assembly), (0.0, 0.0))
+        rollups.append(
+            Rollup(system, assembly, cost, actual_cost, carbon, actual_carbon)
+        )
+    return rollups
+
+
+def _discrepancy(
+    row: Optional[int],
+    kind: str,
+    key: tuple[Optional[str], ...],
+    name: str = "",
+    expected: str = "",
+    actual: str = "",
+) -> Discrepancy:
+    system, assembly, part = (list(key) + [None, None])[:3]
+    return Discrepancy(
+        row, kind, system or "", assembly, part, name, expected, actual
+    )
+
+
+def _number(value: float) -> float:
+    return 0.0 if math.isnan(value) else value
+
+
+def _show(value: object) -> str:
+    if isinstance(value, float):
+        return "" if math.isnan(value) else f"{value:g}"
+    return str(value)
+
+
+def print_verification(report: VerificationReport) -> None:
+    """Print the roll-ups of a snapshot and any discrepancies found."""
+    table = Table("System", "Cost", "Expected", "Carbon footprint", "Expected")
+    for rollup in report.rollups:
+        if rollup.assembly is not None:
+            continue
+        table.add_row(
+            rollup.system,
+            f"{rollup.actual_cost:.2f}",
+            f"{rollup.expected_cost:.2f}",
+            f"{rollup.actual_carbon_footprint:.2f}",
+            f"{rollup.expected_carbon_footprint:.2f}",
+        )
+    print(table)
+
+    if not report.discrepancies:
+        print("The snapshot matches the Bill of Materials")
+        return
+    print(f"{report.discrepancy_count} discrepancies found:")
+    for discrepancy in report.discrepancies:
+        print(f"  {discrepancy}")
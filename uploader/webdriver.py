@@ -3,42 +3,319 @@ This module implements a wrapper for the Selenium WebDriver.
 """
 
 import logging
+from dataclasses import dataclass
+from functools import wraps
+from time import perf_counter
+from typing import Any, Callable, Optional
 
 from selenium import webdriver
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    TimeoutException,
+)
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+from uploader.browser import BrowserOptions, PageLoadStrategy
+from uploader.sessions import claim_session
+from uploader.tracing import span
+
 logger = logging.getLogger("uploader.webdriver")
 
+# Returns true once the page has reached one of the given ready states and no
+# ASP.NET AJAX postback is running
+POSTBACK_IDLE_SCRIPT = """
+if (!arguments[0].includes(document.readyState)) {
+    return false;
+}
+if (typeof Sys !== 'undefined' && Sys.WebForms && Sys.WebForms.PageRequestManager) {
+    return !Sys.WebForms.PageRequestManager.getInstance().get_isInAsyncPostBack();
+}
+return true;
+"""
+
+# Sets the value of each field, firing the events typing would, and returns the
+# IDs of any fields that could not be found
+FILL_FIELDS_SCRIPT = """
+const missing = [];
+for (const [id, value] of Object.entries(arguments[0])) {
+    const element = document.getElementById(id);
+    if (element === null) {
+        missing.push(id);
+        continue;
+    }
+    element.value = value;
+    element.dispatchEvent(new Event('input', {bubbles: true}));
+    element.dispatchEvent(new Event('change', {bubbles: true}));
+}
+return missing;
+"""
+
+# Reads every row of a table in one call, optionally only rows directly holding
+# an element whose ID ends with a suffix, rather than a table nested inside them
+READ_TABLE_SCRIPT = """
+const [rootId, requiredSuffix] = arguments;
+const root = rootId ? document.getElementById(rootId) : document;
+if (root === null) {
+    return [];
+}
+const rows = [];
+for (const row of root.querySelectorAll('tr')) {
+    const labels = {};
+    for (const element of row.querySelectorAll('[id]')) {
+        labels[element.id] = element.innerText.trim();
+    }
+    const owned = Array.from(row.querySelectorAll('[id]')).filter(
+        element => element.closest('tr') === row
+    );
+    if (requiredSuffix && !owned.some(element => element.id.endsWith(requiredSuffix))) {
+        continue;
+    }
+    rows.push({
+        element: row,
+        cells: Array.from(row.cells, cell => cell.innerText.trim()),
+        labels: labels,
+        classes: row.className,
+    });
+}
+return rows;
+"""
+
+
+@dataclass
+class GridRow(object):
+    """A table row read in bulk, with the text of its cells and labels."""
+
+    element: WebElement
+    cells: list[str]
+    labels: dict[str, str]
+    classes: str = ""
+
+    def label(self, id_suffix: str) -> str:
+        """Get the text of the element in the row whose ID ends with a suffix."""
+        for id, text in self.labels.items():
+            if id.endswith(id_suffix):
+                return text
+        return ""
+
+
+@dataclass
+class WaitRecord(object):
+    """How long a wait for a condition took."""
+
+    description: str
+    duration: float
+    timed_out: bool = False
+
+
+@dataclass
+class OperationRecord(object):
+    """How long an operation on the website took."""
+
+    name: str
+    duration: float
+
+
+def timed[**P, R](method: Callable[P, R]) -> Callable[P, R]:
+    """Record how long each call of an interface method takes."""
+
+    @wraps(method)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        start = perf_counter()
+        target = str(args[1]) if len(args) > 1 else ""
+        try:
+            with span(method.__name__, "interface", target=target):
+                return method(*args, **kwargs)
+        finally:
+            getattr(args[0], "operation_records").append(
+                OperationRecord(method.__name__, perf_counter() - start)
+            )
+
+    return wrapper
+
+
+# Times an operation is replayed after logging in again, before giving up
+SESSION_RESTORES = 2
+# Failed polls of a wait between checks that the session is still logged in,
+# since each check is another round trip to the browser
+SESSION_CHECK_POLLS = 20
+
+
+class SessionExpiredError(Exception):
+    """Raised if the website redirects to its login page mid-session."""
+
+    def __str__(self) -> str:
+        return "The FSUK session has expired."
+
+
+def watched[**P, R](method: Callable[P, R]) -> Callable[P, R]:
+    """Replay an interface method after logging in again if the session expires."""
+
+    @wraps(method)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        for restores in range(SESSION_RESTORES + 1):
+            try:
+                return method(*args, **kwargs)
+            except SessionExpiredError:
+                if restores == SESSION_RESTORES:
+                    raise
+                logger.warning(
+                    f"Session expired during {method.__name__}; logging in again"
+                )
+                getattr(args[0], "restore_session")()
+        raise AssertionError("unreachable")
+
+    return wrapper
 
-class WebDriver(webdriver.Firefox):
+
+class WebDriver(object):
     """Wrapper class for Selenium WebDriver."""
 
-    def __init__(self, timeout_time: float = 10) -> None:
-        self.driver = webdriver.Firefox()
+    def __init__(
+        self,
+        timeout_time: float = 10,
+        poll_frequency: float = 0.05,
+        options: Optional[BrowserOptions] = None,
+    ) -> None:
+        # Attach to a warm browser from the session broker if one is free,
+        # keeping the options that browser was launched with
+        self.session = claim_session()
+        if self.session is not None:
+            self.driver: RemoteWebDriver = self.session.driver
+            self.options = self.session.options
+        else:
+            self.options = options if options is not None else BrowserOptions()
+            self.driver = webdriver.Firefox(
+                options=self.options.firefox_options()
+            )
         self.timeout_time = timeout_time
+        self.poll_frequency = poll_frequency
+        self.wait_records: list[WaitRecord] = []
+        self.operation_records: list[OperationRecord] = []
+
+    @property
+    def current_url(self) -> str:
+        return self.driver.current_url
+
+    def release(self) -> None:
+        """Return a pooled browser session, leaving other browsers open."""
+        if self.session is not None:
+            self.session.release()
+            self.session = None
+
+    def quit(self) -> None:
+        """Close the browser, or return it to the pool if it is pooled."""
+        if self.session is not None:
+            self.release()
+        else:
+            self.driver.quit()
+
+    def wait_until(
+        self, condition: Callable[[Any], Any], description: str
+    ) -> Any:
+        """Poll until a condition is met, recording how long it took."""
+        polls = 0
+
+        def counted_condition(driver: Any) -> Any:
+            nonlocal polls
+            polls += 1
+            result = condition(driver)
+            # Stop waiting soon after the website has logged the session out
+            if not result and polls % SESSION_CHECK_POLLS == 0:
+                self._check_session()
+            return result
+
+        start = perf_counter()
+        timed_out = True
+        with span("wait", "wait", condition=description) as attributes:
+            try:
+                result = WebDriverWait(
+                    self.driver,
+                    self.timeout_time,
+                    poll_frequency=self.poll_frequency,
+                ).until(counted_condition)
+                timed_out = False
+                return result
+            except TimeoutException:
+                # A wait that never finished may have been logged out
+                self._check_session()
+                raise
+            finally:
+                duration = perf_counter() - start
+                attributes.update(polls=polls, timed_out=timed_out)
+                self.wait_records.append(
+                    WaitRecord(description, duration, timed_out)
+                )
+                logger.debug(f"Waited {duration:.3f}s for {description}")
+
+    def wait_for_postback(self) -> None:
+        """Wait until the page has loaded and any AJAX postback has finished."""
+        self.wait_until(
+            lambda driver: driver.execute_script(
+                POSTBACK_IDLE_SCRIPT, list(self.options.ready_states)
+            ),
+            "postback",
+        )
+
+    def _check_session(self) -> None:
+        """Raise SessionExpiredError if the session has been logged out."""
+        pass
+
+    def wait_statistics(self) -> dict[str, tuple[int, float]]:
+        """Get the number of waits and total time spent waiting by kind."""
+        statistics: dict[str, tuple[int, float]] = {}
+        for record in self.wait_records:
+            kind = record.description.split(" ")[0]
+            count, total = statistics.get(kind, (0, 0.0))
+            statistics[kind] = (count + 1, total + record.duration)
+        return statistics
 
     def navigate_to_page(self, url: str) -> None:
         logger.debug(f"Navigating to url '{url}'")
-        self.driver.get(url)
+        with span("navigate_to_page", url=url):
+            if self.options.page_load_strategy != PageLoadStrategy.NONE:
+                self.driver.get(url)
+                return
+
+            # Without a page load strategy, get returns before the new page
+            # replaces the old one, so wait for that to happen first
+            previous = self.driver.find_elements(By.TAG_NAME, "html")
+            self.driver.get(url)
+            if previous:
+                self.wait_for_staleness(previous[0])
+            self.wait_until(
+                lambda driver: (
+                    driver.execute_script("return document.readyState")
+                    in self.options.ready_states
+                ),
+                "document ready",
+            )
 
     def wait_for_element(
         self, value: str, by: str = By.ID, clickable: bool = False
     ) -> None:
         logger.debug(f"Waiting for element '{value}'")
-        if clickable:
-            WebDriverWait(self.driver, self.timeout_time).until(
-                EC.element_to_be_clickable((by, value))
-            )
-        else:
-            WebDriverWait(self.driver, self.timeout_time).until(
-                EC.presence_of_element_located((by, value))
-            )
+        with span("wait_for_element", element=value, clickable=clickable):
+            if clickable:
+                self.wait_until(
+                    EC.element_to_be_clickable((by, value)),
+                    f"clickable '{value}'",
+                )
+            else:
+                self.wait_until(
+                    EC.presence_of_element_located((by, value)),
+                    f"element '{value}'",
+                )
 
     def wait_for_url(self, url: str) -> None:
-        WebDriverWait(self.driver, self.timeout_time).until(EC.url_matches(url))
+        self.wait_until(EC.url_matches(url), f"url '{url}'")
+
+    def wait_for_staleness(self, element: WebElement) -> None:
+        logger.debug(f"Waiting for element '{element}' to be replaced")
+        self.wait_until(EC.staleness_of(element), "staleness")
 
     def get_element(self, value: str, by: str = By.ID) -> WebElement:
         element = self.driver.find_element(by, value)
@@ -48,13 +325,13 @@ class WebDriver(webdriver.Firefox):
     def click_element(
         self, value: str, by: str = By.ID, wait_for_element: bool = True
     ) -> None:
+        with span("click_element", element=value):
+            if wait_for_element:
+                self.wait_for_element(value, by=by, clickable=True)
 
-        if wait_for_element:
-            self.wait_for_element(value, by=by, clickable=True)
-
-        element = self.driver.find_element(by, value)
-        logger.debug(f"Clicking on element '{element}'")
-        element.click()
+            element = self.driver.find_element(by, value)
+            logger.debug(f"Clicking on element '{element}'")
+            element.click()
 
     def send_keys(
         self,
@@ -63,17 +340,51 @@ class WebDriver(webdriver.Firefox):
         clear_element: bool = False,
         wait_for_element: bool = True,
     ) -> None:
+        with span("send_keys", element=id):
+            if wait_for_element:
+                self.wait_for_element(id, clickable=True)
+
+            element = self.get_element(id)
 
-        if wait_for_element:
-            self.wait_for_element(id, clickable=True)
+            if clear_element:
+                element.clear()
 
-        element = self.get_element(id)
+            if keystrokes == "":
+                return
 
-        if clear_element:
-            element.clear()
+            logger.debug(f"Sending keystrokes '{str(keystrokes)}' to {element}")
+            element.send_keys(str(keystrokes))
 
-        if keystrokes == "":
-            return
+    def fill_fields(self, values: dict[str, str | int | float]) -> None:
+        """
+        Set the values of several text fields in a single script.
 
-        logger.debug(f"Sending keystrokes '{str(keystrokes)}' to {element}")
-        element.send_keys(str(keystrokes))
+        Fields that react to keystrokes rather than change events, such as
+        dropdowns, should be filled with send_keys instead.
+        """
+        logger.debug(f"Filling fields {list(values)}")
+        with span("fill_fields", "interface", fields=len(values)):
+            missing = self.driver.execute_script(
+                FILL_FIELDS_SCRIPT,
+                {id: str(value) for id, value in values.items()},
+            )
+        if missing:
+            raise NoSuchElementException(
+                f"Unable to locate fields {', '.join(missing)}"
+            )
+
+    def read_table(
+        self, table_id: Optional[str] = None, required_label: str = ""
+    ) -> list[GridRow]:
+        """
+        Read the rows of a table in a single script.
+
+        Without a table ID, every row on the page is read. If a label suffix is
+        given, only rows directly containing an element whose ID ends with it
+        are kept, so rows of a layout table around the grid are skipped.
+        """
+        with span("read_table", "interface", table=table_id or required_label):
+            rows = self.driver.execute_script(
+                READ_TABLE_SCRIPT, table_id, required_label
+            )
+        return [GridRow(**row) for row in rows]
@@ -0,0 +1,255 @@
+"""
+This module parses ASP.NET WebForms pages and builds the postbacks they expect.
+"""
+
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Optional
+
+POSTBACK_HREF_PATTERN = re.compile(r"__doPostBack\('([^']*)','([^']*)'\)")
+
+
+@dataclass
+class Element(object):
+    """An element of a page that has an ID, a name or a postback."""
+
+    tag: str
+    attributes: dict[str, str]
+    text: str = ""
+    options: list[tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def id(self) -> str:
+        return self.attributes.get("id", "")
+
+    @property
+    def name(self) -> str:
+        return self.attributes.get("name", "")
+
+    @property
+    def value(self) -> str:
+        return self.attributes.get("value", "")
+
+    @property
+    def postback(self) -> Optional[tuple[str, str]]:
+        """Get the event target and argument posted when clicked, if any."""
+        for attribute in ("href", "onclick"):
+            match = POSTBACK_HREF_PATTERN.search(
+                self.attributes.get(attribute, "")
+            )
+            if match is not None:
+                return match.group(1), match.group(2)
+        return None
+
+
+@dataclass
+class TableRow(object):
+    """A row of a table, with the elements inside it."""
+
+    table_id: str
+    element: Element
+    cells: list[str] = field(default_factory=list)
+    elements: list[Element] = field(default_factory=list)
+
+    def find(self, id_suffix: str) -> Optional[Element]:
+        """Find an element in the row by the end of its ID."""
+        for element in self.elements:
+            if element.id.endswith(id_suffix):
+                return element
+        return None
+
+    def find_by_text(self, tag: str, text: str) -> Optional[Element]:
+        """Find an element in the row by its tag and text or value."""
+        for element in self.elements:
+            if element.tag == tag and text in (
+                element.text.strip(),
+                element.value,
+            ):
+                return element
+        return None
+
+
+@dataclass
+class Page(object):
+    """A parsed page, holding the values its form would post."""
+
+    url: str
+    action: str = ""
+    fields: dict[str, str] = field(default_factory=dict)
+    elements: dict[str, Element] = field(default_factory=dict)
+    rows: list[TableRow] = field(default_factory=list)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self.elements
+
+    def element(self, id: str) -> Element:
+        return self.elements[id]
+
+    def text(self, id: str) -> str:
+        return self.elements[id].text.strip()
+
+    def table(self, id_prefix: str) -> list[TableRow]:
+        """Get the rows of tables whose ID starts with a prefix."""
+        return [row for row in self.rows if row.table_id.startswith(id_prefix)]
+
+    def set(self, id: str, value: str | int | float) -> None:
+        """Set the value of a form field by its ID."""
+        element = self.elements[id]
+        if element.tag == "select":
+            value = _option_value(element, str(value))
+        self.fields[element.name] = str(value)
+
+    def check(self, id: str) -> None:
+        """Check a radio button by its ID."""
+        element = self.elements[id]
+        self.fields[element.name] = element.value
+
+    def submission(
+        self,
+        submitter: Optional[str | Element] = None,
+        argument: Optional[str] = None,
+    ) -> dict[str, str]:
+        """Get the fields posted when a button, link or row is clicked."""
+        fields = dict(self.fields)
+        fields.setdefault("__EVENTTARGET", "")
+        fields.setdefault("__EVENTARGUMENT", "")
+        if submitter is None:
+            return fields
+
+        element = (
+            submitter
+            if isinstance(submitter, Element)
+            else self.elements[submitter]
+        )
+        postback = element.postback
+        if postback is not None:
+            fields["__EVENTTARGET"], fields["__EVENTARGUMENT"] = postback
+        else:
+            fields[element.name] = element.value
+        if argument is not None:
+            fields["__EVENTARGUMENT"] = argument
+        return fields
+
+
+def _option_value(select: Element, text: str) -> str:
+    """Get the value of the option of a dropdown that matches some text."""
+    for value, label in select.options:
+        if text in (value, label):
+            return value
+    for value, label in select.options:
+        if label.startswith(text):
+            return value
+    raise KeyError(f"No option '{text}' in dropdown '{select.id}'")
+
+
+class _PageParser(HTMLParser):
+    """Collect the form fields, identified elements and table rows of a page."""
+
+    def __init__(self, page: Page) -> None:
+        super().__init__(convert_charrefs=True)
+        self.page = page
+        self.open_elements: list[Element] = []
+        self.tables: list[str] = []
+        self.row: Optional[TableRow] = None
+        self.cell: Optional[list[str]] = None
+        self.select: Optional[Element] = None
+        self.option: Optional[list[str]] = None
+
+    def handle_starttag(
+        self, tag: str, attrs: list[tuple[str, Optional[str]]]
+    ) -> None:
+        attributes = {key: value or "" for key, value in attrs}
+        element = Element(tag, attributes)
+
+        match tag:
+            case "form" if not self.page.action:
+                self.page.action = attributes.get("action", "")
+            case "table":
+                self.tables.append(attributes.get("id", ""))
+            case "tr" if self.tables:
+                self.row = TableRow(self._table_id(), element)
+            case "td" if self.row is not None:
+                self.cell = []
+            case "input":
+                self._add_input(element)
+            case "textarea" | "select":
+                self.page.fields[element.name] = ""
+                self.select = element if tag == "select" else None
+            case "option" if self.select is not None:
+                self.option = [attributes.get("value", "")]
+                if "selected" in attributes:
+                    self.page.fields[self.select.name] = self.option[0]
+
+        if element.id:
+            self.page.elements[element.id] = element
+        if self.row is not None and (element.id or tag in ("a", "input")):
+            if tag != "tr":
+                self.row.elements.append(element)
+        if tag not in ("input", "br", "img", "meta", "link"):
+            self.open_elements.append(element)
+
+    def handle_endtag(self, tag: str) -> None:
+        match tag:
+            case "table" if self.tables:
+                self.tables.pop()
+            case "tr" if self.row is not None:
+                self.page.rows.append(self.row)
+                self.row = None
+            case "td" if self.row is not None and self.cell is not None:
+                self.row.cells.append("".join(self.cell).strip())
+                self.cell = None
+            case "textarea":
+                element = self.open_elements[-1]
+                self.page.fields[element.name] = element.text
+            case "option" if self.select is not None and self.option:
+                text = "".join(self.option[1:]).strip()
+                value = self.option[0] or text
+                self.select.options.append((value, text))
+                if self.page.fields.get(self.select.name) == "":
+                    self.page.fields[self.select.name] = value
+                self.option = None
+            case "select":
+                self.select = None
+
+        # Close the most recent matching element
+        for i in range(len(self.open_elements) - 1, -1, -1):
+            if self.open_elements[i].tag == tag:
+                del self.open_elements[i:]
+                break
+
+    def handle_data(self, data: str) -> None:
+        for element in self.open_elements:
+            element.text += data
+        if self.cell is not None:
+            self.cell.append(data)
+        if self.option is not None:
+            self.option.append(data)
+
+    def _table_id(self) -> str:
+        for table_id in reversed(self.tables):
+            if table_id:
+                return table_id
+        return ""
+
+    def _add_input(self, element: Element) -> None:
+        """Record the value an input contributes to the form."""
+        if not element.name:
+            return
+        input_type = element.attributes.get("type", "text")
+        if input_type in ("submit", "button", "image"):
+            return
+        if input_type in ("radio", "checkbox"):
+            if "checked" in element.attributes:
+                self.page.fields[element.name] = element.value or "on"
+            return
+        self.page.fields[element.name] = element.value
+
+
+def parse_page(url: str, html: str) -> Page:
+    """Parse the form and elements of a WebForms page."""
+    page = Page(url)
+    parser = _PageParser(page)
+    parser.feed(html)
+    parser.close()
+    return page
@@ -3,20 +3,33 @@ This module defines an interface for uploading to the FSUK website.
 """
 
 import logging
-from time import sleep
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlsplit
 
 from selenium.webdriver.common.by import By
 
+from .browser import BASE_URL, BrowserOptions
+from .cache import clear_cookies, load_cookies, save_cookies
 from .data import RowData
-from .webdriver import WebDriver
+from .editor import (
+    ACTION_GRID_LABELS,
+    ACTION_GRID_TABLE,
+    CURRENT_PAGE,
+    PART_GRID_LABELS,
+    PART_GRID_TABLE,
+    SELECTED_ROW_CLASS,
+    SnapshotEditor,
+)
+from .webdriver import GridRow, SessionExpiredError, WebDriver, timed, watched
 
 logger = logging.getLogger("uploader.webinterface")
 
 # URLs
-LOGIN_PAGE_URL = "https://teams.formulastudent.com/Account/LogIn"
-WELCOME_PAGE_URL = "https://teams.formulastudent.com/Account/Welcome"
-BOM_LIST_URL = "https://teams.formulastudent.com/BOM/BOMList"
-TIMEOUT_LOGIN_URL = "https://teams.formulastudent.com/Account/LogIn.aspx"
+LOGIN_PAGE_URL = f"{BASE_URL}/Account/LogIn"
+WELCOME_PAGE_URL = f"{BASE_URL}/Account/Welcome"
+BOM_LIST_URL = f"{BASE_URL}/BOM/BOMList"
+TIMEOUT_LOGIN_URL = f"{BASE_URL}/Account/LogIn.aspx"
 
 # Login page
 USERNAME_FIELD = "ctl00_ContentPlaceHolder1_tbUsername"
@@ -31,23 +44,9 @@ MAKE_SNAPSHOT_BUTTON = "ctl00_ContentPlaceHolder1_makeSnapshotButton"
 EDIT_BOM_BUTTON_XPATH = ".//a[contains(text(), 'Edit')]"
 
 # BoM editor
-CHANGE_PAGE_SIZE_FIELD = "ctl00_cp_g_ctl00_ctl02_ctl00_ChangePageSizeTextBox"
-CHANGE_PAGE_SIZE_BUTTON = (
-    "ctl00_cp_g_ctl00_ctl02_ctl00_ChangePageSizeLinkButton"
-)
 REFRESH_BUTTON = "ctl00_cp_refreshButton"
 NEW_PART_BUTTON = "newPartButton"
 NEW_ACTION_BUTTON = "newActionButton"
-
-
-def PART_NAME_LABEL_XPATH(part_name: str):
-    return f"//span[contains(@id, '_partNameLabel') and text()='{part_name}']"
-
-
-NEXT_PAGE_XPATH = "//input[@title='Next Page']"
-FIRST_PAGE_XPATH = "//input[@title='First Page']"
-CURRENT_PAGE = "ctl00_cp_g_ctl00_ctl02_ctl00_GoToPageTextBox"
-PAGE_COUNT_LABEL = "ctl00_cp_g_ctl00_ctl02_ctl00_PageOfLabel"
 WELCOME_TEXT = "ctl00_ltwelcome"
 
 # Part editor modal
@@ -87,11 +86,39 @@ class InvalidCredentialsError(WebInterfaceError):
         return "Unable to log into FSUK website; invalid credentials."
 
 
-class WebInterface(WebDriver):
+@dataclass
+class SnapshotNotFoundError(WebInterfaceError):
+    """Raised if a snapshot cannot be found in the BoM list."""
+
+    label: str
+
+    def __str__(self) -> str:
+        return f"Unable to find snapshot '{self.label}' in the BoM list."
+
+
+class WebInterface(WebDriver, SnapshotEditor):
+    """Interface for uploading to the FSUK website through a browser."""
+
+    def __init__(
+        self,
+        timeout_time: float = 10,
+        poll_frequency: float = 0.05,
+        base_url: str = BASE_URL,
+        options: Optional[BrowserOptions] = None,
+    ) -> None:
+        WebDriver.__init__(self, timeout_time, poll_frequency, options)
+        SnapshotEditor.__init__(self, base_url)
+
+    @timed
     def log_in_to_account(self, username: str, password: str) -> None:
 
+        self.credentials = (username, password)
+        if self._restore_login(username):
+            logger.info("Reusing cached login")
+            return
+
         logger.info("Attempting login")
-        self.navigate_to_page(LOGIN_PAGE_URL)
+        self.navigate_to_page(self._url(LOGIN_PAGE_URL))
         self.wait_for_element(USERNAME_FIELD)
 
         self.send_keys(USERNAME_FIELD, username)
@@ -99,34 +126,60 @@ class WebInterface(WebDriver):
         self.click_element(SUBMIT_CREDENTIALS_BUTTON)
 
         try:
-            self.wait_for_url(WELCOME_PAGE_URL)
+            self.wait_for_url(self._url(WELCOME_PAGE_URL))
             logger.info("Login successful")
         except Exception:
-            if self.current_url != WELCOME_PAGE_URL:
+            if self.current_url != self._url(WELCOME_PAGE_URL):
                 self.quit()
                 raise InvalidCredentialsError
 
+        save_cookies(f"{username}@{self.base_url}", self.driver.get_cookies())
+
+    def _check_session(self) -> None:
+        """Raise SessionExpiredError if redirected to the timeout login page."""
+        if urlsplit(self.current_url).path.lower() == (
+            urlsplit(TIMEOUT_LOGIN_URL).path.lower()
+        ):
+            raise SessionExpiredError
+
+    def _restore_login(self, username: str) -> bool:
+        """Log in with cached cookies, returning whether they were valid."""
+        cookies = load_cookies(f"{username}@{self.base_url}")
+        if not cookies:
+            return False
+
+        # Cookies can only be set for the domain of the current page
+        self.navigate_to_page(self._url(LOGIN_PAGE_URL))
+        self.driver.delete_all_cookies()
+        for cookie in cookies:
+            self.driver.add_cookie(cookie)
+
+        # Expired sessions are redirected back to the login page
+        self.navigate_to_page(self._url(WELCOME_PAGE_URL))
+        if self.current_url == self._url(WELCOME_PAGE_URL):
+            return True
+
+        clear_cookies(f"{username}@{self.base_url}")
+        self.driver.delete_all_cookies()
+        return False
+
+    @timed
     def create_snapshot(self, base_revision: int, label: str) -> None:
         logger.info(
             f"Creating snapshot '{label}', base revision = {base_revision}"
         )
-        self.navigate_to_page(BOM_LIST_URL)
+        self.navigate_to_page(self._url(BOM_LIST_URL))
         self.wait_for_element(BOM_LIST_TABLE)
 
-        table = self.get_element(BOM_LIST_TABLE)
-        rows = table.find_elements(By.TAG_NAME, "tr")
-
-        for row in rows:
-            cells = row.find_elements(By.TAG_NAME, "td")
-
-            if len(cells) <= 2:
+        for row in self.read_table(BOM_LIST_TABLE):
+            if len(row.cells) <= 2:
                 continue
 
-            revision = cells[2].text.strip()
+            revision = row.cells[2]
             if int(revision) != base_revision:
                 continue
 
-            snapshot_button = row.find_element(
+            snapshot_button = row.element.find_element(
                 By.CSS_SELECTOR, NEW_SNAPSHOT_BUTTON_SELECTOR
             )
             snapshot_button.click()
@@ -137,14 +190,36 @@ class WebInterface(WebDriver):
 
         # Navigate to a different page and back again to refresh the table
         logger.debug("Refreshing page...")
-        self.navigate_to_page(WELCOME_PAGE_URL)
-        self.wait_for_url(WELCOME_PAGE_URL)
-        self.navigate_to_page(BOM_LIST_URL)
+        self.navigate_to_page(self._url(WELCOME_PAGE_URL))
+        self.wait_for_url(self._url(WELCOME_PAGE_URL))
+        self.open_snapshot(label)
+
+    @timed
+    def open_snapshot(self, label: str) -> None:
+        """Open an existing snapshot in the BoM editor."""
+        logger.info(f"Opening snapshot '{label}'")
+        self.navigate_to_page(self._url(BOM_LIST_URL))
         self.wait_for_element(BOM_LIST_TABLE)
 
-        bom_list_table = self.get_element(BOM_LIST_TABLE)
-        bom_list_table.find_element(By.XPATH, EDIT_BOM_BUTTON_XPATH).click()
+        for row in self.read_table(BOM_LIST_TABLE):
+            if label not in row.cells:
+                continue
+            edit_buttons = row.element.find_elements(
+                By.XPATH, EDIT_BOM_BUTTON_XPATH
+            )
+            if edit_buttons:
+                edit_buttons[0].click()
+                break
+        else:
+            raise SnapshotNotFoundError(label)
+        self.snapshot_label = label
 
+        self.wait_for_element(REFRESH_BUTTON, clickable=True)
+        self._maximise_page_size()
+        self.index_parts()
+
+    @watched
+    @timed
     def upload_part(
         self,
         data: RowData,
@@ -156,68 +231,39 @@ class WebInterface(WebDriver):
         # Refresh the page
         self.click_element(REFRESH_BUTTON)
 
-        # Create a new part
-        self.wait_for_element(NEW_PART_BUTTON, clickable=True)
-        sleep(0.5)
+        # Create a new part once the refresh has finished
+        self.wait_for_postback()
         self.click_element(NEW_PART_BUTTON)
         self.wait_for_element(SAVE_PART_BUTTON)  # Wait for the modal to appear
 
-        # Enter information
+        # Type into the dropdowns, which only respond to real keystrokes
         self.send_keys(SYSTEM_DROPDOWN, system)
         self.send_keys(ASSEMBLY_DROPDOWN, assembly)
-        self.send_keys(PART_NAME_FIELD, data.part)
-        self.send_keys(QUANTITY_FIELD, data.quantity, clear_element=True)
-        self.send_keys(COMMENT_FIELD, data.comment)
         if data.make_or_buy == "Make":
             self.click_element(MAKE_RADIO_BUTTON)
         else:
             self.click_element(BUY_RADIO_BUTTON)
-            if upload_cost:
-                self.send_keys(COST_FIELD, data.cost)
-                self.send_keys(COST_COMMENT_FIELD, data.cost_comment)
+
+        # Fill in the remaining fields at once
+        fields: dict[str, str | int | float] = {
+            PART_NAME_FIELD: data.part,
+            QUANTITY_FIELD: data.quantity,
+            COMMENT_FIELD: data.comment,
+        }
+        if data.make_or_buy != "Make" and upload_cost:
+            fields[COST_FIELD] = data.cost
+            fields[COST_COMMENT_FIELD] = data.cost_comment
+        self.fill_fields(fields)
 
         # Save part
         self.click_element(SAVE_PART_BUTTON)
+        self.wait_for_postback()
         self.wait_for_element(REFRESH_BUTTON, clickable=True)
 
-    def select_part(self, part: str) -> bool:
-
-        while True:
-            # Wait for page to load
-            self.wait_for_element(REFRESH_BUTTON, clickable=True)
-            try:
-                # Search for the part in the table
-                xpath = PART_NAME_LABEL_XPATH(part)
-                part_row = self.get_element(xpath, by=By.XPATH)
-
-                # Click elsewhere to ensure the row is deselected
-                self.click_element(WELCOME_TEXT)
-
-                # Now click the row to select it
-                part_row.click()
-                return True
-
-            except Exception:
-                # If the part is not found, move to the next page
-                current_page = self.get_element(CURRENT_PAGE).get_attribute(
-                    "value"
-                )
-                page_count_label = self.get_element(
-                    PAGE_COUNT_LABEL
-                ).get_attribute("innerHTML")
-                max_page = (
-                    page_count_label.replace("of ", "")
-                    if page_count_label is not None
-                    else "?"
-                )
-                if current_page == max_page:
-                    print(
-                        f"Current page: {current_page} / Max page: {max_page}"
-                    )
-                    self.click_element(FIRST_PAGE_XPATH, by=By.XPATH)
-                else:
-                    self.click_element(NEXT_PAGE_XPATH, by=By.XPATH)
+        self._record_new_part(data.part)
 
+    @watched
+    @timed
     def upload_step(self, data: RowData, upload_cost: bool = True) -> None:
 
         # Create a new action
@@ -226,19 +272,72 @@ class WebInterface(WebDriver):
             SAVE_ACTION_BUTTON
         )  # Wait for the modal to appear
 
-        # Enter information
+        # Type into the dropdown, then fill in the remaining fields at once
         self.send_keys(ACTION_TYPE_DROPDOWN, data.step_type)
-        self.send_keys(ACTION_SUBTYPE_FIELD, data.subtype)
-        self.send_keys(ACTION_QUANTITY_FIELD, data.quantity, clear_element=True)
-        self.send_keys(ACTION_COMMENT_FIELD, data.comment)
+        fields: dict[str, str | int | float] = {
+            ACTION_SUBTYPE_FIELD: data.subtype,
+            ACTION_QUANTITY_FIELD: data.quantity,
+            ACTION_COMMENT_FIELD: data.comment,
+        }
         if upload_cost:
-            self.send_keys(ACTION_COST_FIELD, data.cost)
-            self.send_keys(ACTION_COST_COMMENT_FIELD, data.cost_comment)
-            self.send_keys(ACTION_CARBON_FOOTPRINT_FIELD, data.carbon_footprint)
-            self.send_keys(ACTION_CARBON_COMMENT_FIELD, data.carbon_comment)
-
-        # Save action
-        sleep(0.5)
+            fields[ACTION_COST_FIELD] = data.cost
+            fields[ACTION_COST_COMMENT_FIELD] = data.cost_comment
+            fields[ACTION_CARBON_FOOTPRINT_FIELD] = data.carbon_footprint
+            fields[ACTION_CARBON_COMMENT_FIELD] = data.carbon_comment
+        self.fill_fields(fields)
+
+        # Save action once any postbacks from the modal have finished
+        self.wait_for_postback()
         self.click_element(SAVE_ACTION_BUTTON)
-        sleep(0.5)
+        self.wait_for_postback()
+        self.wait_for_element(REFRESH_BUTTON, clickable=True)
+
+    # Parts grid
+
+    def _wait_for_grid(self) -> None:
         self.wait_for_element(REFRESH_BUTTON, clickable=True)
+
+    def _read_field(self, id: str) -> str:
+        elements = self.driver.find_elements(By.ID, id)
+        if not elements:
+            return ""
+        return elements[0].get_attribute("value") or ""
+
+    def _read_text(self, id: str) -> str:
+        elements = self.driver.find_elements(By.ID, id)
+        if not elements:
+            return ""
+        return elements[0].get_attribute("innerHTML") or ""
+
+    def _submit_pager(self, field: str, value: int, button: str) -> None:
+        pager = self.get_element(CURRENT_PAGE)
+        self.send_keys(field, value, clear_element=True)
+        self.click_element(button)
+        self.wait_for_staleness(pager)
+        self.wait_for_element(REFRESH_BUTTON, clickable=True)
+
+    def _part_rows(self) -> list[GridRow]:
+        return self.read_table(PART_GRID_TABLE, PART_GRID_LABELS["part"])
+
+    def _action_rows(self) -> list[GridRow]:
+        self.wait_for_postback()
+        return self.read_table(
+            ACTION_GRID_TABLE, ACTION_GRID_LABELS["step_type"]
+        )
+
+    def _read_labels(
+        self, row: GridRow, suffixes: dict[str, str]
+    ) -> dict[str, str]:
+        return {name: row.label(suffix) for name, suffix in suffixes.items()}
+
+    def _row_is_selected(self, row: GridRow) -> bool:
+        return SELECTED_ROW_CLASS in row.classes
+
+    def _click_row(self, row: GridRow) -> None:
+        # Click elsewhere to ensure the row is deselected
+        self.click_element(WELCOME_TEXT)
+
+        # Now click the row's name to select it
+        row.element.find_element(
+            By.XPATH, f".//span[contains(@id, '{PART_GRID_LABELS['part']}')]"
+        ).click()